@@ -3,7 +3,7 @@
 
 import numpy as np
 import matplotlib.pyplot as plt
-from nest_elephant_tvb.translation.science_nest_to_tvb import slidding_window
+from nest_elephant_tvb.translation.science_nest_to_tvb import slidding_window_chunks
 
 def compute_rate(data,time,N,Dt):
     """
@@ -33,7 +33,9 @@ def bin_array(array, BIN, time_array,N,Dt):
     :return:
     """
     hist = compute_rate(array,time_array,N,Dt)
-    return ( slidding_window(time_array,BIN),slidding_window(hist,BIN),hist)
+    return (np.concatenate(list(slidding_window_chunks(time_array,BIN))),
+            np.concatenate(list(slidding_window_chunks(hist,BIN))),
+            hist)
 
 def print_nest_pop(param, begin, end, spikes_ex, spikes_in, V_ex=None, V_in=None, W_ex=None, W_in=None, histogram=True,
                    size_neurons=0.1):
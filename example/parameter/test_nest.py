@@ -24,7 +24,17 @@ param_co_simulation={
     # level of log : debug 0, info 1, warning 2, error 3, critical 4
     'level_log':1,
     # if running in cluster:
-    'cluster':False
+    'cluster':False,
+    # data of the translation TVB to Nest : 'spikes' (one spike generator by neuron, the translator sends the spike
+    # trains) or 'rates' (one inhomogeneous Poisson generator by population, the translator sends the rates)
+    # NOTE: 'rates' is experimental : NEST refuses it without a stimulus source for inhomogeneous_poisson_generator
+    # (not checked against nest-io-dev), and the shared spikes are not modelled (remove 'percentage_shared' and
+    # 'function_select' of param_TR_tvb_to_nest)
+    'transport_tvb_to_nest':'spikes',
+    # allow the experimental transports of transport_tvb_to_nest ('rates'), not verified against the NEST builds
+    'experimental_transport':False,
+    # TVB exchanges with the translators with persistent MPI requests (the shapes of the messages are fixed)
+    'persistent_mpi':True
 }
 
 #parameter simulators
@@ -195,12 +205,26 @@ param_tvb_integrator = {
     'mu':[700e-3,0.0,0.,0.0,0.0,0.0,0.0],
     'nsig':[50e-3,0.,0.,0.,0.,0.,0.],
     'weights':[1.e-2,0.,0.,0.,0.,0.,0.],
+    # precision of the state variables, of the noise and of the proxies : 'float64' or 'float32'
+    # (the values are exchanged with the translators in float64)
+    'precision':'float64',
+    # number of steps of the noise generated by block, for example the steps of a synchronization
+    # (0: step by step ; the noise is the same)
+    'noise_block':0,
 }
 
 #parameter for the model of the node : ZERLAUT model / Mean field AdEX
 param_tvb_model={
     #order of the model
     'order':2,
+    # engine of the derivatives of the model : 'numpy' (default), 'fused' (one Numba kernel) or 'fused_parallel' (with
+    # threads) or 'tabulated' (transfer functions interpolated in tables, first order only)
+    'dfun_engine':'fused',
+    # tables of the engine 'tabulated' (optional) : bounds of the total excitatory and inhibitory inputs (KHz) and of
+    # the adaptation (pA), maximum error (KHz) and folder of the cache of the tables (None : no cache)
+    # 'table_domain':((1e-2, 50.0), (1e-2, 50.0), (0.0, 500.0)),
+    # 'table_error':5e-4,
+    # 'table_path':None,
     # 'g_L':param_nest_topology['param_neuron_excitatory']['g_L']
     # 'E_L_e':param_nest_topology['param_neuron_excitatory']['E_L']
     # 'E_L_i':param_nest_topology['param_neuron_inhibitory']['E_L']
@@ -256,6 +280,22 @@ param_tvb_monitor={
 
 # Parameters for the translator Nest to TVB
 param_TR_nest_to_tvb={
+    # number of MPI processes : rank 0 receives from Nest, rank 1-x bin the spikes in parallel, rank 1 sends to TVB
+    'nb_MPI': 2,
+    # number of regions (spike detector/TVB proxy) translated by the same processes
+    'nb_region_by_process': 1,
+    # number of slots of the shared buffer by region : packages of Nest received while the previous ones are analysed
+    'nb_slot': 2,
+    # expected maximal firing rate (Hz) and factor of safety for the size of the shared buffer (it grows if needed)
+    'max_rate': 100.0,
+    'buffer_headroom': 2.0,
+    # receive the packages of all the Nest ranks together (True) or one Nest rank after the other (False)
+    'nonblocking_fan_in': True,
+    # encoding of the spike events sent by Nest : 'double' (24 bytes), 'id_time' (8 bytes),
+    # 'step_uint32' (4 bytes) or 'step_uint16' (2 bytes) by spike (see science_nest_to_tvb.event_dtypes)
+    'event_format': 'double',
+    # record the times and the sizes of each step in log/timeline_<logger>.bin (see translation.instrumentation)
+    'timeline': False,
     # 'init': path of the initialisation of the translation if not the run exploration will create it
     # 'resolution': param_nest['sim_resolution']
     # 'synch': param_co_simulation['synchronization']
@@ -266,10 +306,31 @@ param_TR_nest_to_tvb={
 
 # Parameters for the translator TVB to Nest
 param_TR_tvb_to_nest={
+    # number of MPI processes : rank 0 receives from TVB, rank 1-x generate the spikes of a part of the generators
+    # NOTE: rank 1 gathers the spikes of all the parts and sends them to all the ranks of Nest : the sending to Nest
+    # does not scale with the number of processes, only the generation
+    'nb_MPI': 2,
     # percentage of shared rate between neurons of the same region
     'percentage_shared': 0.5,
+    # number of slots of the shared buffer : rates of TVB received while the spikes of the previous ones are generated
+    'nb_slot': 2,
+    # factor of safety for the size of the shared buffer (it grows if needed)
+    'buffer_headroom': 2.0,
+    # record the times and the sizes of each step in log/timeline_<logger>.bin (see translation.instrumentation)
+    'timeline': False,
+    # generator of the Poisson spike trains : 'numpy' (all the trains of a step together) or 'elephant' (reference)
+    'poisson_engine': 'numpy',
+    # random numbers of the spikes : 'counter' (function of seed, region, step and spike generator, the same trains
+    # with any number of MPI processes) or 'global' (the seeded numpy generator, depends on the order of generation)
+    'random_streams': 'counter',
+    # generate the spikes as soon as the rates of TVB arrive, before the request of Nest
+    'speculative_generation': True,
     # 'seed':param_nest['master_seed']-3 # -3 because -1 and -2 is use by the simulation of TVB
     # 'nb_synapses' : param_nest_connection['nb_external_synapse'] # number of external synapses
+    # 'synch': param_co_simulation['synchronization']
+    # 'resolution': param_nest['sim_resolution']
+    # 'transport': param_co_simulation['transport_tvb_to_nest']
+    # 'experimental_transport': param_co_simulation['experimental_transport']
     # 'init': path of the initialisation of the translation if not the run exploration will create it
     # 'level_log': param_co_simulation['level_log']
     'function_select':2
@@ -279,6 +340,10 @@ param_TR_tvb_to_nest={
 param_record_MPI={
     # save step
     'save_step': 0,
+    # encoding of the spike events sent by Nest (see param_TR_nest_to_tvb)
+    'event_format': 'double',
+    # record the times and the sizes of each step in log/timeline_<logger>.bin (see translation.instrumentation)
+    'timeline': False,
     # 'init': path of the initialisation of the translation if not the run exploration will create it
     # 'resolution': param_nest['sim_resolution']
     # 'synch': param_co_simulation['synchronization']
@@ -434,7 +434,38 @@ def network_device(results_path,dic_layer,min_time,time_simulation,param_backgro
 
     #Connection proxy to each neurons
     spike_generator=[]
-    if cosimulation is not None and cosimulation['co-simulation']:
+    if cosimulation is not None and cosimulation['co-simulation'] \
+            and cosimulation.get('transport_tvb_to_nest', 'spikes') == 'rates':
+        # NEW: one inhomogeneous Poisson generator by population of each region, the translator updates its rates
+        # each step (see translation.science_tvb_to_nest.generate_rate_data)
+        # each neuron receives an independent Poisson train of the rate of its generator
+        # NOTE: the shared part of the spikes (param 'percentage_shared' of the translator) is not modelled
+        # NOTE: experimental, the 'mpi' stimulus source of inhomogeneous_poisson_generator is not checked against
+        # nest-io-dev (the protocol of spike_generator is used with (time, rate) pairs): it is explicitly allowed
+        if not cosimulation.get('experimental_transport', False):
+            raise Exception("transport_tvb_to_nest 'rates' is experimental : set experimental_transport of "
+                            "param_co_simulation to True or use the transport 'spikes'")
+        if 'stimulus_source' not in nest.GetDefaults('inhomogeneous_poisson_generator'):
+            raise Exception("transport_tvb_to_nest 'rates' is experimental : this build of NEST has no "
+                            "stimulus source for inhomogeneous_poisson_generator, use the transport 'spikes'")
+        param_rate_gen= {"start": 0.0,
+                      "stop": time_simulation,
+                      'stimulus_source': 'mpi',
+                      'label': '../translation/spike_generator'
+                      }
+        nest.CopyModel('inhomogeneous_poisson_generator', 'rate_generator_mpi')
+        nest.SetDefaults("rate_generator_mpi", param_rate_gen)
+        for i in range(len(cosimulation['id_region_nest'])):
+            rate_generator_mpi = nest.Create('rate_generator_mpi',len(dic_layer))
+            spike_generator.append(rate_generator_mpi)
+            for index,name in enumerate(dic_layer.keys()):
+                nest.Connect(rate_generator_mpi[index],dic_layer[name]['list'][i]['region'],syn_spec={
+                                               "weight":param_connection['weight_global'],
+                                               "delay":nest.GetKernelStatus("min_delay"),
+                                               },
+                            conn_spec={'rule': 'all_to_all'},
+                             )
+    elif cosimulation is not None and cosimulation['co-simulation']:
         param_spike_gen= {"start": 0.0,
                       "stop": time_simulation,
                       'stimulus_source': 'mpi',
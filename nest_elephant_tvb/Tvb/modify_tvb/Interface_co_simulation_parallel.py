@@ -20,6 +20,8 @@ class Interface_co_simulation(Raw):
     time_synchronize = Float(
         label="simulated time between receiving the value of the proxy",
     )
+    # NEW: precision of the values of the proxies (numpy.float64 or numpy.float32), not a trait for keeping the type
+    dtype = numpy.float64
 
     def __init__(self, **kwargs):
         super(Interface_co_simulation, self).__init__(**kwargs)
@@ -32,25 +34,35 @@ class Interface_co_simulation(Raw):
         numpy.where(numpy.logical_not(numpy.isin(numpy.arange(0, simulator.number_of_nodes, 1), self.id_proxy)))[0]
         self._nb_step_time = int(self.time_synchronize / simulator.integrator.dt)
         self.period = simulator.integrator.dt
+        # the output keeps only one mode by proxy
+        if simulator.model.number_of_modes > 1:
+            raise Exception('the interface of the proxies supports only one mode (number of modes : '
+                            + str(simulator.model.number_of_modes) + ')')
+        # output of the proxies for one synchronization, filled by sample : one row by step (and coupling variable),
+        # one column by proxy, Fortran order for contiguous columns (the values sent for each proxy)
+        self._nb_cvar = len(simulator.model.cvar)
+        self.output = numpy.empty((self._nb_step_time*self._nb_cvar, self.id_proxy.shape[0]), dtype=self.dtype,
+                                  order='F')
 
         # ####### WARNING:Create a new instance of history for taking in count the proxy (replace the old history) #########
         id_proxy = self.id_proxy
         id_node = self._id_node
         dt = simulator.integrator.dt
+        dtype = self.dtype
         # find the minimum of delay supported for the simulation
         delay_proxy = simulator.history.delays[id_proxy, :]
         delay_proxy = delay_proxy[:, id_node]
-        min_delay =  -numpy.min(delay_proxy, initial=numpy.Inf, where=delay_proxy != 0.0)
-        if min_delay == -numpy.Inf:
+        min_delay =  -numpy.min(delay_proxy, initial=numpy.inf, where=delay_proxy != 0.0)
+        if min_delay == -numpy.inf:
             min_delay = numpy.iinfo(numpy.int32).min
         else:
-            min_delay = int(-numpy.min(delay_proxy, initial=numpy.Inf, where=delay_proxy != 0.0))
+            min_delay = int(-numpy.min(delay_proxy, initial=numpy.inf, where=delay_proxy != 0.0))
         class History_proxy(simulator.history.__class__):
             n_proxy = Dim()
             # WARNING same dimension than the buffer in history. (the dimension can be reduce to the minimum of delay)
-            # The precision are different for take in count of the input precision
+            # The precision is the one of the interface (float64 by default for take in count of the input precision)
             # The creation of buffer for proxy because it's impossible to replace the data in the buffer of state variable
-            buffer_proxy = NDArray(('n_time', 'n_cvar', 'n_proxy', 'n_mode'), numpy.float64, read_only=False)
+            buffer_proxy = NDArray(('n_time', 'n_cvar', 'n_proxy', 'n_mode'), dtype, read_only=False)
 
             def __init__(self, weights, delays, cvars, n_mode):
                 super(History_proxy, self).__init__(weights, delays, cvars, n_mode)
@@ -112,15 +124,16 @@ class Interface_co_simulation(Raw):
                 if self.index_cvar.shape[0] != 0:
                         self.current_state[(self.index_cvar[:,0],self.index_cvar[:,1],self.index_cvar[:,2])] = numpy.squeeze(self.history.query_proxy(self.current_step+1))
                 if self.index_no_cvar.shape[0] != 0:
-                    self.current_state[(self.index_no_cvar[:,0],self.index_no_cvar[:,1],self.index_no_cvar[:,2])] = numpy.NAN
+                    self.current_state[(self.index_no_cvar[:,0],self.index_no_cvar[:,1],self.index_no_cvar[:,2])] = numpy.nan
 
-            def _loop_monitor_output(self, step, state):
+            def _loop_monitor_output(self, step, state, *args):
                 # modify the state variable before the record of the monitor
                 if self.index_cvar.shape[0] != 0:
                     state[(self.index_cvar[:,0],self.index_cvar[:,1],self.index_cvar[:,2])] = numpy.squeeze(self.history.query_proxy(step+1))
                 if self.index_no_cvar.shape[0] != 0:
-                        state[(self.index_no_cvar[:,0],self.index_no_cvar[:,1],self.index_no_cvar[:,2])] = numpy.NAN
-                return super(type(simulator), self)._loop_monitor_output(step, state)
+                        state[(self.index_no_cvar[:,0],self.index_no_cvar[:,1],self.index_no_cvar[:,2])] = numpy.nan
+                # NOTE: the newer versions of TVB give also the node coupling
+                return super(type(simulator), self)._loop_monitor_output(step, state, *args)
 
         # change the class of the simulator
         simulator.__class__ = Simulator_proxy
@@ -154,4 +167,7 @@ class Interface_co_simulation(Raw):
         self.step = step
         time = (step + self._nb_step_time) * self.period
         result= self.coupling(step + self._nb_step_time)[:, self.id_proxy, :]
+        # NOTE: the simulation is run by synchronization time, the step 1 is the first step of the output
+        index = ((step - 1) % self._nb_step_time) * self._nb_cvar
+        self.output[index:index+self._nb_cvar] = result[:, :, 0]
         return [time, result]
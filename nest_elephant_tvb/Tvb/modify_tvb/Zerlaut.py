@@ -8,7 +8,10 @@ Mean field model based on Master equation about adaptative exponential leacky in
 from tvb.simulator.models.base import Model,numpy
 import scipy.special as sp_spec
 from tvb.basic.neotraits.api import NArray, Range, Final, List
-from numba import jit
+from numba import jit, prange
+import hashlib
+import math
+import os
 
 class ZerlautAdaptationFirstOrder(Model):
     r"""
@@ -359,10 +362,68 @@ class ZerlautAdaptationFirstOrder(Model):
         doc="""The values for each state-variable should be set to encompass
             the boundaries of the dynamic range of that state-variable. Set None for one-sided boundaries""")
 
+    # NOTE: the engine of dfun is not a trait : the simulator reshapes all the traits of the model by node
+    # numpy: the transfer functions are evaluated on arrays of nodes,
+    # fused: one Numba kernel computes all the derivatives node by node without intermediate arrays,
+    # fused_parallel: the fused kernel with the nodes divided among the threads of Numba
+    # tabulated: numpy with the transfer functions interpolated in tables, see TransferFunctionTable (first order only)
+    dfun_engine = "numpy"
+    # NOTE: the tables of the engine tabulated, not traits (see dfun_engine)
+    # domain of the tables : bounds of the total excitatory and inhibitory inputs (KHz, see get_fluct_regime_vars)
+    # and of the adaptation (pA), the transfer function is computed exactly outside the domain
+    table_domain = ((1e-2, 50.0), (1e-2, 50.0), (0.0, 500.0))
+    # maximum absolute error of the tables (KHz) on the points of validation
+    table_error = 5e-4
+    # folder of the cache of the tables on the disk (None : no cache)
+    table_path = None
+
     state_variables = 'E I W_e W_i'.split()
     _nvar = 4
     cvar = numpy.array([0], dtype=numpy.int32)
 
+    def update_derived_parameters(self):
+        """
+        the parameters of the fused kernel are packed again at the next evaluation
+        """
+        if self.dfun_engine not in ("numpy", "fused", "fused_parallel", "tabulated"):
+            raise Exception('Bad engine of dfun : ' + str(self.dfun_engine))
+        self._parameters_fused = None
+        self._tables = None
+
+    def parameters_fused(self, nb_node):
+        """
+        pack the parameters for the fused kernel, see PARAMETERS_FUSED
+        NOTE: the parameters are packed once after the configuration of the model
+        :param nb_node: number of nodes
+        :return: array (parameter, node) or (parameter, 1) when the parameters are the same for all the nodes
+        """
+        if getattr(self, '_parameters_fused', None) is None or self._parameters_fused.shape[1] not in (1, nb_node):
+            parameters = [numpy.asarray(getattr(self, name), dtype=numpy.float64).ravel()
+                          for name in PARAMETERS_FUSED]
+            nb = 1 if max([parameter.shape[0] for parameter in parameters]) == 1 else nb_node
+            self._parameters_fused = numpy.array([numpy.broadcast_to(parameter, (nb,)) for parameter in parameters])
+        return self._parameters_fused
+
+    def transfer_function_tables(self):
+        """
+        the tables of the transfer functions of the excitatory and inhibitory populations (engine tabulated)
+        NOTE: the tables are built (or loaded from table_path) once after the configuration of the model
+        :return: (table of the excitatory population, table of the inhibitory population)
+        """
+        if getattr(self, '_tables', None) is None:
+            constants = []
+            for name in PARAMETERS_TABLE:
+                parameter = numpy.unique(numpy.asarray(getattr(self, name), dtype=numpy.float64))
+                if parameter.shape[0] != 1:
+                    raise Exception('the tables of the transfer function need the same ' + name + ' for all nodes')
+                constants.append(parameter[0])
+            self._tables = (
+                TransferFunctionTable(constants[:8], constants[8], numpy.asarray(self.P_e, dtype=numpy.float64),
+                                      self.table_domain, self.table_error, self.table_path),
+                TransferFunctionTable(constants[:8], constants[9], numpy.asarray(self.P_i, dtype=numpy.float64),
+                                      self.table_domain, self.table_error, self.table_path))
+        return self._tables
+
     def dfun(self, state_variables, coupling, local_coupling=0.00):
         r"""
         .. math::
@@ -370,6 +431,15 @@ class ZerlautAdaptationFirstOrder(Model):
             dot{W}_k &= W_k/tau_w-b*E_k  \\
 
         """
+        if self.dfun_engine in ('fused', 'fused_parallel') and numpy.isscalar(local_coupling):
+            derivative = numpy.empty_like(state_variables)
+            kernel = _dfun_first_order_parallel if self.dfun_engine == 'fused_parallel' else _dfun_first_order
+            # NOTE: the simulator reshapes the polynomes by node when their size is the number of nodes
+            kernel(state_variables, coupling, float(local_coupling), self.parameters_fused(state_variables.shape[1]),
+                   numpy.asarray(self.P_e, dtype=numpy.float64).ravel(),
+                   numpy.asarray(self.P_i, dtype=numpy.float64).ravel(), derivative)
+            return derivative
+
         E = state_variables[0, :]
         I = state_variables[1, :]
         W_e = state_variables[2, :]
@@ -404,7 +474,7 @@ class ZerlautAdaptationFirstOrder(Model):
                 W_e, self.Q_e, self.tau_e, self.E_e,
                 self.Q_i, self.tau_i, self.E_i,
                 self.g_L, self.C_m, self.E_L_e, self.N_tot,
-                self.p_connect, self.g,self.K_ext_e,self.K_ext_i)
+                self.p_connect_e, self.p_connect_i, self.g,self.K_ext_e,self.K_ext_i)
         derivative[2] = -W_e/self.tau_w_e+self.b_e*E+self.a_e*(mu_V-self.E_L_e)/self.tau_w_e
         # Adaptation inhibitory
         mu_V, sigma_V, T_V = self.get_fluct_regime_vars(
@@ -413,7 +483,7 @@ class ZerlautAdaptationFirstOrder(Model):
                 W_i, self.Q_e, self.tau_e, self.E_e,
                 self.Q_i, self.tau_i, self.E_i,
                 self.g_L, self.C_m, self.E_L_i, self.N_tot,
-                self.p_connect, self.g,self.K_ext_e,self.K_ext_i)
+                self.p_connect_e, self.p_connect_i, self.g,self.K_ext_e,self.K_ext_i)
         derivative[3] = -W_i/self.tau_w_i+self.b_i*I+self.a_i*(mu_V-self.E_L_i)/self.tau_w_i
 
         return derivative
@@ -428,6 +498,10 @@ class ZerlautAdaptationFirstOrder(Model):
         :param W: level of adaptation
         :return: result of transfer function
         """
+        if self.dfun_engine == 'tabulated':
+            return self.transfer_function_tables()[0](
+                (fe+1.0e-6)*(1.-self.g)*self.p_connect_e*self.N_tot + fe_ext*self.K_ext_e,
+                (fi+1.0e-6)*self.g*self.p_connect_i*self.N_tot + fi_ext*self.K_ext_i, W)
         return self.TF(fe, fi, fe_ext, fi_ext, W, self.P_e, self.E_L_e)
 
     def TF_inhibitory(self, fe, fi, fe_ext, fi_ext, W):
@@ -440,6 +514,10 @@ class ZerlautAdaptationFirstOrder(Model):
         :param W: level of adaptation
         :return: result of transfer function
         """
+        if self.dfun_engine == 'tabulated':
+            return self.transfer_function_tables()[1](
+                (fe+1.0e-6)*(1.-self.g)*self.p_connect_e*self.N_tot + fe_ext*self.K_ext_e,
+                (fi+1.0e-6)*self.g*self.p_connect_i*self.N_tot + fi_ext*self.K_ext_i, W)
         return self.TF(fe, fi, fe_ext, fi_ext, W, self.P_i, self.E_L_i)
 
     def TF(self, fe, fi, fe_ext, fi_ext, W, P, E_L):
@@ -644,6 +722,14 @@ class ZerlautAdaptationSecondOrder(ZerlautAdaptationFirstOrder):
     state_variables = 'E I C_ee C_ei C_ii W_e W_i'.split()
     _nvar = 7
 
+    def update_derived_parameters(self):
+        """
+        the engine tabulated is refused : the interpolation of the tables has no second derivatives
+        """
+        if self.dfun_engine == 'tabulated':
+            raise Exception('the engine tabulated is only for the first order model')
+        super(ZerlautAdaptationSecondOrder, self).update_derived_parameters()
+
     def dfun(self, state_variables, coupling, local_coupling=0.00):
         r"""
         .. math::
@@ -673,6 +759,15 @@ class ZerlautAdaptationSecondOrder(ZerlautAdaptationFirstOrder):
             \right.
 
         """
+        if self.dfun_engine in ('fused', 'fused_parallel') and numpy.isscalar(local_coupling):
+            derivative = numpy.empty_like(state_variables)
+            kernel = _dfun_second_order_parallel if self.dfun_engine == 'fused_parallel' else _dfun_second_order
+            # NOTE: the simulator reshapes the polynomes by node when their size is the number of nodes
+            kernel(state_variables, coupling, float(local_coupling), self.parameters_fused(state_variables.shape[1]),
+                   numpy.asarray(self.P_e, dtype=numpy.float64).ravel(),
+                   numpy.asarray(self.P_i, dtype=numpy.float64).ravel(), derivative)
+            return derivative
+
         #number of neurons
         N_e = self.N_tot * (1-self.g)
         N_i = self.N_tot * self.g
@@ -801,3 +896,400 @@ class ZerlautAdaptationSecondOrder(ZerlautAdaptationFirstOrder):
 
         return derivative
 
+
+# the parameters of the fused kernel, in the order of the rows of ZerlautAdaptationFirstOrder.parameters_fused
+PARAMETERS_FUSED = ('g_L', 'E_L_e', 'E_L_i', 'C_m', 'b_e', 'a_e', 'b_i', 'a_i', 'tau_w_e', 'tau_w_i',
+                    'E_e', 'E_i', 'Q_e', 'Q_i', 'tau_e', 'tau_i', 'N_tot', 'p_connect_e', 'p_connect_i', 'g',
+                    'K_ext_e', 'K_ext_i', 'T', 'external_input_ex_ex', 'external_input_ex_in',
+                    'external_input_in_ex', 'external_input_in_in')
+# the parameters of the tables of the transfer function, see ZerlautAdaptationFirstOrder.transfer_function_tables
+# the first 8 are the constants of TransferFunctionTable
+PARAMETERS_TABLE = ('Q_e', 'tau_e', 'E_e', 'Q_i', 'tau_i', 'E_i', 'g_L', 'C_m', 'E_L_e', 'E_L_i')
+_get_fluct_regime_vars = ZerlautAdaptationFirstOrder.get_fluct_regime_vars
+_threshold_func = ZerlautAdaptationFirstOrder.threshold_func
+
+
+@jit(nopython=True, cache=True)
+def _transfer_function(fe, fi, fe_ext, fi_ext, W, E_L, P, parameters, j):
+    """
+    transfer function of one node, see ZerlautAdaptationFirstOrder.TF
+    :param fe: firing rate of excitatory population
+    :param fi: firing rate of inhibitory population
+    :param fe_ext: external excitatory input
+    :param fi_ext: external inhibitory input
+    :param W: level of adaptation
+    :param E_L: leak reversal potential
+    :param P: Polynome of neurons phenomenological threshold (order 9)
+    :param parameters: the parameters of the model, see PARAMETERS_FUSED
+    :param j: the column of the parameters of the node
+    :return: result of transfer function
+    """
+    mu_V, sigma_V, T_V = _get_fluct_regime_vars(
+        fe, fi, fe_ext, fi_ext, W, parameters[12, j], parameters[14, j], parameters[10, j],
+        parameters[13, j], parameters[15, j], parameters[11, j], parameters[0, j], parameters[3, j], E_L,
+        parameters[16, j], parameters[17, j], parameters[18, j], parameters[19, j], parameters[20, j],
+        parameters[21, j])
+    return _firing_rate(mu_V, sigma_V, T_V, parameters[0, j], parameters[3, j], P)
+
+
+@jit(nopython=True, cache=True)
+def _stencil(fe, fi, fe_ext, fi_ext, W, E_L, P, parameters, j, df):
+    """
+    the transfer function and its numerical derivatives of one node, with the central differences of
+    ZerlautAdaptationSecondOrder.dfun : the 9 values of the stencil are computed once
+    :param df: spacing of the differences
+    :return: TF, dTF/dfe, dTF/dfi, d2TF/dfe2, d2TF/dfi2, d2TF/dfedfi (difference of the differences in fi),
+             d2TF/dfidfe (difference of the differences in fe)
+    """
+    center = _transfer_function(fe, fi, fe_ext, fi_ext, W, E_L, P, parameters, j)
+    fe_p = _transfer_function(fe+df, fi, fe_ext, fi_ext, W, E_L, P, parameters, j)
+    fe_m = _transfer_function(fe-df, fi, fe_ext, fi_ext, W, E_L, P, parameters, j)
+    fi_p = _transfer_function(fe, fi+df, fe_ext, fi_ext, W, E_L, P, parameters, j)
+    fi_m = _transfer_function(fe, fi-df, fe_ext, fi_ext, W, E_L, P, parameters, j)
+    pp = _transfer_function(fe+df, fi+df, fe_ext, fi_ext, W, E_L, P, parameters, j)
+    pm = _transfer_function(fe+df, fi-df, fe_ext, fi_ext, W, E_L, P, parameters, j)
+    mp = _transfer_function(fe-df, fi+df, fe_ext, fi_ext, W, E_L, P, parameters, j)
+    mm = _transfer_function(fe-df, fi-df, fe_ext, fi_ext, W, E_L, P, parameters, j)
+    h = 2*df*1e3
+    return (center, (fe_p-fe_m)/h, (fi_p-fi_m)/h,
+            (fe_p-2*center+fe_m)/((df*1e3)**2), (fi_p-2*center+fi_m)/((df*1e3)**2),
+            ((pp-mp)/h-(pm-mm)/h)/h, ((pp-pm)/h-(mp-mm)/h)/h)
+
+
+@jit(nopython=True, cache=True)
+def _firing_rate(mu_V, sigma_V, T_V, g_L, C_m, P):
+    """
+    transfer function of one node from the fluctuation regime, see ZerlautAdaptationFirstOrder.TF
+    :param mu_V: mean of membrane voltage
+    :param sigma_V: variance of membrane voltage
+    :param T_V: autocorrelation time constant
+    :param g_L: leak conductance
+    :param C_m: membrane capacitance
+    :param P: Polynome of neurons phenomenological threshold (order 9)
+    :return: result of transfer function
+    """
+    V_thre = _threshold_func(mu_V, sigma_V, T_V*g_L/C_m, P[0], P[1], P[2], P[3], P[4], P[5], P[6], P[7], P[8], P[9])
+    V_thre *= 1e3  # the threshold need to be in mv and not in Volt
+    # Eqns 10 from [MV_2018], see ZerlautAdaptationFirstOrder.estimate_firing_rate
+    return math.erfc((V_thre-mu_V) / (math.sqrt(2.0)*sigma_V)) / (2*T_V)
+
+
+def _dfun_first_order_kernel(state_variables, coupling, local_coupling, parameters, P_e, P_i, derivative):
+    """
+    derivatives of ZerlautAdaptationFirstOrder node by node : the fluctuation regime of each population is computed
+    once for its transfer function and its adaptation, without intermediate arrays
+    :param state_variables: state variables (E, I, W_e, W_i), array (variable, node, mode)
+    :param coupling: long-range coupling, array (1, node, mode)
+    :param local_coupling: short-range coupling
+    :param parameters: the parameters of the model, see PARAMETERS_FUSED
+    :param P_e: Polynome of excitatory phenomenological threshold
+    :param P_i: Polynome of inhibitory phenomenological threshold
+    :param derivative: the result, array of the shape of state_variables
+    """
+    for node in prange(state_variables.shape[1]):
+        j = node if parameters.shape[1] > 1 else 0
+        g_L, E_L_e, E_L_i, C_m = parameters[0, j], parameters[1, j], parameters[2, j], parameters[3, j]
+        b_e, a_e, b_i, a_i = parameters[4, j], parameters[5, j], parameters[6, j], parameters[7, j]
+        tau_w_e, tau_w_i = parameters[8, j], parameters[9, j]
+        E_e, E_i, Q_e, Q_i = parameters[10, j], parameters[11, j], parameters[12, j], parameters[13, j]
+        tau_e, tau_i, N_tot = parameters[14, j], parameters[15, j], parameters[16, j]
+        p_connect_e, p_connect_i, g = parameters[17, j], parameters[18, j], parameters[19, j]
+        K_ext_e, K_ext_i, T = parameters[20, j], parameters[21, j], parameters[22, j]
+        for mode in range(state_variables.shape[2]):
+            E = state_variables[0, node, mode]
+            I = state_variables[1, node, mode]
+            W_e = state_variables[2, node, mode]
+            W_i = state_variables[3, node, mode]
+            # external firing rate
+            Fe_ext = coupling[0, node, mode] + local_coupling * E
+            Fi_ext = local_coupling * I
+            # Excitatory firing rate and adaptation
+            mu_V, sigma_V, T_V = _get_fluct_regime_vars(
+                E, I, Fe_ext + parameters[23, j], Fi_ext + parameters[24, j], W_e,
+                Q_e, tau_e, E_e, Q_i, tau_i, E_i, g_L, C_m, E_L_e, N_tot, p_connect_e, p_connect_i, g, K_ext_e, K_ext_i)
+            derivative[0, node, mode] = (_firing_rate(mu_V, sigma_V, T_V, g_L, C_m, P_e)-E)/T
+            derivative[2, node, mode] = -W_e/tau_w_e+b_e*E+a_e*(mu_V-E_L_e)/tau_w_e
+            # Inhibitory firing rate and adaptation
+            mu_V, sigma_V, T_V = _get_fluct_regime_vars(
+                E, I, Fe_ext + parameters[25, j], Fi_ext + parameters[26, j], W_i,
+                Q_e, tau_e, E_e, Q_i, tau_i, E_i, g_L, C_m, E_L_i, N_tot, p_connect_e, p_connect_i, g, K_ext_e, K_ext_i)
+            derivative[1, node, mode] = (_firing_rate(mu_V, sigma_V, T_V, g_L, C_m, P_i)-I)/T
+            derivative[3, node, mode] = -W_i/tau_w_i+b_i*I+a_i*(mu_V-E_L_i)/tau_w_i
+
+
+_dfun_first_order = jit(nopython=True, cache=True)(_dfun_first_order_kernel)
+_dfun_first_order_parallel = jit(nopython=True, cache=True, parallel=True)(_dfun_first_order_kernel)
+
+
+def _dfun_second_order_kernel(state_variables, coupling, local_coupling, parameters, P_e, P_i, derivative):
+    """
+    derivatives of ZerlautAdaptationSecondOrder node by node : the transfer functions and their numerical first and
+    second derivatives are computed together from one stencil by population, without intermediate arrays
+    :param state_variables: state variables (E, I, C_ee, C_ei, C_ii, W_e, W_i), array (variable, node, mode)
+    :param coupling: long-range coupling, array (1, node, mode)
+    :param local_coupling: short-range coupling
+    :param parameters: the parameters of the model, see PARAMETERS_FUSED
+    :param P_e: Polynome of excitatory phenomenological threshold
+    :param P_i: Polynome of inhibitory phenomenological threshold
+    :param derivative: the result, array of the shape of state_variables
+    """
+    df = 1e-7
+    for node in prange(state_variables.shape[1]):
+        j = node if parameters.shape[1] > 1 else 0
+        g_L, E_L_e, E_L_i, C_m = parameters[0, j], parameters[1, j], parameters[2, j], parameters[3, j]
+        b_e, a_e, b_i, a_i = parameters[4, j], parameters[5, j], parameters[6, j], parameters[7, j]
+        tau_w_e, tau_w_i = parameters[8, j], parameters[9, j]
+        E_e, E_i, Q_e, Q_i = parameters[10, j], parameters[11, j], parameters[12, j], parameters[13, j]
+        tau_e, tau_i, N_tot = parameters[14, j], parameters[15, j], parameters[16, j]
+        p_connect_e, p_connect_i, g = parameters[17, j], parameters[18, j], parameters[19, j]
+        K_ext_e, K_ext_i, T = parameters[20, j], parameters[21, j], parameters[22, j]
+        # number of neurons
+        N_e = N_tot * (1-g)
+        N_i = N_tot * g
+        for mode in range(state_variables.shape[2]):
+            E = state_variables[0, node, mode]
+            I = state_variables[1, node, mode]
+            C_ee = state_variables[2, node, mode]
+            C_ei = state_variables[3, node, mode]
+            C_ii = state_variables[4, node, mode]
+            W_e = state_variables[5, node, mode]
+            W_i = state_variables[6, node, mode]
+            # external firing rate for the different population
+            E_input_excitatory = coupling[0, node, mode]+local_coupling*E+parameters[23, j]
+            E_input_inhibitory = coupling[0, node, mode]+local_coupling*E+parameters[25, j]
+            I_input_excitatory = local_coupling*I+parameters[24, j]
+            I_input_inhibitory = local_coupling*I+parameters[26, j]
+            # Transfer function of excitatory and inhibitory neurons and their derivatives
+            _TF_e, _diff_fe_TF_e, _diff_fi_TF_e, _diff2_fe_fe_e, _diff2_fi_fi_e, _diff2_fe_fi_e, _diff2_fi_fe_e = \
+                _stencil(E, I, E_input_excitatory, I_input_excitatory, W_e, E_L_e, P_e, parameters, j, df)
+            _TF_i, _diff_fe_TF_i, _diff_fi_TF_i, _diff2_fe_fe_i, _diff2_fi_fi_i, _diff2_fe_fi_i, _diff2_fi_fe_i = \
+                _stencil(E, I, E_input_inhibitory, I_input_inhibitory, W_i, E_L_i, P_i, parameters, j, df)
+            # see ZerlautAdaptationSecondOrder.dfun
+            derivative[0, node, mode] = (_TF_e - E + .5*C_ee*_diff2_fe_fe_e + .5*C_ei*_diff2_fe_fi_e
+                                         + .5*C_ei*_diff2_fi_fe_e + .5*C_ii*_diff2_fi_fi_e)/T
+            derivative[1, node, mode] = (_TF_i - I + .5*C_ee*_diff2_fe_fe_i + .5*C_ei*_diff2_fe_fi_i
+                                         + .5*C_ei*_diff2_fi_fe_i + .5*C_ii*_diff2_fi_fi_i)/T
+            derivative[2, node, mode] = (_TF_e*(1./T-_TF_e)/N_e + (_TF_e-E)**2 + 2.*C_ee*_diff_fe_TF_e
+                                         + 2.*C_ei*_diff_fi_TF_i - 2.*C_ee)/T
+            derivative[3, node, mode] = ((_TF_e-E)*(_TF_i-I) + C_ee*_diff_fe_TF_e + C_ei*_diff_fe_TF_i
+                                         + C_ei*_diff_fi_TF_e + C_ii*_diff_fi_TF_i - 2.*C_ei)/T
+            derivative[4, node, mode] = (_TF_i*(1./T-_TF_i)/N_i + (_TF_i-I)**2 + 2.*C_ii*_diff_fi_TF_i
+                                         + 2.*C_ei*_diff_fe_TF_e - 2.*C_ii)/T
+            # Adaptation excitatory
+            mu_V, sigma_V, T_V = _get_fluct_regime_vars(
+                E, I, E_input_excitatory, E_input_inhibitory, W_e,
+                Q_e, tau_e, E_e, Q_i, tau_i, E_i, g_L, C_m, E_L_e, N_tot, p_connect_e, p_connect_i, g, K_ext_e, K_ext_i)
+            derivative[5, node, mode] = -W_e/tau_w_e+b_e*E+a_e*(mu_V-E_L_e)/tau_w_e
+            # Adaptation inhibitory
+            mu_V, sigma_V, T_V = _get_fluct_regime_vars(
+                E, I, I_input_excitatory, I_input_inhibitory, W_i,
+                Q_e, tau_e, E_e, Q_i, tau_i, E_i, g_L, C_m, E_L_i, N_tot, p_connect_e, p_connect_i, g, K_ext_e, K_ext_i)
+            derivative[6, node, mode] = -W_i/tau_w_i+b_i*I+a_i*(mu_V-E_L_i)/tau_w_i
+
+
+_dfun_second_order = jit(nopython=True, cache=True)(_dfun_second_order_kernel)
+_dfun_second_order_parallel = jit(nopython=True, cache=True, parallel=True)(_dfun_second_order_kernel)
+
+
+class TransferFunctionTable:
+    def __init__(self, constants, E_L, P, domain, error, path=None, nb_validation=20000, max_points=2**24):
+        """
+        transfer function of one population of ZerlautAdaptationFirstOrder interpolated in a table
+        The transfer function depends on the firing rates and the external inputs only through the total excitatory
+        and inhibitory inputs fe and fi (see get_fluct_regime_vars) : the table is a grid of (fe, fi, W), uniform in
+        sqrt(fe), sqrt(fi) and W, with a multilinear interpolation. The axis with the largest error is refined until
+        the maximum error on random points of validation of the domain is below half of the error bound (the error
+        between the points of validation can be larger, see benchmark_transfer_function.py of translation/test_file).
+        The points outside the domain are computed exactly.
+        NOTE: the table depends only on the constants, E_L, P, the domain and the error bound: it is saved in the
+        folder path with a hash of them in its name and loaded by the next runs with the same parameters
+        :param constants: Q_e, tau_e, E_e, Q_i, tau_i, E_i, g_L, C_m (see PARAMETERS_TABLE)
+        :param E_L: leak reversal potential
+        :param P: Polynome of neurons phenomenological threshold (order 9)
+        :param domain: bounds of fe (KHz), fi (KHz) and W (pA) : ((min, max), (min, max), (min, max)), fe, fi > 0
+        :param error: maximum absolute error of the transfer function (KHz)
+        :param path: folder of the cache of the tables (None : no cache)
+        :param nb_validation: number of points of validation
+        :param max_points: maximum number of points of the table
+        """
+        self.constants = numpy.array(constants, dtype=numpy.float64)
+        self.E_L = float(E_L)
+        self.P = numpy.ascontiguousarray(P, dtype=numpy.float64).ravel()
+        self.domain = numpy.array(domain, dtype=numpy.float64)
+        if self.domain.shape != (3, 2) or numpy.any(self.domain[:, 0] >= self.domain[:, 1]) \
+                or numpy.any(self.domain[:2, 0] <= 0.0):
+            raise Exception('Bad domain of the table of the transfer function : ' + str(domain))
+        # bounds of the axes of the grid
+        self.lower = numpy.array([numpy.sqrt(self.domain[0, 0]), numpy.sqrt(self.domain[1, 0]), self.domain[2, 0]])
+        self.upper = numpy.array([numpy.sqrt(self.domain[0, 1]), numpy.sqrt(self.domain[1, 1]), self.domain[2, 1]])
+        self.bound = float(error)
+        # points of validation, uniform in the axes of the grid
+        points = self.lower + numpy.random.RandomState(0).uniform(size=(nb_validation, 3))*(self.upper-self.lower)
+        exact = self._exact(points)
+
+        key = hashlib.sha1(numpy.concatenate((self.constants, [self.E_L], self.P, self.domain.ravel(), [self.bound],
+                                              [nb_validation])).tobytes()).hexdigest()
+        file = None if path is None else os.path.join(path, 'transfer_function_' + key + '.npy')
+        if file is not None and os.path.exists(file):
+            self._set_table(numpy.load(file))
+            self.error = numpy.max(numpy.abs(self._interpolate(points) - exact))
+        else:
+            self._build(points, exact, max_points)
+            if file is not None:
+                os.makedirs(path, exist_ok=True)
+                # NOTE: renamed after the writing, another run never reads a part of the table
+                with open(file + '.' + str(os.getpid()), 'wb') as f:
+                    numpy.save(f, self.table)
+                os.replace(file + '.' + str(os.getpid()), file)
+
+    def __call__(self, fe, fi, W):
+        """
+        transfer function interpolated in the table
+        :param fe: total excitatory input (KHz)
+        :param fi: total inhibitory input (KHz)
+        :param W: level of adaptation
+        :return: result of transfer function, in the shape of the broadcast of the inputs
+        """
+        fe, fi, W = numpy.broadcast_arrays(fe, fi, W)
+        result = numpy.empty(fe.shape)
+        _interpolate_table(numpy.ascontiguousarray(fe, dtype=numpy.float64).ravel(),
+                           numpy.ascontiguousarray(fi, dtype=numpy.float64).ravel(),
+                           numpy.ascontiguousarray(W, dtype=numpy.float64).ravel(),
+                           self.table, self.lower, self.step, self.E_L, self.P, self.constants, result.reshape(-1))
+        return result
+
+    def _set_table(self, table):
+        """
+        :param table: the values of the transfer function on the grid
+        """
+        self.table = table
+        self.step = (self.upper-self.lower)/(numpy.array(table.shape)-1)
+
+    def _exact(self, points):
+        """
+        exact transfer function
+        :param points: array (point, axis) in the axes of the grid
+        :return: result of transfer function for each point
+        """
+        result = numpy.empty(points.shape[0])
+        _exact_table(numpy.ascontiguousarray(points), self.E_L, self.P, self.constants, result)
+        return result
+
+    def _interpolate(self, points):
+        """
+        transfer function interpolated in the table
+        :param points: array (point, axis) in the axes of the grid
+        :return: result of transfer function for each point
+        """
+        return self(points[:, 0]**2, points[:, 1]**2, points[:, 2])
+
+    def _build(self, points, exact, max_points):
+        """
+        refine the grid, one axis at a time, until the error bound is reached
+        :param points: points of validation in the axes of the grid
+        :param exact: the exact transfer function at the points of validation
+        :param max_points: maximum number of points of the table
+        """
+        shape = numpy.array([17, 17, 5])
+        while True:
+            table = numpy.empty(shape)
+            _grid_table(self.lower, (self.upper-self.lower)/(shape-1), self.E_L, self.P, self.constants, table)
+            self._set_table(table)
+            self.error = numpy.max(numpy.abs(self._interpolate(points) - exact))
+            if self.error <= 0.5*self.bound:
+                return
+            # error of the interpolation along each axis alone : the axis with the largest one is refined
+            error_axis = []
+            for axis in range(3):
+                position = (points[:, axis]-self.lower[axis])/self.step[axis]
+                index = numpy.minimum(numpy.floor(position), shape[axis]-2)
+                side = []
+                for node in (index, index+1):
+                    points_axis = points.copy()
+                    points_axis[:, axis] = self.lower[axis] + node*self.step[axis]
+                    side.append(self._exact(points_axis))
+                weight = position-index
+                error_axis.append(numpy.max(numpy.abs((1.0-weight)*side[0] + weight*side[1] - exact)))
+            shape[numpy.argmax(error_axis)] = 2*shape[numpy.argmax(error_axis)]-1
+            if numpy.prod(shape) > max_points:
+                raise Exception('the error of the table of the transfer function is ' + str(self.error) + ' with '
+                                + str(table.shape) + ' points, above ' + str(0.5*self.bound) +
+                                ' : reduce the domain or increase the error bound')
+
+
+@jit(nopython=True, cache=True)
+def _transfer_function_total(fe, fi, W, E_L, P, constants):
+    """
+    transfer function of one node from the total inputs, see TransferFunctionTable
+    :param fe: total excitatory input
+    :param fi: total inhibitory input
+    :param W: level of adaptation
+    :param E_L: leak reversal potential
+    :param P: Polynome of neurons phenomenological threshold (order 9)
+    :param constants: Q_e, tau_e, E_e, Q_i, tau_i, E_i, g_L, C_m
+    :return: result of transfer function
+    """
+    # the firing rates are -1e-6 and the external inputs are the total inputs with a weight of 1
+    mu_V, sigma_V, T_V = _get_fluct_regime_vars(
+        -1.0e-6, -1.0e-6, fe, fi, W, constants[0], constants[1], constants[2], constants[3], constants[4],
+        constants[5], constants[6], constants[7], E_L, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0)
+    return _firing_rate(mu_V, sigma_V, T_V, constants[6], constants[7], P)
+
+
+@jit(nopython=True, cache=True)
+def _exact_table(points, E_L, P, constants, result):
+    """
+    exact transfer function of points in the axes of the table (sqrt(fe), sqrt(fi), W)
+    :param points: array (point, axis)
+    :param result: the transfer function of each point
+    """
+    for index in range(points.shape[0]):
+        result[index] = _transfer_function_total(points[index, 0]**2, points[index, 1]**2, points[index, 2],
+                                                 E_L, P, constants)
+
+
+@jit(nopython=True, cache=True)
+def _grid_table(lower, step, E_L, P, constants, table):
+    """
+    transfer function on the grid of the table
+    :param lower: the first point of the axes (sqrt(fe), sqrt(fi), W)
+    :param step: the step of the axes
+    :param table: the result, array (fe, fi, W)
+    """
+    for i in range(table.shape[0]):
+        fe = (lower[0]+i*step[0])**2
+        for j in range(table.shape[1]):
+            fi = (lower[1]+j*step[1])**2
+            for k in range(table.shape[2]):
+                table[i, j, k] = _transfer_function_total(fe, fi, lower[2]+k*step[2], E_L, P, constants)
+
+
+@jit(nopython=True, cache=True)
+def _interpolate_table(fe, fi, W, table, lower, step, E_L, P, constants, result):
+    """
+    multilinear interpolation of the transfer function in the table, exact transfer function outside the table
+    :param fe: total excitatory inputs
+    :param fi: total inhibitory inputs
+    :param W: levels of adaptation
+    :param table: the transfer function on the grid, see _grid_table
+    :param lower: the first point of the axes (sqrt(fe), sqrt(fi), W)
+    :param step: the step of the axes
+    :param result: the transfer function of each input
+    """
+    for index in range(result.shape[0]):
+        x = (math.sqrt(fe[index])-lower[0])/step[0] if fe[index] > 0.0 else -1.0
+        y = (math.sqrt(fi[index])-lower[1])/step[1] if fi[index] > 0.0 else -1.0
+        z = (W[index]-lower[2])/step[2]
+        if 0.0 <= x <= table.shape[0]-1 and 0.0 <= y <= table.shape[1]-1 and 0.0 <= z <= table.shape[2]-1:
+            i = min(int(x), table.shape[0]-2)
+            j = min(int(y), table.shape[1]-2)
+            k = min(int(z), table.shape[2]-2)
+            x -= i
+            y -= j
+            z -= k
+            result[index] = ((1.0-x)*((1.0-y)*((1.0-z)*table[i, j, k]+z*table[i, j, k+1])
+                                      + y*((1.0-z)*table[i, j+1, k]+z*table[i, j+1, k+1]))
+                             + x*((1.0-y)*((1.0-z)*table[i+1, j, k]+z*table[i+1, j, k+1])
+                                  + y*((1.0-z)*table[i+1, j+1, k]+z*table[i+1, j+1, k+1])))
+        else:
+            result[index] = _transfer_function_total(fe[index], fi[index], W[index], E_L, P, constants)
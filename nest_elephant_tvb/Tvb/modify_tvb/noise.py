@@ -3,6 +3,7 @@
 
 from tvb.simulator.noise import Additive, Noise, NArray,Int, Attr, simple_gen_astr, Float
 import numpy
+from numba import jit
 
 # file of testing specific noise
 
@@ -25,6 +26,13 @@ class  Ornstein_Ulhenbeck_process (Additive):
         doc="""Mean of noise noise"""
     )
     _noise= None
+    # NEW: precision of the noise (numpy.float64 or numpy.float32), the one of the state variables
+    dtype = numpy.float64
+    # NEW: number of steps generated by block (0 or 1 : one step by generation),
+    # the random numbers and the noise are the same as step by step
+    block = 0
+    _ring = None
+    _index_block = None
 
     def configure_white(self,dt,shape):
         """
@@ -33,21 +41,89 @@ class  Ornstein_Ulhenbeck_process (Additive):
 
         """
         self.dt = dt
-        self._noise = 0.0
+        self._noise = self.dtype(0.0)
+        self._sqrt_dt = self.dtype(numpy.sqrt(self.dt))
+        # the parameters in the precision of the noise, at their first use (see _parameters)
+        # NOTE: the simulator reshapes nsig after the configuration of the noise
+        self._mu = None
+        self._index_block = None
         self.log.info('White noise configured with dt=%g', self.dt)
 
+    def _parameters(self):
+        """
+        the parameters of the noise in the precision of the noise, at the first use by generate or by gfun
+        NOTE: the integrators of TVB call gfun before generate
+        """
+        if self._mu is None:
+            self._mu = numpy.asarray(self.mu, dtype=self.dtype)
+            self._nsig = numpy.asarray(self.nsig, dtype=self.dtype)
+            self._gfun = numpy.asarray(self.weights*1e-3, dtype=self.dtype)
+
     def generate(self, shape, lo=-1.0, hi=1.0):
-        self._noise = self._noise - self.dt/self.tau_OU*self._noise+numpy.sqrt(self.dt)*self.random_stream.normal(size=shape)
-        noise = self.mu + self.nsig * self._noise
+        self._parameters()
+        if self.block > 1:
+            return self._generate_block(tuple(shape))
+        # NOTE: the random numbers are drawn in float64, the sequence is the same for all the precisions
+        self._noise = self._noise - self.dt/self.tau_OU*self._noise \
+                      + self._sqrt_dt*self.random_stream.normal(size=shape).astype(self.dtype, copy=False)
+        noise = self._mu + self._nsig * self._noise
+        return noise
+
+    def _generate_block(self, shape):
+        """
+        the noise of the next step in the ring of the block, generation of the next block when the ring is used
+        NOTE: the integrator modifies the noise in place, each step has its own row in the ring
+        :param shape: shape of the noise
+        :return: a view of the ring
+        """
+        if self._index_block is None or self._index_block == self._ring.shape[0]:
+            self._draw_block(shape)
+        elif self._ring.shape[1:] != shape:
+            raise Exception('the shape of the noise changes during a block')
+        noise = self._ring[self._index_block]
+        self._index_block += 1
         return noise
 
+    def _draw_block(self, shape):
+        """
+        draw the random numbers of a block in one call and advance the Ornstein-Uhlenbeck process in the block
+        :param shape: shape of the noise of one step
+        """
+        # the normal numbers of the block are the same as the numbers drawn step by step
+        increments = self.random_stream.normal(size=(self.block,) + shape).astype(self.dtype, copy=False)
+        state = numpy.array(numpy.broadcast_to(self._noise, shape), dtype=self.dtype)
+        _OU_block(increments.reshape((self.block, -1)), state.reshape(-1), self.dtype(self.dt/self.tau_OU),
+                  self._sqrt_dt)
+        self._noise = state
+        if self._ring is None or self._ring.shape != increments.shape or self._ring.dtype != increments.dtype:
+            self._ring = numpy.empty(increments.shape, dtype=self.dtype)
+        numpy.multiply(self._nsig, increments, out=self._ring)
+        self._ring += self._mu
+        self._index_block = 0
+
     def gfun(self, state_variables):
         """
             Drop noise in order to avoid negative frequency
 
         """
         # drop value for negative noise
-        return self.weights*1e-3
+        self._parameters()
+        return self._gfun
+
+
+@jit(nopython=True, cache=True)
+def _OU_block(increments, state, decay, scale):
+    """
+    Ornstein-Uhlenbeck process for a block of steps, in the same order of the operations as step by step
+    :param increments: the normal numbers of the block, array (step, value), replaced by the process
+    :param state: the process before the block, array (value), replaced by the process at the end of the block
+    :param decay: dt/tau_OU
+    :param scale: sqrt(dt)
+    """
+    for step in range(increments.shape[0]):
+        for index in range(increments.shape[1]):
+            state[index] = state[index] - decay*state[index] + scale*increments[step, index]
+            increments[step, index] = state[index]
 
 
 class Poisson_noise(Noise):
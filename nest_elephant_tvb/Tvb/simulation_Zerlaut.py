@@ -11,6 +11,7 @@ import numpy.random as rgn
 import numpy as np
 from mpi4py import MPI
 import os
+import sys
 import json
 import time
 import nest_elephant_tvb.Tvb.modify_tvb.noise as my_noise
@@ -40,6 +41,12 @@ def init(param_tvb_connection,param_tvb_coupling,param_tvb_integrator,param_tvb_
         model = Zerlaut.ZerlautAdaptationSecondOrder(variables_of_interest='E I C_ee C_ei C_ii W_e W_i'.split())
     else:
         raise Exception('Bad order for the model')
+    # NEW: the engine of the derivatives (see Zerlaut.ZerlautAdaptationFirstOrder.dfun_engine), numpy by default
+    model.dfun_engine = param_tvb_model.get('dfun_engine', 'numpy')
+    # NEW: the tables of the transfer functions of the engine tabulated (see Zerlaut.TransferFunctionTable)
+    for name in ['table_domain', 'table_error', 'table_path']:
+        if name in param_tvb_model:
+            setattr(model, name, param_tvb_model[name])
     model.g_L=np.array(param_tvb_model['g_L'])
     model.E_L_e=np.array(param_tvb_model['E_L_e'])
     model.E_L_i=np.array(param_tvb_model['E_L_i'])
@@ -123,6 +130,13 @@ def init(param_tvb_connection,param_tvb_coupling,param_tvb_integrator,param_tvb_
         weights=np.array(param_tvb_integrator['weights']).reshape((7,1,1))
     )
     noise.random_stream.seed(param_tvb_integrator['seed'])
+    # NEW: precision of the state variables, of the noise and of the proxies (float64 by default)
+    precision = np.dtype(param_tvb_integrator.get('precision', 'float64'))
+    if precision not in (np.float32, np.float64):
+        raise Exception('Bad precision for TVB : ' + str(precision))
+    noise.dtype = precision.type
+    # NEW: the noise of several steps drawn in one call (0: step by step), the same noise as step by step
+    noise.block = int(param_tvb_integrator.get('noise_block', 0))
     integrator = lab.integrators.HeunStochastic(noise=noise,dt=param_tvb_integrator['sim_resolution'])
     # integrator = lab.integrators.HeunDeterministic()
 
@@ -154,6 +168,7 @@ def init(param_tvb_connection,param_tvb_coupling,param_tvb_integrator,param_tvb_
            id_proxy=cosim['id_proxy'],
            time_synchronize=cosim['time_synchronize']
             )
+        monitor_IO.dtype = precision.type
         monitors.append(monitor_IO)
 
 
@@ -162,6 +177,8 @@ def init(param_tvb_connection,param_tvb_coupling,param_tvb_integrator,param_tvb_
                                             coupling = coupling, integrator = integrator, monitors = monitors
                                         )
     simulator.configure()
+    # the integration keeps the type of the state variables
+    simulator.current_state = simulator.current_state.astype(precision)
     # save the initial condition
     np.save(param_tvb_monitor['path_result']+'/step_init.npy',simulator.history.buffer)
     # end edit
@@ -266,6 +283,7 @@ def run_mpi(path):
                       'path_send': path_send,
                       'path_receive': path_receive,
                      })
+    interface = simulator.monitors[-1] # the monitor for the proxies (Interface_co_simulation)
     # configure for saving result of TVB
     # check how many monitor it's used
     nb_monitor = param_tvb_monitor['Raw'] + param_tvb_monitor['TemporalAverage'] + param_tvb_monitor['Bold'] + param_tvb_monitor['SEEG']
@@ -275,6 +293,8 @@ def run_mpi(path):
         save_result.append([])
 
     #init MPI :
+    # persistent requests after the first step (see persistent_send and persistent_receive), else send_mpi and receive_mpi
+    persistent = param_co_simulation.get('persistent_mpi', True)
     data = None #data for the proxy node (no initialisation in the parameter)
     comm_receive=[]
     for i in id_proxy:
@@ -282,6 +302,8 @@ def run_mpi(path):
     comm_send=[]
     for i in id_proxy :
         comm_send.append(init_mpi(path_receive+str(i)+".txt",logger))
+    receivers = [None for comm in comm_receive]
+    senders = [None for comm in comm_send]
 
     # the loop of the simulation
     count = 0
@@ -289,27 +311,35 @@ def run_mpi(path):
     while count*time_synch < end: # FAT END POINT
         logger.info(" TVB receive data")
         #receive MPI data
-        data_value = []
-        for comm in comm_receive:
-            receive = receive_mpi(comm)
-            time_data = receive[0]
-            data_value.append(receive[1])
+        if receivers[0] is not None:
+            # NEW: the rates of all the proxies concurrently, in the order of their arrival
+            time_data, data_value = receive_all(receivers)
+        else:
+            data_value = []
+            for index,comm in enumerate(comm_receive):
+                receive = receive_mpi(comm)
+                if persistent:
+                    receivers[index] = persistent_receive(comm,receive[1].shape[0])
+                time_data = receive[0]
+                data_value.append(receive[1])
+            data_value = np.swapaxes(np.array(data_value),0,1)[:,:]
         data=np.empty((2,),dtype=object)
         nb_step = np.rint((time_data[1]-time_data[0])/param_tvb_integrator['sim_resolution'])
         nb_step_0 = np.rint(time_data[0]/param_tvb_integrator['sim_resolution']) + 1 # start at the first time step not at 0.0
         time_data = np.arange(nb_step_0,nb_step_0+nb_step,1)*param_tvb_integrator['sim_resolution']
-        data_value = np.swapaxes(np.array(data_value),0,1)[:,:]
         if data_value.shape[0] != time_data.shape[0]:
             raise(Exception('Bad shape of data'))
         data[:]=[time_data,data_value]
 
         logger.info(" TVB start simulation "+str(count*time_synch))
-        nest_data=[]
+        time = [None, None] # time of the first and of the last values of the proxies
         for result in simulator(simulation_length=time_synch,proxy_data=data):
             for i in range(nb_monitor):
                 if result[i] is not None:
                     save_result[i].append(result[i])
-            nest_data.append([result[-1][0],result[-1][1]])
+            if time[0] is None:
+                time[0] = result[-1][0]
+            time[1] = result[-1][0]
 
             #save the result in file
             if result[-1][0] >= param_tvb_monitor['save_time']*(count_save+1): #check if the time for saving at some time step
@@ -321,17 +351,31 @@ def run_mpi(path):
         logger.info(" TVB end simulation")
 
         # prepare to send data with MPI
-        nest_data = np.array(nest_data)
-        time = [nest_data[0,0],nest_data[-1,0]]
-        rate = np.concatenate(nest_data[:,1])
+        # NEW: the values of the proxies are in the output of the interface (see Interface_co_simulation.sample),
+        # one contiguous column by proxy, rewritten at the next step
+        rate = interface.output
+        rate *= 1e3
         for index,comm in enumerate(comm_send):
-            send_mpi(comm,time,rate[:,index]*1e3)
+            if senders[index] is not None:
+                # NEW: nonblocking, the sending overlaps the next step, it is finished before the buffers are reused
+                if senders[index].active:
+                    senders[index].wait()
+                senders[index].start(time,rate[:,index])
+            else:
+                send_mpi(comm,time,rate[:,index])
+                if persistent:
+                    senders[index] = persistent_send(comm,rate.shape[0])
 
         #increment of the loop
         count+=1
     # save the last part
     logger.info(" TVB finish")
     np.save(param_tvb_monitor['path_result']+'/step_'+str(count_save)+'.npy',np.array(save_result, dtype=object))
+    for persistent_request in receivers+senders:
+        if persistent_request is not None:
+            if persistent_request.active:
+                persistent_request.wait()
+            persistent_request.free()
     for index,comm in  enumerate(comm_send):
         end_mpi(comm,result_path+"/translation/receive_from_tvb/"+str(id_proxy[index])+".txt",True,logger)
     for index,comm in  enumerate(comm_receive):
@@ -387,27 +431,180 @@ def send_mpi(comm,times,data):
 def receive_mpi(comm):
     """
         receive proxy values the
+    NOTE: the translator NEST to TVB sends the rates from its rank 1 (rank 0 receives from NEST)
     :param comm: MPI communicator
     :return: rate of all proxy
     """
     status_ = MPI.Status()
     # send to the translator : I want the next part
-    req = comm.isend(True, dest=0, tag=0)
+    req = comm.isend(True, dest=1, tag=0)
     req.wait()
     time_step = np.empty(2, dtype='d')
-    comm.Recv([time_step, 2, MPI.DOUBLE], source=0, tag=MPI.ANY_TAG, status=status_)
+    comm.Recv([time_step, 2, MPI.DOUBLE], source=1, tag=MPI.ANY_TAG, status=status_)
     # get the size of the rate
     size=np.empty(1,dtype='i')
-    comm.Recv([size, MPI.INT], source=0, tag=0)
+    comm.Recv([size, MPI.INT], source=1, tag=0)
     # get the rate
     rates = np.empty(size[0], dtype='d')
-    comm.Recv([rates,size[0], MPI.DOUBLE],source=0,tag=MPI.ANY_TAG,status=status_)
+    comm.Recv([rates,size[0], MPI.DOUBLE],source=1,tag=MPI.ANY_TAG,status=status_)
     # print the summary of the data
     if status_.Get_tag() == 0:
         return time_step,rates
     else:
         return None # TODO take in count
 
+class persistent_send:
+    def __init__(self,comm,nb_value):
+        """
+        send_mpi with persistent requests and preallocated buffers
+        The messages of a step have the same shapes for the whole run (2 times, 1 size, nb_value rates):
+        the requests are created once and only started each step.
+        NOTE: the messages and their order are the ones of send_mpi: the data are sent after the check of the
+        translator, the pickled check is received as bytes
+        :param comm: MPI communicator
+        :param nb_value: number of rates of each step
+        """
+        self.check = bytearray(64) # pickled check of the translator
+        self.active = False # sending started and not finished
+        self.times = np.empty(2,dtype='d')
+        self.shape = np.array(nb_value,dtype='i')
+        self.data = np.empty(nb_value,dtype='d')
+        self.status = MPI.Status()
+        self.request_check = comm.Recv_init([self.check,MPI.BYTE],source=0,tag=0)
+        self.requests = [comm.Send_init([self.times,MPI.DOUBLE],dest=0,tag=0),
+                         comm.Send_init([self.shape,MPI.INT],dest=0,tag=0),
+                         comm.Send_init([self.data,MPI.DOUBLE],dest=0,tag=0)]
+
+    def send(self,times,data):
+        """
+        send mpi data, see send_mpi
+        :param times: times of values
+        :param data: rates inputs, nb_value rates
+        :return:nothing
+        """
+        self.start(times,data)
+        self.wait()
+
+    def start(self,times,data):
+        """
+        start to send mpi data, without waiting for the end of the sending (see wait)
+        NOTE: the check of the translator is awaited first, like send_mpi: no data are sent before the
+        translator accepts them (the translator sends its check as soon as it is ready for the next step)
+        :param times: times of values
+        :param data: rates inputs, nb_value rates
+        :return:nothing
+        """
+        # wait until the translator accept the connections
+        accept = False
+        while not accept:
+            self.request_check.Start()
+            self.request_check.Wait(self.status)
+            accept = MPI.pickle.loads(self.check[:self.status.Get_count(MPI.BYTE)])
+        self.times[:] = times
+        self.data[:] = data
+        MPI.Prequest.Startall(self.requests)
+        self.active = True
+
+    def wait(self):
+        """
+        wait for the end of the sending started by start
+        :return:nothing
+        """
+        MPI.Request.Waitall(self.requests)
+        self.active = False
+
+    def free(self):
+        """
+        free the persistent requests
+        """
+        for request in [self.request_check]+self.requests:
+            request.Free()
+
+
+class persistent_receive:
+    def __init__(self,comm,nb_value):
+        """
+        receive_mpi with persistent requests and preallocated buffers, see persistent_send
+        :param comm: MPI communicator
+        :param nb_value: number of rates of each step (the size of the first step, see receive_mpi)
+        """
+        self.active = False # reception started and not finished
+        self.check = bytearray(MPI.pickle.dumps(True)) # pickled like comm.isend(True)
+        self.time_step = np.empty(2,dtype='d')
+        self.size = np.empty(1,dtype='i')
+        self.rates = np.empty(nb_value,dtype='d')
+        self.statuses = [MPI.Status() for i in range(3)]
+        self.request_check = comm.Send_init([self.check,MPI.BYTE],dest=1,tag=0)
+        # NOTE: the requests are started in this order, the messages of the translator are matched in this order
+        self.requests = [comm.Recv_init([self.time_step,MPI.DOUBLE],source=1,tag=MPI.ANY_TAG),
+                         comm.Recv_init([self.size,MPI.INT],source=1,tag=0),
+                         comm.Recv_init([self.rates,MPI.DOUBLE],source=1,tag=MPI.ANY_TAG)]
+
+    def receive(self):
+        """
+        receive proxy values, see receive_mpi
+        NOTE: the arrays are the buffers of the next step, copy them to keep them
+        :return: rate of all proxy
+        """
+        self.start()
+        return self.wait()
+
+    def start(self):
+        """
+        start to receive proxy values (see wait)
+        :return: nothing
+        """
+        # send to the translator : I want the next part
+        self.request_check.Start()
+        MPI.Prequest.Startall(self.requests)
+        self.active = True
+
+    def wait(self,status_rates=None):
+        """
+        wait for the proxy values requested by start
+        NOTE: the arrays are the buffers of the next step, copy them to keep them
+        :param status_rates: the status of the rates if their request is already completed (see receive_all)
+        :return: rate of all proxy
+        """
+        self.request_check.Wait()
+        MPI.Request.Waitall(self.requests,self.statuses)
+        self.active = False
+        if status_rates is None:
+            status_rates = self.statuses[2]
+        if self.size[0] != self.rates.shape[0]:
+            raise Exception('the size of the rates changed : '+str(self.size[0])+' instead of '+str(self.rates.shape[0]))
+        if status_rates.Get_tag() == 0:
+            return self.time_step,self.rates
+        else:
+            return None # TODO take in count
+
+    def free(self):
+        """
+        free the persistent requests
+        """
+        for request in [self.request_check]+self.requests:
+            request.Free()
+
+def receive_all(receivers):
+    """
+    receive the values of all the proxies concurrently, in the order of their arrival
+    :param receivers: the persistent_receive of each proxy
+    :return: the times and the rates of each proxy, array (time, proxy)
+    """
+    for receiver in receivers:
+        receiver.start()
+    data_value = None
+    status_ = MPI.Status()
+    requests_rates = [receiver.requests[2] for receiver in receivers]
+    for i in range(len(receivers)):
+        index = MPI.Request.Waitany(requests_rates,status_)
+        receive = receivers[index].wait(status_)
+        if data_value is None:
+            data_value = np.empty((receive[1].shape[0],len(receivers)))
+        time_data = receive[0]
+        data_value[:,index] = receive[1]
+    return time_data,data_value
+
 def end_mpi(comm,path,sending,logger):
     """
     ending the communication
@@ -438,7 +635,7 @@ def end_mpi(comm,path,sending,logger):
     else:
         logger.info("TVB close connection receive " + port)
         # send to the translator : I want the next part
-        req = comm.isend(True, dest=0, tag=1)
+        req = comm.isend(True, dest=1, tag=1)
         req.wait()
     # closing the connection at this end
     logger.info("TVB disconnect communication")
@@ -0,0 +1,9 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+"""
+Unit tests for the TVB module.
+
+This package contains unit tests for the mean field models of TVB,
+independently of the co-simulation.
+"""
@@ -0,0 +1,75 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+"""
+Unit tests for the specific noises of TVB.
+
+This module checks the Ornstein-Uhlenbeck process against its recursion
+step by step.
+"""
+
+import numpy as np
+import pytest
+
+
+def noise_OU(dtype=np.float64, seed=45):
+    """The Ornstein-Uhlenbeck noise of the example of the co-simulation for 7 variables and 10 nodes"""
+    from nest_elephant_tvb.Tvb.modify_tvb.noise import Ornstein_Ulhenbeck_process
+
+    noise = Ornstein_Ulhenbeck_process(tau_OU=20.0, mu=np.array([0.7, 0., 0., 0., 0., 0., 0.]).reshape((7, 1, 1)),
+                                       nsig=np.array([0.2, 0., 0., 0., 0., 0., 0.]).reshape((7, 1, 1)),
+                                       weights=np.array([1e-2, 0., 0., 0., 0., 0., 0.]).reshape((7, 1, 1)))
+    noise.dtype = dtype
+    noise.random_stream.seed(seed)
+    noise.configure_white(0.1, (7, 10, 1))
+    return noise
+
+
+def reference_OU(nb_step, seed=45):
+    """The recursion of the Ornstein-Uhlenbeck process step by step"""
+    random_stream = np.random.RandomState(seed)
+    value = 0.0
+    result = []
+    for step in range(nb_step):
+        value = value - 0.1/20.0*value + np.sqrt(0.1)*random_stream.normal(size=(7, 10, 1))
+        result.append(0.7*(np.arange(7) == 0).reshape((7, 1, 1)) +
+                      np.array([0.2, 0., 0., 0., 0., 0., 0.]).reshape((7, 1, 1))*value)
+    return np.array(result)
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_OU_identical_to_the_recursion(dtype):
+    """Test the noise against the recursion, in the precision of the noise"""
+    noise = noise_OU(dtype)
+    result = np.array([noise.generate((7, 10, 1)) for step in range(200)])
+    assert result.dtype == dtype and noise.gfun(None).dtype == dtype
+    if dtype == np.float64:
+        np.testing.assert_array_equal(result, reference_OU(200))
+    else:
+        np.testing.assert_allclose(result, reference_OU(200), rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+@pytest.mark.parametrize('block', [7, 35, 200])
+def test_OU_block_identical_to_step_by_step(dtype, block):
+    """Test that the noise generated by block is the noise generated step by step, block after block"""
+    reference = noise_OU(dtype)
+    noise = noise_OU(dtype)
+    noise.block = block
+    for step in range(150):
+        expected = reference.generate((7, 10, 1))
+        result = noise.generate((7, 10, 1))
+        assert result.dtype == dtype
+        np.testing.assert_array_equal(result, expected)
+        result *= 2.0  # the integrator modifies the noise in place
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_OU_gfun_before_generate(dtype):
+    """Test gfun before the first generation, like the integrators of TVB"""
+    noise = noise_OU(dtype)
+    gfun = noise.gfun(None)
+    assert gfun.dtype == dtype
+    np.testing.assert_allclose(gfun, noise.weights*1e-3, rtol=1e-7)
+    noise.generate((7, 10, 1))
+    np.testing.assert_array_equal(noise.gfun(None), gfun)
@@ -0,0 +1,186 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+"""
+Unit tests for the Zerlaut mean field models.
+
+This module checks the engines of the derivatives against the numpy
+implementation of the models.
+"""
+
+import numpy as np
+import pytest
+
+
+def model_first_order(model_class=None, **kwargs):
+    """The first order model (or model_class) with the parameters of the example of the co-simulation"""
+    from nest_elephant_tvb.Tvb.modify_tvb.Zerlaut import ZerlautAdaptationFirstOrder
+
+    parameters = dict(
+        g_L=np.array([10.0]), E_L_e=np.array([-63.0]), E_L_i=np.array([-65.0]), C_m=np.array([200.0]),
+        b_e=np.array([60.0]), a_e=np.array([0.0]), b_i=np.array([0.0]), a_i=np.array([0.0]),
+        tau_w_e=np.array([500.0]), tau_w_i=np.array([1.0]), Q_e=np.array([1.0]), Q_i=np.array([5.0]),
+        K_ext_e=np.array([400]))
+    # the engine of dfun is not a trait
+    engine = kwargs.pop('dfun_engine', 'numpy')
+    parameters.update(kwargs)
+    model = (model_class or ZerlautAdaptationFirstOrder)(**parameters)
+    model.dfun_engine = engine
+    model.configure()
+    return model
+
+
+def state_first_order(nb_node, seed=0):
+    """Random states (E, I, W_e, W_i) and coupling of the nodes in the range of the co-simulation"""
+    rng = np.random.default_rng(seed)
+    state = np.array([rng.uniform(0.0, 0.05, nb_node), rng.uniform(0.0, 0.08, nb_node),
+                      rng.uniform(0.0, 200.0, nb_node), rng.uniform(0.0, 10.0, nb_node)])
+    return state[:, :, np.newaxis], rng.uniform(0.0, 0.01, (1, nb_node, 1))
+
+
+@pytest.mark.parametrize('engine', ['fused', 'fused_parallel'])
+@pytest.mark.parametrize('local_coupling', [0.0, 0.3])
+def test_fused_first_order_identical_to_numpy(engine, local_coupling):
+    """Test the fused kernel of the first order model against the numpy implementation"""
+    state, coupling = state_first_order(500)
+    reference = model_first_order().dfun(state, coupling, local_coupling)
+    derivative = model_first_order(dfun_engine=engine).dfun(state, coupling, local_coupling)
+    assert derivative.shape == reference.shape
+    for variable in range(4):
+        np.testing.assert_allclose(derivative[variable], reference[variable], rtol=1e-12,
+                                   atol=1e-12*np.max(np.abs(reference[variable])))
+
+
+def test_fused_first_order_parameters_by_node():
+    """Test the fused kernel with parameters different for each node"""
+    state, coupling = state_first_order(50, seed=1)
+    # one row by node for the broadcasting of the numpy implementation
+    parameters = {'b_e': np.linspace(0.0, 100.0, 50)[:, np.newaxis], 'T': np.linspace(5.0, 40.0, 50)[:, np.newaxis]}
+    reference = model_first_order(**parameters).dfun(state, coupling)
+    model = model_first_order(dfun_engine='fused', **parameters)
+    np.testing.assert_allclose(model.dfun(state, coupling), reference, rtol=1e-12, atol=1e-12)
+    assert model.parameters_fused(50).shape[1] == 50
+
+
+def test_fused_first_order_float32():
+    """Test that the fused kernel keeps the precision of the state variables in float32"""
+    state, coupling = state_first_order(200, seed=3)
+    model = model_first_order(dfun_engine='fused')
+    reference = model.dfun(state, coupling)
+    derivative = model.dfun(state.astype(np.float32), coupling.astype(np.float32))
+    assert derivative.dtype == np.float32
+    for variable in range(4):
+        np.testing.assert_allclose(derivative[variable], reference[variable], rtol=1e-4,
+                                   atol=1e-5*np.max(np.abs(reference[variable])))
+
+
+@pytest.mark.parametrize('engine', ['fused', 'fused_parallel'])
+def test_fused_second_order_identical_to_numpy(engine):
+    """Test the fused stencil of the second order model against the numerical derivatives of numpy"""
+    from nest_elephant_tvb.Tvb.modify_tvb.Zerlaut import ZerlautAdaptationSecondOrder
+
+    state, coupling = state_first_order(500)
+    rng = np.random.default_rng(2)
+    covariance = [rng.uniform(0.0, 1e-5, 500), rng.uniform(-1e-6, 1e-6, 500), rng.uniform(0.0, 1e-5, 500)]
+    state = np.concatenate((state[:2], np.array(covariance)[:, :, np.newaxis], state[2:]))
+    reference = model_first_order(ZerlautAdaptationSecondOrder).dfun(state, coupling, 0.1)
+    derivative = model_first_order(ZerlautAdaptationSecondOrder, dfun_engine=engine).dfun(state, coupling, 0.1)
+    # the rounding of the transfer functions is amplified by the second differences
+    for variable in range(7):
+        np.testing.assert_allclose(derivative[variable], reference[variable], rtol=1e-9,
+                                   atol=1e-11*np.max(np.abs(reference[variable])))
+
+
+def simulate(model, length=2.0):
+    """Configure a simulator of 10 nodes (the size of the polynomes) with the model and run it"""
+    # NOTE: not tvb.simulator.lab, it changes the level of the loggers of the captured outputs
+    from tvb.datatypes import connectivity
+    from tvb.simulator import coupling, integrators, monitors, simulator
+
+    rng = np.random.default_rng(4)
+    weights = rng.uniform(0.0, 1.0, (10, 10))
+    np.fill_diagonal(weights, 0.0)
+    sim = simulator.Simulator(model=model,
+                              connectivity=connectivity.Connectivity(
+                                  weights=weights, tract_lengths=rng.uniform(1.0, 10.0, (10, 10)),
+                                  region_labels=np.array([str(i) for i in range(10)]),
+                                  centres=rng.uniform(0.0, 1.0, (10, 3)), speed=np.array([3.0])),
+                              coupling=coupling.Linear(a=np.array([0.3])),
+                              integrator=integrators.HeunDeterministic(dt=0.1),
+                              monitors=[monitors.Raw()],
+                              initial_conditions=rng.uniform(0.0, 0.01, (100, len(model.state_variables), 10, 1)))
+    sim.configure()
+    (time, data), = sim.run(simulation_length=length)
+    return data
+
+
+@pytest.mark.parametrize('engine', ['fused', 'fused_parallel'])
+@pytest.mark.parametrize('order', [1, 2])
+def test_engine_in_the_simulator(engine, order):
+    """Test the configuration of the simulator and a few steps with the engine against the numpy engine"""
+    from nest_elephant_tvb.Tvb.modify_tvb.Zerlaut import ZerlautAdaptationFirstOrder, ZerlautAdaptationSecondOrder
+
+    model_class = ZerlautAdaptationFirstOrder if order == 1 else ZerlautAdaptationSecondOrder
+    variables = model_class.state_variables
+    reference = simulate(model_first_order(model_class, variables_of_interest=variables))
+    data = simulate(model_first_order(model_class, dfun_engine=engine, variables_of_interest=variables))
+    assert data.shape == (20, len(variables), 10, 1)
+    assert np.all(np.isfinite(data))
+    for variable in range(len(variables)):
+        np.testing.assert_allclose(data[:, variable], reference[:, variable], rtol=1e-9,
+                                   atol=1e-11*np.max(np.abs(reference[:, variable])))
+
+
+def model_tabulated(**kwargs):
+    """The first order model with the engine tabulated and small tables"""
+    model = model_first_order(dfun_engine='tabulated')
+    model.table_error = 2e-3
+    for name, value in kwargs.items():
+        setattr(model, name, value)
+    return model
+
+
+def test_tabulated_first_order_within_the_error_bound():
+    """Test the tabulated transfer functions against the exact ones, inside and outside the domain of the tables"""
+    model = model_tabulated()
+    reference = model_first_order()
+    state, coupling = state_first_order(5000, seed=5)
+    E, I, W = state[0, :, 0], state[1, :, 0], state[2, :, 0]
+    fe_ext = coupling[0, :, 0]
+    for table in model.transfer_function_tables():
+        assert table.error <= 1e-3
+    np.testing.assert_allclose(model.TF_excitatory(E, I, fe_ext, 0.0, W), reference.TF_excitatory(E, I, fe_ext, 0.0, W),
+                               rtol=0.0, atol=2e-3)
+    np.testing.assert_allclose(model.TF_inhibitory(E, I, fe_ext, 0.0, W), reference.TF_inhibitory(E, I, fe_ext, 0.0, W),
+                               rtol=0.0, atol=2e-3)
+    # adaptation above the domain of the tables : exact transfer function
+    W = W + 1000.0
+    np.testing.assert_allclose(model.TF_excitatory(E, I, fe_ext, 0.0, W), reference.TF_excitatory(E, I, fe_ext, 0.0, W),
+                               rtol=1e-12, atol=1e-15)
+    derivative = model.dfun(state, coupling, 0.3)
+    expected = reference.dfun(state, coupling, 0.3)
+    assert derivative.shape == expected.shape
+    np.testing.assert_allclose(derivative[:2], expected[:2], rtol=0.0, atol=2e-3/20.0)
+    np.testing.assert_allclose(derivative[2:], expected[2:], rtol=1e-12)
+
+
+def test_tabulated_cache_on_the_disk(tmp_path):
+    """Test that the tables are saved on the disk and loaded by the next model with the same parameters"""
+    tables = model_tabulated(table_path=str(tmp_path)).transfer_function_tables()
+    assert len(list(tmp_path.iterdir())) == 2
+    loaded = model_tabulated(table_path=str(tmp_path)).transfer_function_tables()
+    for table, table_loaded in zip(tables, loaded):
+        np.testing.assert_array_equal(table_loaded.table, table.table)
+        assert table_loaded.error == table.error
+    # other parameters of the tables : other files
+    model_tabulated(table_path=str(tmp_path), table_error=3e-3).transfer_function_tables()
+    model_tabulated(table_path=str(tmp_path), tau_e=np.array([6.0])).transfer_function_tables()
+    assert len(list(tmp_path.iterdir())) == 6
+
+
+def test_tabulated_refused_for_the_second_order():
+    """Test that the engine tabulated is refused by the second order model, the tables have no second derivatives"""
+    from nest_elephant_tvb.Tvb.modify_tvb.Zerlaut import ZerlautAdaptationSecondOrder
+
+    with pytest.raises(Exception, match='first order'):
+        model_first_order(ZerlautAdaptationSecondOrder, dfun_engine='tabulated')
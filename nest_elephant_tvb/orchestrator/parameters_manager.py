@@ -250,6 +250,10 @@ def _create_linked_parameters_dict(results_path, parameters):
         param_TR_tvb_to_nest['level_log']= param_co_simulation['level_log']
         param_TR_tvb_to_nest['seed'] = param_nest['master_seed']-3
         param_TR_tvb_to_nest['nb_synapses'] = param_nest_connection['nb_external_synapse']
+        param_TR_tvb_to_nest['synch'] = param_co_simulation['synchronization']
+        param_TR_tvb_to_nest['resolution'] = param_nest['sim_resolution']
+        param_TR_tvb_to_nest['transport'] = param_co_simulation.get('transport_tvb_to_nest', 'spikes')
+        param_TR_tvb_to_nest['experimental_transport'] = param_co_simulation.get('experimental_transport', False)
         parameters['param_TR_tvb_to_nest'] = param_TR_tvb_to_nest
 
         # parameters for the translation nest to TVB
@@ -120,6 +120,8 @@ def run(parameters_file):
         ensure_directories(results_path, translation_dirs)
 
         id_proxy = param_co_simulation['id_region_nest']
+        param_TR_nest_to_tvb = BackwardCompatibilityManager.get_parameter_value(parameters, 'param_TR_nest_to_tvb')
+        param_TR_tvb_to_nest = BackwardCompatibilityManager.get_parameter_value(parameters, 'param_TR_tvb_to_nest')
 
         #Run Nest and take information for the connection between all the mpi process
         logger.info("Orchestrator: Starting NEST simulation process.")
@@ -192,17 +194,23 @@ def run(parameters_file):
         logger.info("TVB is ready to use")
 
         # create translator between Nest to TVB :
-        # one by proxy/spikedetector
-        for index,id_spike_detector in enumerate(spike_detector):
-            logger.info(f"Orchestrator: Starting nest_to_tvb translator for spike_detector: {id_spike_detector} and proxy: {id_proxy[index]}")
+        # one by group of 'nb_region_by_process' proxy/spikedetector (default: one by proxy/spikedetector)
+        nb_region_by_process = param_TR_nest_to_tvb.get('nb_region_by_process', 1)
+        for index in range(0, len(spike_detector), nb_region_by_process):
+            ids_spike_detector = spike_detector[index:index+nb_region_by_process]
+            logger.info(f"Orchestrator: Starting nest_to_tvb translator for spike_detector: {ids_spike_detector} and proxy: {id_proxy[index:index+len(ids_spike_detector)]}")
             dir_path = os.path.dirname(os.path.realpath(__file__))+"/../translation/run_mpi_nest_to_tvb.sh"
+            files = [["/translation/spike_detector/"+str(id_spike_detector)+".txt",
+                      "/translation/send_to_tvb/"+str(id_proxy[index+i])+".txt"]
+                     for i, id_spike_detector in enumerate(ids_spike_detector)]
             argv=[ '/bin/sh',
                    dir_path,
                    mpirun,
                    results_path,
-                   "/translation/spike_detector/"+str(id_spike_detector)+".txt",
-                   "/translation/send_to_tvb/"+str(id_proxy[index])+".txt",
-                   ]
+                   files[0][0],
+                   files[0][1],
+                   str(param_TR_nest_to_tvb.get('nb_MPI', 2)),
+                   ] + [file for pair in files[1:] for file in pair]
             logger.info(f"Orchestrator: nest_to_tvb translator launch command: {' '.join(argv)}")
             processes.append(subprocess.Popen(argv,
                              #need to check if it's needed or not (doesn't work for me)
@@ -221,6 +229,7 @@ def run(parameters_file):
                    str(ids_spike_generator[0]),
                    str(len(ids_spike_generator)),
                    "/../receive_from_tvb/"+str(id_proxy[index])+".txt",
+                   str(param_TR_tvb_to_nest.get('nb_MPI', 2)),
                    ]
             logger.info(f"Orchestrator: tvb_to_nest translator launch command: {' '.join(argv)}")
             processes.append(subprocess.Popen(argv,
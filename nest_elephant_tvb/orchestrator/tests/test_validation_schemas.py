@@ -53,6 +53,29 @@ class TestCoSimulationParams:
         assert "nb_MPI_nest" in str(exc_info.value)
         assert "greater than or equal to 1" in str(exc_info.value)
     
+    def test_transport_tvb_to_nest(self):
+        """Test that the transport TVB to NEST is spikes by default and only spikes or rates"""
+        from nest_elephant_tvb.orchestrator.validation.schemas import CoSimulationParams
+        
+        params = {
+            "co-simulation": True,
+            "nb_MPI_nest": 10,
+            "level_log": 1
+        }
+        assert CoSimulationParams(**params).transport_tvb_to_nest == 'spikes'
+        assert CoSimulationParams(transport_tvb_to_nest='rates', experimental_transport=True,
+                                  **params).transport_tvb_to_nest == 'rates'
+        
+        with pytest.raises(ValidationError) as exc_info:
+            CoSimulationParams(transport_tvb_to_nest='rates', **params)
+        
+        assert "experimental_transport" in str(exc_info.value)
+        
+        with pytest.raises(ValidationError) as exc_info:
+            CoSimulationParams(transport_tvb_to_nest='currents', **params)
+        
+        assert "transport_tvb_to_nest" in str(exc_info.value)
+    
     def test_invalid_log_level(self):
         """Test that invalid log levels are rejected"""
         from nest_elephant_tvb.orchestrator.validation.schemas import CoSimulationParams
@@ -157,6 +180,32 @@ class TestSimulationParameters:
         
         assert "end time must be greater than begin time" in str(exc_info.value)
     
+    def test_transport_rates_without_shared_spikes(self):
+        """Test that the transport of rates to NEST refuses the parameters of the shared spikes"""
+        from nest_elephant_tvb.orchestrator.validation.schemas import SimulationParameters
+        
+        params = {
+            "result_path": "/tmp/test_simulation",
+            "begin": 0.0,
+            "end": 100.0,
+            "param_co_simulation": {
+                "co-simulation": True,
+                "nb_MPI_nest": 10,
+                "level_log": 1,
+                "transport_tvb_to_nest": "rates",
+                "experimental_transport": True
+            },
+            "param_TR_nest_to_tvb": {"some": "config"},
+            "param_TR_tvb_to_nest": {"nb_synapses": 10}
+        }
+        assert SimulationParameters(**params).param_co_simulation.transport_tvb_to_nest == 'rates'
+        
+        params["param_TR_tvb_to_nest"] = {"percentage_shared": 0.5, "function_select": 2}
+        with pytest.raises(ValidationError) as exc_info:
+            SimulationParameters(**params)
+        
+        assert "percentage_shared" in str(exc_info.value)
+    
     def test_backward_compatibility_extra_fields(self):
         """Test that extra fields are preserved for backward compatibility"""
         from nest_elephant_tvb.orchestrator.validation.schemas import SimulationParameters
@@ -10,7 +10,7 @@ TVB-NEST co-simulation framework.
 """
 
 from pydantic import BaseModel, Field, field_validator, model_validator, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 from pathlib import Path
 
 
@@ -29,6 +29,23 @@ class CoSimulationParams(BaseModel):
     synchronization: Optional[float] = Field(None, gt=0.1, lt=1000.0, description="Synchronization time")
     id_region_nest: Optional[List[int]] = Field(None, description="NEST region IDs")
     record_MPI: bool = Field(default=False, description="Record MPI communications")
+    transport_tvb_to_nest: Literal['spikes', 'rates'] = Field(
+        default='spikes',
+        description="Data sent by TVB to NEST translators: spike trains or rates "
+                    "(EXPERIMENTAL: 'rates' needs a NEST build whose inhomogeneous_poisson_generator "
+                    "has an MPI stimulus source)",
+        json_schema_extra={'experimental': ['rates']})
+    experimental_transport: bool = Field(
+        default=False,
+        description="Allow the experimental transports of transport_tvb_to_nest ('rates'), "
+                    "not verified against the NEST builds of the co-simulation")
+    
+    @model_validator(mode='after')
+    def validate_experimental_transport(self):
+        """Validate that the experimental transports are explicitly allowed"""
+        if self.transport_tvb_to_nest == 'rates' and not self.experimental_transport:
+            raise ValueError("transport_tvb_to_nest 'rates' is experimental: set experimental_transport to True")
+        return self
     
     @field_validator('id_region_nest')
     @classmethod
@@ -99,6 +116,16 @@ class SimulationParameters(BaseModel):
                     raise ValueError(f"Co-simulation requires {section} section")
         return self
     
+    @model_validator(mode='after')
+    def validate_transport_tvb_to_nest(self):
+        """Validate that the transport of rates to NEST is not used with the shared spikes"""
+        if self.param_co_simulation.transport_tvb_to_nest == 'rates' and self.param_TR_tvb_to_nest:
+            if self.param_TR_tvb_to_nest.get('percentage_shared', 0.0) > 0.0 \
+                    or 'function_select' in self.param_TR_tvb_to_nest:
+                raise ValueError("transport_tvb_to_nest 'rates' has no shared spikes: "
+                                 "remove percentage_shared and function_select of param_TR_tvb_to_nest")
+        return self
+    
     @field_validator('result_path')
     @classmethod
     def validate_result_path(cls, v):
@@ -0,0 +1,153 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+import numpy as np
+import time
+
+# columns of one record of the timeline, one record by step of the translator
+# step, region : the synchronization step and the region of the record
+# wait, receive, analyse, send : time spent (s) in each part of the step
+# bytes, events : size of the data received or sent, number of spikes or rates
+# high_water : high-water mark of the shared buffer, maximum of bytes used in one slot since the beginning
+fields = ('step', 'region', 'wait', 'receive', 'analyse', 'send', 'bytes', 'events', 'high_water')
+STEP, REGION, WAIT, RECEIVE, ANALYSE, SEND, BYTES, EVENTS, HIGH_WATER = range(len(fields))
+
+
+def create_timeline(path, name, param):
+    """
+    create the timeline of a translator process
+    :param path: folder of the file of the timeline
+    :param name: name of the process, the file is path/timeline_<name>.bin (or .csv)
+    :param param: parameters of the translator :
+        'timeline' : record the timeline (default False)
+        'timeline_format' : 'binary' (raw float64 records, see read_timeline) or 'csv' (default 'binary')
+        'timeline_block' : number of records kept in memory before writing them (default 1024)
+    :return: the timeline, or a timeline which records nothing
+    """
+    if param.get('timeline', False):
+        return timeline(path, name, param.get('timeline_format', 'binary'), param.get('timeline_block', 1024))
+    return no_timeline()
+
+
+def read_timeline(file):
+    """
+    read a timeline written by a translator
+    :param file: the file of the timeline (.bin or .csv)
+    :return: the records, structured array with the fields of the timeline
+    """
+    if file.endswith('.csv'):
+        data = np.loadtxt(file, delimiter=',', skiprows=1, ndmin=2)
+    else:
+        data = np.fromfile(file, dtype='<f8').reshape(-1, len(fields))
+    return np.rec.fromarrays(data.T, names=list(fields))
+
+
+class timeline:
+    def __init__(self, path, name, file_format='binary', block=1024):
+        """
+        counters and timers of the steps of a translator, preallocated and written by block
+        The cost by step is a few clock reads and additions in memory, nothing is formatted.
+        :param path: folder of the file of the timeline
+        :param name: name of the process
+        :param file_format: 'binary' or 'csv'
+        :param block: number of records in memory
+        """
+        self.file_format = file_format
+        self.file = path + '/timeline_' + name + ('.csv' if file_format == 'csv' else '.bin')
+        self.data = np.zeros((block, len(fields)))
+        self.index = 0                        # current record
+        self.record = self.data[0]
+        self.mark = time.perf_counter()       # time of the last measure
+        with open(self.file, 'w') as f:       # new file with the header
+            if file_format == 'csv':
+                f.write(','.join(fields) + '\n')
+
+    def tic(self):
+        """
+        start of a measure of time
+        """
+        self.mark = time.perf_counter()
+
+    def toc(self, field):
+        """
+        add the time since the last measure to a timer of the current record and start the next measure
+        :param field: the column of the timer (WAIT, RECEIVE, ANALYSE or SEND)
+        """
+        now = time.perf_counter()
+        self.record[field] += now - self.mark
+        self.mark = now
+
+    def add(self, field, value):
+        """
+        add a value to a counter of the current record
+        :param field: the column of the counter (BYTES or EVENTS)
+        :param value: the value to add
+        """
+        self.record[field] += value
+
+    def set(self, field, value):
+        """
+        set a value of the current record
+        :param field: the column of the value (HIGH_WATER)
+        :param value: the value
+        """
+        self.record[field] = value
+
+    def next(self, step, region=0):
+        """
+        end of the current record
+        :param step: the synchronization step of the record
+        :param region: the region of the record
+        """
+        self.record[STEP] = step
+        self.record[REGION] = region
+        self.index += 1
+        if self.index == self.data.shape[0]:
+            self.flush()
+        self.record = self.data[self.index]
+
+    def flush(self):
+        """
+        write the finished records and reinitialise the block
+        """
+        with open(self.file, 'ab') as f:
+            if self.file_format == 'csv':
+                np.savetxt(f, self.data[:self.index], delimiter=',', fmt='%.9g')
+            else:
+                self.data[:self.index].astype('<f8').tofile(f)
+        self.data[:self.index] = 0.0
+        self.index = 0
+
+    def close(self):
+        """
+        write the last records (an unfinished record is dropped)
+        """
+        self.flush()
+        self.record = self.data[0]
+        self.record[:] = 0.0
+
+
+class no_timeline:
+    """
+    timeline which records nothing (param['timeline'] is False)
+    """
+    def tic(self):
+        pass
+
+    def toc(self, field):
+        pass
+
+    def add(self, field, value):
+        pass
+
+    def set(self, field, value):
+        pass
+
+    def next(self, step, region=0):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
@@ -7,16 +7,19 @@ from mpi4py import MPI
 from threading import Thread, Lock
 import pathlib
 import time
-from nest_elephant_tvb.translation.science_nest_to_tvb import store_data
+from nest_elephant_tvb.translation.science_nest_to_tvb import store_data,event_unit
 from nest_elephant_tvb.translation.nest_to_tvb import create_logger
+from nest_elephant_tvb.translation.instrumentation import create_timeline,WAIT,RECEIVE,ANALYSE,BYTES,EVENTS
 
-def receive(logger, store, status_data, buffer, comm_receiver, lock_status):
+def receive(logger, store, status_data, buffer, comm_receiver, lock_status, timeline):
     """
     Receive data from the Nest simulation and put it in the shared buffer.
+    NOTE: with param['timeline'], the steps are recorded in log/timeline_<logger>, see instrumentation.create_timeline
     """
     status = MPI.Status()
     count = 0 # step counter
     
+    timeline.tic()
     while True:
         check = np.empty(1, dtype='b')
         # Probing first to get tag and source without consuming the message
@@ -28,6 +31,7 @@ def receive(logger, store, status_data, buffer, comm_receiver, lock_status):
             logger.info("Receive: MPI Exception, probably disconnected. Exiting.")
             break
             
+        timeline.toc(WAIT)
         tag = status.Get_tag()
         source = status.Get_source()
         
@@ -41,23 +45,31 @@ def receive(logger, store, status_data, buffer, comm_receiver, lock_status):
             shape = np.empty(1, dtype='i')
             comm_receiver.Recv([shape, 1, MPI.INT], source=source, tag=0, status=status)
             # receive data
-            data = np.empty(shape[0], dtype='d')
-            comm_receiver.Recv([data, MPI.DOUBLE], source=source, tag=0, status=status)
+            # (bytes of the events in the encoding of param['event_format'], see science_nest_to_tvb.event_dtypes)
+            data = np.empty(shape[0]*event_unit(store.event_format), dtype=np.uint8)
+            comm_receiver.Recv([data, MPI.DOUBLE if store.event_format == 'double' else MPI.BYTE],
+                               source=source, tag=0, status=status)
+            timeline.toc(RECEIVE)
+            timeline.add(BYTES, data.nbytes)
+            timeline.add(EVENTS, data.nbytes//store.event_dtype.itemsize)
             
             while status_data[0] != 1:
                 time.sleep(0.001)
+            timeline.toc(WAIT)
             
             with lock_status:
                 status_data[0] = 0 # busy
             
-            store.add_spikes(count, data)
+            store.add_events(count, data)
             buffer[0] = store.return_data()
+            timeline.toc(ANALYSE)
             
             with lock_status:
                 status_data[0] = 2 # ready
                 
         elif tag == 1: # end of step
             logger.info(f"Receive: End of step {count}")
+            timeline.next(count)
             count += 1
             
         elif tag == 2: # end of simulation
@@ -68,6 +80,7 @@ def receive(logger, store, status_data, buffer, comm_receiver, lock_status):
         else:
             logger.error(f"Receive: Unknown tag {tag}")
     
+    timeline.close()
     logger.info("Receive thread finished.")
 
 
@@ -168,8 +181,9 @@ if __name__ == "__main__":
         # create the thread for receive and save data
         logger_receive = create_logger(path_folder_config, 'nest_to_tvb_receive', level_log)
         logger_save = create_logger(path_folder_config, 'nest_to_tvb_send', level_log)
+        timeline = create_timeline(path_folder_config+'/log/', logger_receive.name, param)
         th_receive = Thread(target=receive,
-                            args=(logger_receive, store, status_data, buffer, comm_receiver, lock_status))
+                            args=(logger_receive, store, status_data, buffer, comm_receiver, lock_status, timeline))
         th_save = Thread(target=save, args=(path_folder_save,logger_save,nb_step,step_save,status_data,buffer, lock_status))
 
         # start the threads
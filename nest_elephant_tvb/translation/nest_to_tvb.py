@@ -39,12 +39,14 @@ if __name__ == "__main__":
     
     ############ Step 1: all argument parsing stuff
     ### TODO: cleanup and proper parsing.
-    if len(sys.argv)!=4:
+    ### NOTE: several pairs of files 'spike detector' 'TVB proxy' for the translation of several regions by the same ranks
+    if len(sys.argv) < 4 or len(sys.argv) % 2 != 0:
         print('incorrect number of arguments')
         exit(1)
     path = sys.argv[1]
-    file_spike_detector = sys.argv[2]
-    TVB_recev_file = sys.argv[3]
+    files_spike_detector = sys.argv[2::2]
+    TVB_recev_files = sys.argv[3::2]
+    file_spike_detector = files_spike_detector[0]
     # take the parameters and instantiate objects for analysing data
     with open(path+'/parameter.json') as f:
         parameters = json.load(f)
@@ -63,30 +65,42 @@ if __name__ == "__main__":
     
     ############ Step 3: RichEndPoint -- open MPI connections
     ### TODO: make this a proper interface
-    path_to_files_receive = path + file_spike_detector # TODO: use proper path operations
-    path_to_files_send = path + TVB_recev_file
-    comm, comm_receiver, port_receive, comm_sender, port_send = REP.make_connections(path_to_files_receive, path_to_files_send, logger_master)
+    ### NOTE: the connections are accepted region by region, in the order of the arguments
+    comm_receivers, comm_senders, ports_receive, ports_send = [], [], [], []
+    for file_spike_detector, TVB_recev_file in zip(files_spike_detector, TVB_recev_files):
+        path_to_files_receive = path + file_spike_detector # TODO: use proper path operations
+        path_to_files_send = path + TVB_recev_file
+        comm, comm_receiver, port_receive, comm_sender, port_send = REP.make_connections(path_to_files_receive, path_to_files_send, logger_master)
+        comm_receivers.append(comm_receiver)
+        comm_senders.append(comm_sender)
+        ports_receive.append(port_receive)
+        ports_send.append(port_send)
     #############
     
     ############ Step 4: MPI Transformer, init and start the co-simulation
     ### TODO: encapsulate loggers, kept all logging stuff here for now to have them in one place
     ### TODO: split Transformer its sub-tasks: RichEndPoint, Transformation, Science
     loggers = [logger_master, logger_receive, logger_send] # list of all the loggers
-    tnt.init(path, param, comm, comm_receiver, comm_sender, loggers)
+    if len(comm_receivers) == 1:
+        tnt.init(path, param, comm, comm_receivers[0], comm_senders[0], loggers)
+    else:
+        tnt.init_regions(path, param, comm, comm_receivers, comm_senders, loggers)
     ############
     
     ############ Step 5: RichEndPoint -- close MPI connections
     ### TODO: make this a proper interface
-    REP.close_and_finalize(port_send, port_receive,logger_master)
+    for port_send, port_receive in zip(ports_send, ports_receive):
+        REP.close_and_finalize(port_send, port_receive,logger_master)
     ############
     
     ############ Step 6: cleanup, delete files
     ### TODO: ugly solution, all MPI ranks want to delete, only the first one can.
     logger_master.info('clean file')
-    try:
-        os.remove(path_to_files_receive)
-        os.remove(path_to_files_send)
-    except FileNotFoundError:
-        pass 
+    for file_spike_detector, TVB_recev_file in zip(files_spike_detector, TVB_recev_files):
+        try:
+            os.remove(path + file_spike_detector)
+            os.remove(path + TVB_recev_file)
+        except FileNotFoundError:
+            pass 
     logger_master.info('end')
     ############
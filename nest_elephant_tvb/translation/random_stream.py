@@ -0,0 +1,116 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+import numpy as np
+
+# constants of Philox4x32-10 (Salmon et al., "Parallel random numbers: as easy as 1, 2, 3", SC 2011)
+PHILOX_M0 = np.uint64(0xD2511F53)
+PHILOX_M1 = np.uint64(0xCD9E8D57)
+PHILOX_W0 = 0x9E3779B9
+PHILOX_W1 = 0xBB67AE85
+MASK_32 = np.uint64(0xFFFFFFFF)
+
+
+def philox4x32(counter, key, rounds=10):
+    """
+    counter-based random generator Philox4x32, vectorized on numpy arrays
+    The 4 random words are a function of the counter and the key only: no state, any number can be drawn
+    in any order by any process.
+    :param counter: the counters, 4 words of 32 bits, array of shape (4, ...)
+    :param key: the key, 2 words of 32 bits
+    :param rounds: number of rounds (10 for Philox4x32-10)
+    :return: the random words, uint32 array of the shape of counter
+    """
+    c0, c1, c2, c3 = [np.asarray(word, dtype=np.uint64) for word in counter]
+    k0, k1 = int(key[0]), int(key[1])
+    for i in range(rounds):
+        product_0 = PHILOX_M0 * c0
+        product_1 = PHILOX_M1 * c2
+        c0, c1, c2, c3 = ((product_1 >> np.uint64(32)) ^ c1 ^ np.uint64(k0), product_1 & MASK_32,
+                          (product_0 >> np.uint64(32)) ^ c3 ^ np.uint64(k1), product_0 & MASK_32)
+        k0 = (k0 + PHILOX_W0) & 0xFFFFFFFF
+        k1 = (k1 + PHILOX_W1) & 0xFFFFFFFF
+    return np.stack((c0, c1, c2, c3)).astype(np.uint32)
+
+
+class counter_random:
+    def __init__(self, seed, region=0):
+        """
+        random numbers of the spike generators, function of (seed, region, stream, step, generator, index) only
+        The numbers of a spike generator do not depend on the other generators, on the order of the calls nor on
+        the process which draws them: the spike trains are the same with one or several science ranks, with or
+        without speculative generation.
+        The key of Philox is derived from (seed, region) by numpy.random.SeedSequence, the counter is
+        (block, generator, step, stream), each block gives 4 numbers.
+        :param seed: the seed of the translator
+        :param region: the region (the first spike generator of the region)
+        """
+        self.key = np.random.SeedSequence([seed, region]).generate_state(2, dtype=np.uint32)
+
+    def uniform(self, stream, step, generator, index):
+        """
+        uniform numbers in ]0,1[, the number index of each generator
+        :param stream: the use of the numbers (different streams are independent)
+        :param step: the step of synchronization
+        :param generator: the index of the spike generator of each number (array)
+        :param index: the index of each number in the stream of its generator (array)
+        :return: the numbers, array of the shape of index
+        """
+        index = np.asarray(index, dtype=np.uint64)
+        generator = np.broadcast_to(np.asarray(generator, dtype=np.uint64), index.shape)
+        words = philox4x32((index >> np.uint64(2), generator, np.full(index.shape, step, dtype=np.uint64),
+                            np.full(index.shape, stream, dtype=np.uint64)), self.key)
+        word = np.take_along_axis(words, (index & np.uint64(3)).astype(np.intp)[np.newaxis], axis=0)[0]
+        return (word + 0.5) * 2.0**-32
+
+    def uniform_block(self, stream, step, generator, nb, first=0):
+        """
+        uniform numbers in ]0,1[, the numbers first to first+nb of each generator (4 numbers by counter)
+        :param stream: the use of the numbers
+        :param step: the step of synchronization
+        :param generator: the indexes of the spike generators (1D array)
+        :param nb: number of numbers by generator
+        :param first: index of the first number, multiple of 4
+        :return: the numbers, array (generator, nb), identical to uniform with index first to first+nb
+        """
+        generator = np.asarray(generator, dtype=np.uint64)
+        nb_block = (nb + 3) // 4
+        block = np.uint64(first // 4) + np.arange(nb_block, dtype=np.uint64)
+        block, generator = np.broadcast_arrays(block[np.newaxis, :], generator[:, np.newaxis])
+        words = philox4x32((block, generator, np.full(block.shape, step, dtype=np.uint64),
+                            np.full(block.shape, stream, dtype=np.uint64)), self.key)
+        words = np.moveaxis(words, 0, -1).reshape(generator.shape[0], nb_block * 4)[:, :nb]
+        return (words + 0.5) * 2.0**-32
+
+    def poisson(self, stream, step, generator, lam):
+        """
+        Poisson numbers by inversion of the cumulative distribution, one uniform number by value
+        :param stream: the use of the numbers
+        :param step: the step of synchronization
+        :param generator: the indexes of the spike generators (1D array)
+        :param lam: the mean of each column (1D array)
+        :return: the numbers, int array (generator, lam)
+        """
+        lam = np.asarray(lam, dtype=np.float64)
+        uniform = self.uniform_block(stream, step, generator, lam.shape[0])
+        # one table of the cumulative distributions of all the columns, shifted by the index of the column:
+        # the table is sorted and one search gives the numbers of all the columns
+        tables = []
+        for i, mean in enumerate(lam):
+            if mean <= 0.0:
+                tables.append(np.array([i + 1.0]))
+                continue
+            # the tail after 10 standard deviations is neglected
+            k = np.arange(int(mean + 10.0 * np.sqrt(mean) + 10.0) + 1)
+            log_factorial = np.concatenate(([0.0], np.cumsum(np.log(k[1:]))))
+            tables.append(i + np.minimum(np.cumsum(np.exp(k * np.log(mean) - mean - log_factorial)), 1.0))
+        start = np.concatenate(([0], np.cumsum([table.shape[0] for table in tables])))
+        table = np.concatenate(tables)
+        uniform += np.arange(lam.shape[0])
+        # the search only for the values which are not 0 (most of the values for the small means)
+        counts = np.zeros(uniform.shape, dtype=np.int64)
+        not_zero = np.nonzero(uniform > table[start[:-1]])
+        column = not_zero[1]
+        counts[not_zero] = np.minimum(np.searchsorted(table, uniform[not_zero]) - start[column],
+                                      start[column + 1] - start[column] - 1)
+        return counts
@@ -10,6 +10,8 @@ from quantities import Hz
 def rates_to_spikes( rates, t_start, t_stop, variation=False):
     """
     Generate spike train with homogenous or inhomogenous Poisson generator
+    NOTE: reference implementation with elephant, one train at a time, see inhomogeneous_poisson for all the trains
+    of one step in one call
     :param rates: an array or a float of quantities
     :param t_start: time to start spike train
     :param t_stop: time where the spike train stop
@@ -30,7 +32,11 @@ def rates_to_spikes( rates, t_start, t_stop, variation=False):
             for rate in rates:
                 signal = AnalogSignal(rate, t_start=t_start, sampling_period=(t_stop - t_start) / rates.shape[-1])
                 result.append(inhomogeneous_poisson_process(signal,as_array=True))
-            return np.array(result)
+            # NOTE: the trains have different lengths, array of objects (np.array(result) fails with numpy >= 1.24)
+            trains = np.empty(len(result), dtype=object)
+            for i, train in enumerate(result):
+                trains[i] = train
+            return trains
     else:
         # the case we have only the rate
         # We generate the homogenous poisson
@@ -44,6 +50,85 @@ def rates_to_spikes( rates, t_start, t_stop, variation=False):
                 result.append(homogeneous_poisson_process(rate=rate, t_start=t_start, t_stop=t_stop, as_array=True))
         return np.array(result)
 
+def inhomogeneous_poisson(rates, t_start, t_stop, nb_train=None, random=np.random):
+    """
+    Generate all the spike trains of one step with an inhomogeneous Poisson process, without units
+    The rate is constant on each of the rates.shape[-1] bins of [t_start,t_stop[ (like the AnalogSignal of
+    rates_to_spikes), so the number of spikes in each bin is Poisson and the spikes are uniform in the bin.
+    All the trains are drawn with one call of the random generator (see generate_data for the seed).
+    :param rates: rates in Hz, one row by spike train (2D) or the same rates for all the trains (1D)
+    :param t_start: time to start spike train (ms)
+    :param t_stop: time where the spike train stop (ms)
+    :param nb_train: number of spike trains for 1D rates (default 1)
+    :param random: the random generator, np.random or a np.random.RandomState
+    :return spikes: the spike times of all the trains (ms), train after train, sorted in each train
+    :return offsets: the spikes of the train i are spikes[offsets[i]:offsets[i+1]]
+    """
+    rates = np.asarray(rates, dtype=np.float64)
+    if rates.ndim == 1:
+        rates = np.broadcast_to(rates, (1 if nb_train is None else nb_train, rates.shape[0]))
+    nb_train, nb_bin = rates.shape
+    bin_width = (t_stop - t_start) / nb_bin
+    counts = random.poisson(rates * (bin_width * 1e-3))  # Hz and ms
+    return _place_spikes(counts, random.random_sample(counts.sum()), t_start, bin_width)
+
+def inhomogeneous_poisson_counter(rates, t_start, t_stop, random, stream, step, generator):
+    """
+    inhomogeneous_poisson with counter-based random numbers (see random_stream.counter_random):
+    the train of each spike generator is a function of (seed, region, stream, step, generator) only,
+    whatever the other generators drawn in the same call.
+    NOTE: one random number by train and by spike (the number of spikes of each bin is not drawn)
+    :param rates: rates in Hz, the same for all the trains (1D)
+    :param t_start: time to start spike train (ms)
+    :param t_stop: time where the spike train stop (ms)
+    :param random: the counter_random of the translator
+    :param stream: the stream of the numbers of spikes, the stream+1 is used for the positions of the spikes
+    :param step: the step of synchronization
+    :param generator: the indexes of the spike generators, one train by generator (1D array)
+    :return spikes, offsets: see inhomogeneous_poisson
+    """
+    rates = np.asarray(rates, dtype=np.float64)
+    nb_bin = rates.shape[0]
+    bin_width = (t_stop - t_start) / nb_bin
+    # same process, fewer random numbers: the number of spikes of the step is Poisson with the sum of the means
+    # and the spikes are independent with the density of the rates, one random number by spike
+    mass = np.concatenate(([0.0], np.cumsum(rates * (bin_width * 1e-3))))  # Hz and ms
+    count_train = random.poisson(stream, step, generator, mass[-1:])[:, 0]
+    # index of each spike in its train
+    index = np.arange(count_train.sum()) - np.repeat(np.cumsum(count_train) - count_train, count_train)
+    mass_spike = random.uniform(stream + 1, step, np.repeat(generator, count_train), index) * mass[-1]
+    bin_spike = np.minimum(np.searchsorted(mass, mass_spike, side='right') - 1, nb_bin - 1)
+    position = bin_spike + (mass_spike - mass[bin_spike]) / (mass[bin_spike + 1] - mass[bin_spike])
+    # one sort orders the trains and the spikes in each train
+    train = np.repeat(np.arange(generator.shape[0], dtype=np.float64) * nb_bin, count_train)
+    position += train
+    position.sort()
+    position -= train
+    offsets = np.zeros(generator.shape[0] + 1, dtype=np.int64)
+    np.cumsum(count_train, out=offsets[1:])
+    return t_start + position * bin_width, offsets
+
+def _place_spikes(counts, uniform, t_start, bin_width):
+    """
+    the spike times of the numbers of spikes by bin
+    :param counts: the number of spikes of each train (row) in each bin (column)
+    :param uniform: uniform numbers in [0,1[, one by spike, train after train and bin after bin
+    :param t_start: time of the start of the first bin (ms)
+    :param bin_width: the width of the bins (ms)
+    :return spikes, offsets: see inhomogeneous_poisson
+    """
+    nb_train, nb_bin = counts.shape
+    # position of each spike : index of its bin (all trains together) + uniform position in the bin,
+    # one sort orders the trains and the spikes in each train
+    position = np.repeat(np.arange(nb_train * nb_bin, dtype=np.float64), counts.ravel())
+    position += uniform
+    position.sort()
+    offsets = np.zeros(nb_train + 1, dtype=np.int64)
+    np.cumsum(counts.sum(axis=1), out=offsets[1:])
+    position -= np.repeat(np.arange(nb_train, dtype=np.float64) * nb_bin, np.diff(offsets))
+    spikes = t_start + position * bin_width
+    return spikes, offsets
+
 def spikes_to_rate( spikes,t_start,t_stop, windows=0.0):
     """
     #WARNING function unused but keep it for idea
@@ -3,4 +3,12 @@
 # "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
 
 BASEDIR=$(dirname "$0")
-$1 -n 1 python3 $BASEDIR/nest_to_tvb.py $2 $3 $4
\ No newline at end of file
+MPIRUN=$1
+RESULTS_PATH=$2
+SPIKE_DETECTOR=$3
+TVB_PROXY=$4
+# number of MPI processes : rank 0 receives from Nest, rank 1-x analyse, rank 1 sends to TVB
+NB_MPI=${5:-2}
+# next arguments : other pairs of spike detector and TVB proxy translated by the same processes
+if [ $# -gt 5 ]; then shift 5; else shift $#; fi
+$MPIRUN -n $NB_MPI python3 $BASEDIR/nest_to_tvb.py $RESULTS_PATH $SPIKE_DETECTOR $TVB_PROXY "$@"
@@ -3,4 +3,8 @@
 # "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
 
 BASEDIR=$(dirname "$0")
-$1 -n 1 python3 $BASEDIR/tvb_to_nest.py $2 $3 $4 $5
+# number of MPI processes : rank 0 receives from TVB, rank 1-x generate the spikes of a part of the generators
+# NOTE: only the generation scales with the number of processes : the spikes of all the parts are gathered on
+# rank 1, which alone answers all the ranks of Nest (Nest receives from rank 1 only)
+NB_MPI=${6:-2}
+$1 -n $NB_MPI python3 $BASEDIR/tvb_to_nest.py $2 $3 $4 $5
@@ -5,16 +5,78 @@ import numpy as np
 import copy
 import logging
 
+# encodings of the spike events sent by NEST (param['event_format']), see store_data.add_events
+# 'double' : id of the recorder, id of the neuron, time of the spike, 3 doubles (default, 24 bytes)
+# 'id_time' : id of the neuron (int32), time of the spike (float32), 8 bytes
+#             NOTE: exact while float32 resolves the resolution, i.e. time < 2**22 * resolution
+# 'step_uint32', 'step_uint16' : index of the time step of the spike from the beginning of the synchronization, 4 or 2 bytes
+#             (the spike at the time begin+(index+1)*resolution is in the bin index of the histogram)
+event_dtypes = {
+    'double': np.dtype([('id_recorder', '<f8'), ('id', '<f8'), ('time', '<f8')]),
+    'id_time': np.dtype([('id', '<i4'), ('time', '<f4')]),
+    'step_uint32': np.dtype([('step', '<u4')]),
+    'step_uint16': np.dtype([('step', '<u2')]),
+}
+
+def event_unit(event_format):
+    """
+    size in bytes of one unit of the size of a package sent by NEST
+    :param event_format: encoding of the spike events, see event_dtypes
+    :return: 8 for the encoding 'double' (the size is the number of doubles), else the size of one event
+    """
+    if event_format == 'double':
+        return 8
+    return event_dtypes[event_format].itemsize
+
+def encode_spikes(event_format,id_recorders,id_neurons,times,begin,resolution):
+    """
+    encode the spike events like NEST (use by the test files and the tests)
+    :param event_format: encoding of the spike events, see event_dtypes
+    :param id_recorders: id of the recorder of each spike
+    :param id_neurons: id of the neuron of each spike
+    :param times: time of each spike, on the grid of the resolution
+    :param begin: time of the beginning of the synchronization
+    :param resolution: the resolution of the simulation
+    :return: the events, 1D array of bytes
+    """
+    events = np.empty(len(times),dtype=event_dtypes[event_format])
+    if event_format == 'double':
+        events['id_recorder'] = id_recorders
+        events['id'] = id_neurons
+        events['time'] = times
+    elif event_format == 'id_time':
+        events['id'] = id_neurons
+        events['time'] = times
+    else:
+        events['step'] = np.rint((np.asarray(times)-begin)/resolution)-1
+    return events.view(np.uint8)
+
 def slidding_window(data,width):
     """
     use for mean field
+    moving average computed with a cumulative sum : O(n) in time and memory
     :param data: instantaneous firing rate
     :param width: windows or times average of the mean field
     :return: state variable of the mean field
     """
-    res = np.zeros((data.shape[0]-width,width))
-    res [:,:] = np.squeeze(data[np.array([[ i+j for i in range(width) ] for j in range(data.shape[0]-width)])])
-    return res.mean(axis=1)
+    cumulative = np.concatenate(([0.0],np.cumsum(np.reshape(data,(data.shape[0],)))))
+    return (cumulative[width:-1]-cumulative[:-width-1])/width
+
+def slidding_window_chunks(data,width,chunk_size=100000):
+    """
+    use for the analysis of long simulation
+    compute the sliding window by consecutive blocks, the cumulative sum restarts at each block,
+    so the rounding error does not grow with the length of the simulation and only one block is
+    in memory at a time (data can be a memory map of the histogram)
+    :param data: instantaneous firing rate
+    :param width: windows or times average of the mean field
+    :param chunk_size: number of values of the result by block
+    :return: generator of the consecutive parts of slidding_window(data,width)
+    """
+    nb_result = data.shape[0]-width
+    for begin in range(0,nb_result,chunk_size):
+        end = min(begin+chunk_size,nb_result)
+        yield slidding_window(np.asarray(data[begin:end+width]),width)
 
 class store_data:
     def __init__(self,path,param):
@@ -27,6 +89,10 @@ class store_data:
         self.dt=param['resolution']              # the resolution of the integrator
         self.shape = (int(self.synch/self.dt),1) # the shape of the buffer/histogram
         self.hist = np.zeros(self.shape)         # the initialisation of the histogram
+        self.event_format = param.get('event_format','double') # encoding of the spike events sent by NEST
+        self.event_dtype = event_dtypes[self.event_format]
+        if self.event_format == 'step_uint16' and self.shape[0] > np.iinfo(np.uint16).max:
+            raise Exception('too many time steps by synchronization for the encoding step_uint16')
 
         # configuration of the logger
         level_log = param['level_log']
@@ -57,10 +123,43 @@ class store_data:
         :param count: the number of synchronization times
         :param datas: the spike :(id,time)
         """
-        for data in np.reshape(datas,(int(datas.shape[0]/3),3)):
-            data[2]-=self.dt
-            self.hist[int((data[2]-count*self.synch)/self.dt)]+=1
-        self.logger.info(int(datas.shape[0]/3))
+        nb_spikes = int(datas.shape[0]/3)
+        times = np.reshape(datas,(nb_spikes,3))[:,2]
+        # same arithmetic as the former spike-by-spike loop : shift of one step, then truncation toward zero
+        self._add_index(((times-self.dt-count*self.synch)/self.dt).astype(np.int64))
+
+    def add_events(self,count,events):
+        """
+        adding spike in the histogram, from the events in the encoding param['event_format']
+        NOTE: the encoding 'double' gives the same histogram as add_spikes. The other encodings give the
+        bin of the time step of the spike exactly, add_spikes truncates the rounding error of the double
+        times, the histograms are the same when the resolution is exactly represented (e.g. 0.125)
+        :param count: the number of synchronization times
+        :param events: the spike : bytes of the events, see event_dtypes
+        """
+        events = events.view(self.event_dtype)
+        if self.event_format == 'double':
+            index = ((events['time']-self.dt-count*self.synch)/self.dt).astype(np.int64)
+        elif self.event_format == 'id_time':
+            # the times are on the grid of the resolution, the rounding removes the error of float32
+            index = np.rint((events['time'].astype(np.float64)-count*self.synch)/self.dt).astype(np.int64)-1
+        else:
+            index = events['step'].astype(np.int64)
+        self._add_index(index)
+
+    def _add_index(self,index):
+        """
+        adding spike in the histogram from the index of their bin
+        :param index: the bin of each spike
+        """
+        nb_spikes = index.shape[0]
+        out_window = np.logical_or(index < 0, index >= self.shape[0])
+        if np.any(out_window):
+            self.logger.warning('spikes out of the synchronization window : '+str(np.count_nonzero(out_window)))
+            index = index[np.logical_not(out_window)]
+        self.hist[:,0] += np.bincount(index,minlength=self.shape[0])
+        # NOTE: the number of spikes by step is in the timeline of the transformer (param['timeline'])
+        self.logger.debug(nb_spikes)
 
     def return_data(self):
         """
@@ -117,5 +216,6 @@ class analyse_data:
         data = slidding_window(hist_slide,self.width)
         self.buffer = np.squeeze(hist_slide[-self.width:])
         times = np.array([count*self.synch,(count+1)*self.synch], dtype='d')
-        self.logger.info(np.mean(data*self.coeff))
+        if self.logger.isEnabledFor(logging.DEBUG): # no reduction if nobody reads it
+            self.logger.debug(np.mean(data)*self.coeff)
         return times,data*self.coeff
@@ -2,7 +2,8 @@
 # "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
 
 import numpy as np
-from nest_elephant_tvb.translation.rate_spike import rates_to_spikes
+from nest_elephant_tvb.translation.rate_spike import rates_to_spikes,inhomogeneous_poisson,inhomogeneous_poisson_counter
+from nest_elephant_tvb.translation.random_stream import counter_random
 from quantities import ms,Hz
 import logging
 
@@ -19,19 +20,121 @@ def toy_rates_to_spikes(rates,t_start,t_stop):
     times = np.around(np.sort(np.array(times)), decimals=1)
     return times
 
+def mip_thinning(spike_shared,nb_train,percentage_shared,random=np.random):
+    '''
+    select the spikes of the trains of the Multiple Interaction Process from the mother train
+    each spike of the mother train is in each train with the probability percentage_shared, independently.
+    The selected entries of the (train, mother spike) matrix are drawn directly: the gaps between two selected
+    entries are geometric, so the time and the memory are proportional to the number of selected spikes.
+    :param spike_shared: the mother spike train, sorted
+    :param nb_train: number of trains (spike generators)
+    :param percentage_shared: probability of selection of a spike
+    :param random: the random generator, np.random or a np.random.RandomState
+    :return spikes: the spike times of all the trains, train after train, sorted in each train
+    :return offsets: the spikes of the train i are spikes[offsets[i]:offsets[i+1]]
+    '''
+    nb_spike = spike_shared.shape[0]
+    total = nb_train*nb_spike
+    index = np.empty(0,dtype=np.int64) # flat index (train*nb_spike+spike) of the selected entries
+    last = -1
+    while last < total-1:
+        # enough gaps for all the entries in most of the cases, else one more block
+        nb_draw = int((total-1-last)*percentage_shared+5*np.sqrt(total*percentage_shared)+10)
+        block = last+np.cumsum(random.geometric(percentage_shared,nb_draw))
+        index = np.concatenate((index,block))
+        last = block[-1]
+    index = index[:np.searchsorted(index,total)]
+    train = index//nb_spike
+    offsets = np.searchsorted(train,np.arange(nb_train+1))
+    return spike_shared[index-train*nb_spike],offsets
+
+def mip_thinning_counter(spike_shared,generator,percentage_shared,random,stream,step):
+    '''
+    mip_thinning with counter-based random numbers (see random_stream.counter_random):
+    the selection of each spike generator is a function of (seed, region, stream, step, generator) only.
+    The geometric gaps of all the generators are drawn by rounds of 4, until the end of the mother train.
+    :param spike_shared: the mother spike train, sorted
+    :param generator: the indexes of the spike generators, one train by generator (1D array)
+    :param percentage_shared: probability of selection of a spike
+    :param random: the counter_random of the translator
+    :param stream: the stream of the gaps
+    :param step: the step of synchronization
+    :return spikes, offsets: see mip_thinning
+    '''
+    nb_spike = spike_shared.shape[0]
+    nb_train = generator.shape[0]
+    with np.errstate(divide='ignore'):
+        log_q = np.log1p(-percentage_shared) # -inf for a probability 1 : all the gaps are 1
+    last = np.full(nb_train,-1,dtype=np.int64) # last selected spike of each train
+    active = np.arange(nb_train)               # trains not finished
+    trains = []
+    selected = []
+    first = 0
+    while active.shape[0] > 0:
+        gaps = 1+np.floor(np.log(random.uniform_block(stream,step,generator[active],4,first))/log_q)
+        position = last[active,np.newaxis]+np.cumsum(gaps.astype(np.int64),axis=1)
+        keep = position < nb_spike
+        trains.append(np.repeat(active,keep.sum(axis=1)))
+        selected.append(position[keep])
+        last[active] = position[:,-1]
+        active = active[position[:,-1] < nb_spike-1]
+        first += 4
+    train = np.concatenate(trains+[np.empty(0,dtype=np.int64)])
+    # the rounds are in order in each train
+    order = np.argsort(train,kind='stable')
+    offsets = np.searchsorted(train[order],np.arange(nb_train+1))
+    return spike_shared[np.concatenate(selected+[np.empty(0,dtype=np.int64)])[order]],offsets
+
+# streams of the counter-based random numbers (see random_stream.counter_random), the Poisson trains use 2 streams
+STREAM_SHARED, STREAM_TRAIN, STREAM_MIP = 0, 2, 4
+
 class generate_data:
-    def __init__(self,path,nb_spike_generator,param):
+    def __init__(self,path,nb_spike_generator,param,part=0,nb_part=1,region=0):
         """
         generate spike train for each neurons
+        The spike generators can be divided in nb_part consecutive parts, generated by different processes:
+        this object generates the spike trains of the generators of the part 'part' only.
+        The shared spikes (SIP) and the mother train (MIP) are the same for all the parts.
+        With param['random_streams'] 'counter' (default), the train of each spike generator is a function of
+        (seed, region, step, generator) only (see random_stream.counter_random): the same trains with any
+        number of parts. With 'global', the trains depend on the number of parts and on the order of the calls.
         :param path : path for the logger files
         :param nb_spike_generator: number of spike generator/neurons in each regions
+        :param part: the part of the spike generators generated by this object
+        :param nb_part: number of parts
+        :param region: the region of the spike generators (the id of the first one)
         """
         self.percentage_shared = param['percentage_shared']  # percentage of shared rate between neurons
-        self.nb_spike_generator = nb_spike_generator         # number of spike generator
+        self.begin = nb_spike_generator*part//nb_part        # first spike generator of the part
+        self.end = nb_spike_generator*(part+1)//nb_part      # end of the spike generators of the part
+        self.nb_spike_generator = self.end-self.begin        # number of spike generator of the part
         self.nb_synapse = param['nb_synapses']               # number of synapses by neurons
         self.function_translation = param['function_select'] # choose the function for the translation
+        self.poisson_engine = param.get('poisson_engine','numpy') # 'numpy' or 'elephant' (reference) Poisson generator
+        if self.poisson_engine not in ('numpy','elephant'):
+            raise Exception('unknown poisson engine : '+str(self.poisson_engine))
+        if self.poisson_engine == 'elephant' and nb_part > 1:
+            raise Exception('the poisson engine elephant can not divide the spike generators')
+
+        self.random_streams = param.get('random_streams','counter') # 'counter' or 'global' random generator
+        if self.random_streams not in ('counter','global'):
+            raise Exception('unknown random streams : '+str(self.random_streams))
+        if self.poisson_engine == 'elephant':
+            # NOTE: elephant draws from the global generator
+            self.random_streams = 'global'
 
         np.random.seed(param['seed'])
+        if self.random_streams == 'counter':
+            self.random_shared = counter_random(param['seed'],region)
+            self.random = self.random_shared
+            self.generator = np.arange(self.begin,self.end) # index of the spike generators of the part
+        elif nb_part == 1:
+            self.random_shared = np.random # random generator of the shared spikes
+            self.random = np.random        # random generator of the spikes of the part
+        else:
+            # same shared spikes for all the parts, independent spikes for each part
+            self.random_shared = np.random.RandomState(param['seed'])
+            self.random = np.random.RandomState([param['seed'],part])
 
         # configure the logger
         level_log = param['level_log']
@@ -66,30 +169,124 @@ class generate_data:
         :param count: the number of step of synchronization between simulators
         :param time_step: the time of synchronization
         :param rate: the input rate of the mean field
-        :return:
+        :return: list of the spike trains, one by spike generator (views of generate_spike_flat)
+        """
+        spikes, offsets = self.generate_spike_flat(count,time_step,rate)
+        return np.split(spikes,offsets[1:-1])
+
+    def generate_spike_flat(self,count,time_step,rate):
+        """
+        generate spike, see generate_spike
+        :param count: the number of step of synchronization between simulators (the step of the random streams)
+        :param time_step: the time of synchronization
+        :param rate: the input rate of the mean field
+        :return spikes: the spike times of all the spike generators of the part, generator after generator
+        :return offsets: the spikes of the generator self.begin+i are spikes[offsets[i]:offsets[i+1]]
         """
         if self.function_translation == 1:
             # Single Interaction Process Model
             # Compute the rate to spike trains
-            rate *= self.nb_synapse # rate of poisson generator ( due property of poisson process)
+            # NOTE: not in place, the rates are in the buffer shared by all the science ranks
+            rate = rate * self.nb_synapse # rate of poisson generator ( due property of poisson process)
             rate += 1e-12 # avoid rate equals to zeros
-            spike_shared = \
-                rates_to_spikes(rate * self.percentage_shared * Hz,
-                                time_step[0] * ms, time_step[1] * ms, variation=True)[0]
-            spike_generate = rates_to_spikes(np.repeat([rate],self.nb_spike_generator,axis=0) * (1 - self.percentage_shared) * Hz, time_step[0] * ms, time_step[1] * ms,
-                                    variation=True)
-            for i in range(self.nb_spike_generator):
-                spike_generate[i] = np.around(np.sort(np.concatenate((spike_generate, spike_shared))), decimals=1)
-            self.logger.info('rate :'+str(rate)+' spikes :'+str(np.concatenate(spike_generate).shape))
-            return spike_generate
+            if self.random_streams == 'counter':
+                # the shared train is the stream STREAM_SHARED of the generator 0
+                spike_shared = inhomogeneous_poisson_counter(rate * self.percentage_shared, time_step[0], time_step[1],
+                                                             self.random, STREAM_SHARED, count, np.zeros(1))[0]
+                spikes, offsets = inhomogeneous_poisson_counter(rate * (1 - self.percentage_shared), time_step[0],
+                                                                time_step[1], self.random, STREAM_TRAIN, count,
+                                                                self.generator)
+            elif self.poisson_engine == 'numpy':
+                # all the trains in one call, see rate_spike.inhomogeneous_poisson
+                spike_shared = inhomogeneous_poisson(rate * self.percentage_shared, time_step[0], time_step[1],
+                                                     random=self.random_shared)[0]
+                spikes, offsets = inhomogeneous_poisson(rate * (1 - self.percentage_shared), time_step[0], time_step[1],
+                                                        nb_train=self.nb_spike_generator, random=self.random)
+            else:
+                spike_shared = \
+                    rates_to_spikes(rate * self.percentage_shared * Hz,
+                                    time_step[0] * ms, time_step[1] * ms, variation=True)[0]
+                spike_generate = rates_to_spikes(np.repeat([rate],self.nb_spike_generator,axis=0) * (1 - self.percentage_shared) * Hz, time_step[0] * ms, time_step[1] * ms,
+                                        variation=True)
+                offsets = np.concatenate(([0],np.cumsum([train.shape[0] for train in spike_generate]))).astype(np.int64)
+                spikes = np.concatenate(list(spike_generate)+[np.empty(0)])
+            # add the shared train to each train and sort each train
+            nb_shared = spike_shared.shape[0]
+            train = np.concatenate((np.repeat(np.arange(self.nb_spike_generator),np.diff(offsets)),
+                                    np.repeat(np.arange(self.nb_spike_generator),nb_shared)))
+            spikes = np.concatenate((spikes,np.tile(spike_shared,self.nb_spike_generator)))
+            spikes = np.around(spikes[np.lexsort((spikes,train))], decimals=1)
+            offsets = offsets + np.arange(self.nb_spike_generator+1)*nb_shared
+            if self.logger.isEnabledFor(logging.DEBUG): # no string of the rates if nobody reads it
+                self.logger.debug('rate :%s spikes :%s', rate, spikes.shape)
+            return spikes, offsets
         elif self.function_translation == 2:
             # Multiple Interaction Process Model
-            rate *= self.nb_synapse / self.percentage_shared # rate of poisson generator ( due property of poisson process)
+            # NOTE: not in place, the rates are in the buffer shared by all the science ranks
+            rate = rate * (self.nb_synapse / self.percentage_shared) # rate of poisson generator ( due property of poisson process)
             rate += 1e-12  # avoid rate equals to zeros
-            spike_shared = np.round(rates_to_spikes(rate * Hz, time_step[0] * ms, time_step[1] * ms, variation=True)[0],1)
-            select = np.random.binomial(n=1,p=self.percentage_shared,size=(self.nb_spike_generator,spike_shared.shape[0]))
-            result = []
-            for i in np.repeat([spike_shared],self.nb_spike_generator,axis=0)*select :
-                result.append(i[np.where(i!=0)])
-            self.logger.info('rate :'+str(rate)+' spikes :'+str(spike_shared))
-            return result
+            if self.random_streams == 'counter':
+                spike_shared = np.round(inhomogeneous_poisson_counter(rate, time_step[0], time_step[1], self.random,
+                                                                      STREAM_SHARED, count, np.zeros(1))[0],1)
+            elif self.poisson_engine == 'numpy':
+                spike_shared = np.round(inhomogeneous_poisson(rate, time_step[0], time_step[1],
+                                                              random=self.random_shared)[0],1)
+            else:
+                spike_shared = np.round(rates_to_spikes(rate * Hz, time_step[0] * ms, time_step[1] * ms, variation=True)[0],1)
+            # sparse selection of the spikes of each generator (see mip_thinning), a spike at the time 0 is kept
+            if self.random_streams == 'counter':
+                spikes, offsets = mip_thinning_counter(spike_shared,self.generator,self.percentage_shared,
+                                                       self.random,STREAM_MIP,count)
+            else:
+                spikes, offsets = mip_thinning(spike_shared,self.nb_spike_generator,self.percentage_shared,self.random)
+            if self.logger.isEnabledFor(logging.DEBUG): # no string of the rates if nobody reads it
+                self.logger.debug('rate :%s spikes :%s', rate, spike_shared)
+            return spikes, offsets
+
+class generate_rate_data:
+    def __init__(self,path,nb_generator,param,part=0,nb_part=1,region=0):
+        """
+        data of the rate generators of Nest (param['transport'] 'rates'), in place of the spike trains
+        Nest updates the rates of its inhomogeneous Poisson generators (one by population) with (time, rate) pairs,
+        the same for all the generators of the region: a few doubles by step instead of one train by neuron.
+        Same interface as generate_data, the 'spikes' of a generator are its pairs.
+        :param path : path for the logger files (unused)
+        :param nb_generator: number of rate generators in each regions
+        :param param: parameters of the translator
+        :param part: the part of the generators of this object, see generate_data
+        :param nb_part: number of parts
+        :param region: the region of the generators (unused, no random numbers)
+        NOTE: the rate generators have no shared spikes, param['percentage_shared'] and param['function_select']
+        are refused: the model would change silently (independent Poisson trains in place of the MIP or SIP trains)
+        NOTE: experimental, the layout of the pairs is not verified against the NEST builds of the co-simulation:
+        param['experimental_transport'] is required
+        """
+        if not param.get('experimental_transport', False):
+            raise Exception("transport 'rates' is experimental : param['experimental_transport'] is required")
+        if param.get('percentage_shared', 0.0) > 0.0 or 'function_select' in param:
+            raise Exception("transport 'rates' without shared spikes : percentage_shared ("
+                            + str(param.get('percentage_shared')) + ") and function_select ("
+                            + str(param.get('function_select')) + ") can not be used")
+        self.begin = nb_generator*part//nb_part              # first generator of the part
+        self.end = nb_generator*(part+1)//nb_part            # end of the generators of the part
+        self.nb_spike_generator = self.end-self.begin        # number of generator of the part
+        self.nb_synapse = param['nb_synapses']               # number of synapses by neurons
+        self.resolution = param['resolution']                # resolution of Nest
+
+    def generate_spike_flat(self,count,time_step,rate):
+        """
+        the (time, rate) pairs of the generators of the part, see generate_data.generate_spike_flat
+        NOTE: Nest only accepts times in the future, the rate of a bin starts one resolution after the bin
+        :param count: the number of step of synchronization between simulators (unused)
+        :param time_step: the time of synchronization
+        :param rate: the input rate of the mean field
+        :return data: time and rate of each bin, the same for all the generators of the part
+        :return offsets: the pairs of the generator self.begin+i are data[offsets[i]:offsets[i+1]]
+        """
+        nb_bin = rate.shape[0]
+        pairs = np.empty((nb_bin,2))
+        times = time_step[0]+self.resolution+np.arange(nb_bin)*((time_step[1]-time_step[0])/nb_bin)
+        pairs[:,0] = np.round(times/self.resolution)*self.resolution # on the grid of Nest
+        pairs[:,1] = rate*self.nb_synapse # rate of poisson generator ( due property of poisson process)
+        return np.tile(pairs.ravel(),self.nb_spike_generator), \
+               np.arange(self.nb_spike_generator+1,dtype=np.int64)*(2*nb_bin)
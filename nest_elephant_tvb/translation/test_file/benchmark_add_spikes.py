@@ -0,0 +1,61 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+import numpy as np
+import tempfile
+import time
+from nest_elephant_tvb.translation.science_nest_to_tvb import store_data
+
+
+def add_spikes_loop(hist, count, datas, synch, dt):
+    '''
+    former implementation of store_data.add_spikes : one spike at a time
+    '''
+    for data in np.reshape(datas, (int(datas.shape[0]/3), 3)):
+        data[2] -= dt
+        hist[int((data[2]-count*synch)/dt)] += 1
+    return hist
+
+
+def benchmark_add_spikes(sizes, max_size_loop, synch=3.5, dt=0.1, repeat=3):
+    '''
+    micro-benchmark of the histogram of one synchronization step
+    :param sizes: number of events by package
+    :param max_size_loop: maximum of events for the former loop (too slow after)
+    :param synch: time of synchronization
+    :param dt: resolution of the simulation
+    :param repeat: number of repetition of each measure (take the minimum)
+    '''
+    param = {'synch': synch, 'resolution': dt, 'level_log': 4}
+    store = store_data(tempfile.mkdtemp(), param)
+    print("%10s %15s %15s %10s" % ('events', 'vectorized (s)', 'loop (s)', 'speedup'))
+    for size in sizes:
+        times = dt + np.around(np.random.rand(size) * (synch - dt), decimals=1)
+        datas = np.ascontiguousarray(np.swapaxes([np.ones(size), np.arange(size), times], 0, 1), dtype='d').ravel()
+        time_vectorized = np.inf
+        for i in range(repeat):
+            start = time.perf_counter()
+            store.add_spikes(0, datas)
+            time_vectorized = min(time_vectorized, time.perf_counter() - start)
+            hist = store.return_data()
+        if size <= max_size_loop:
+            time_loop = np.inf
+            for i in range(repeat):
+                datas_copy = np.copy(datas)
+                start = time.perf_counter()
+                reference = add_spikes_loop(np.zeros(store.shape), 0, datas_copy, synch, dt)
+                time_loop = min(time_loop, time.perf_counter() - start)
+            assert np.array_equal(hist, reference)
+            print("%10d %15.6f %15.6f %10.1f" % (size, time_vectorized, time_loop, time_loop/time_vectorized))
+        else:
+            print("%10d %15.6f %15s %10s" % (size, time_vectorized, '-', '-'))
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) == 1:
+        benchmark_add_spikes([10**3, 10**4, 10**5, 10**6, 10**7], 10**6)
+    elif len(sys.argv) == 2:
+        benchmark_add_spikes([10**3, 10**4, 10**5, 10**6, 10**7], int(sys.argv[1]))
+    else:
+        print('incorrect number of arguments')
@@ -0,0 +1,85 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+import numpy as np
+import time
+from mpi4py import MPI
+from nest_elephant_tvb.translation.science_tvb_to_nest import mip_thinning
+from nest_elephant_tvb.translation.transformer_tvb_nest import _pack_spikes
+
+
+def send_loop(comm, spikes_times, list_id):
+    '''
+    former implementation of the message to NEST in transformer_tvb_nest._send : lists and copies
+    '''
+    data = []
+    shape = []
+    for i in list_id:
+        shape += [spikes_times[i].shape[0]]
+        data += [spikes_times[i]]
+    send_shape = np.array(np.concatenate(([np.sum(shape)],shape)), dtype='i')
+    data = np.concatenate(data).astype('d')
+    return _exchange(comm, [send_shape, MPI.INT], [data, MPI.DOUBLE], send_shape)
+
+
+def send_packed(comm, spikes, offsets, list_id):
+    '''
+    message to NEST with transformer_tvb_nest._pack_spikes
+    '''
+    send_shape, data = _pack_spikes(spikes, offsets, list_id)
+    return _exchange(comm, [send_shape, MPI.INT], [data, MPI.DOUBLE], send_shape)
+
+
+def _exchange(comm, shape, data, send_shape):
+    '''
+    send the sizes and the spikes to itself, like to a NEST rank
+    '''
+    requests = [comm.Isend(shape, dest=0, tag=0), comm.Isend(data, dest=0, tag=1)]
+    size = np.empty(send_shape.shape[0], dtype='i')
+    comm.Recv([size, MPI.INT], source=0, tag=0)
+    result = np.empty(size[0], dtype='d')
+    comm.Recv([result, MPI.DOUBLE], source=0, tag=1)
+    MPI.Request.Waitall(requests)
+    return result
+
+
+def benchmark_send_spikes(sizes, nb_nest_rank=4, nb_spike=200, percentage_shared=0.1, repeat=3):
+    '''
+    micro-benchmark of the messages of the spike trains of one step for all the NEST ranks
+    :param sizes: number of spike generators of the region
+    :param nb_nest_rank: number of NEST ranks, each one requests a part of the generators
+    :param nb_spike: number of spikes of the mother train (MIP model)
+    :param percentage_shared: probability of selection of the spikes of the mother train
+    :param repeat: number of repetition of each measure (take the minimum)
+    '''
+    comm = MPI.COMM_SELF
+    mother = np.sort(np.round(np.random.rand(nb_spike)*2.0, 1))
+    print("%10s %12s %15s %15s %10s" % ('generators', 'distribution', 'packed (s)', 'loop (s)', 'speedup'))
+    for size in sizes:
+        spikes, offsets = mip_thinning(mother, size, percentage_shared)
+        spikes_times = np.split(spikes, offsets[1:-1])
+        # blocks of consecutive generators (view of the spikes) or round robin (gather of the spikes)
+        for distribution, list_ids in (('block', np.array_split(np.arange(size), nb_nest_rank)),
+                                       ('round robin', [np.arange(rank, size, nb_nest_rank) for rank in range(nb_nest_rank)])):
+            time_packed = np.inf
+            time_loop = np.inf
+            for i in range(repeat):
+                start = time.perf_counter()
+                result = [send_packed(comm, spikes, offsets, list_id) for list_id in list_ids]
+                time_packed = min(time_packed, time.perf_counter() - start)
+                start = time.perf_counter()
+                reference = [send_loop(comm, spikes_times, list_id) for list_id in list_ids]
+                time_loop = min(time_loop, time.perf_counter() - start)
+            for data, data_reference in zip(result, reference):
+                assert np.array_equal(data, data_reference)
+            print("%10d %12s %15.6f %15.6f %10.1f" % (size, distribution, time_packed, time_loop, time_loop/time_packed))
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) == 1:
+        benchmark_send_spikes([10**4, 2*10**4, 5*10**4, 10**5])
+    elif len(sys.argv) == 2:
+        benchmark_send_spikes([10**4, 2*10**4, 5*10**4, 10**5], int(sys.argv[1]))
+    else:
+        print('incorrect number of arguments')
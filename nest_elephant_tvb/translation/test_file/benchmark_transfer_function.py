@@ -0,0 +1,81 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+import numpy as np
+import time
+from nest_elephant_tvb.Tvb.modify_tvb.Zerlaut import ZerlautAdaptationFirstOrder
+
+
+def model(engine, error=5e-4):
+    '''
+    first order model with the parameters of the example of the co-simulation
+    :param engine: engine of dfun
+    :param error: error bound of the tables of the engine tabulated
+    '''
+    zerlaut = ZerlautAdaptationFirstOrder(
+        g_L=np.array([10.0]), E_L_e=np.array([-63.0]), E_L_i=np.array([-65.0]), C_m=np.array([200.0]),
+        b_e=np.array([60.0]), a_e=np.array([0.0]), b_i=np.array([0.0]), a_i=np.array([0.0]),
+        tau_w_e=np.array([500.0]), tau_w_i=np.array([1.0]), Q_e=np.array([1.0]), Q_i=np.array([5.0]),
+        K_ext_e=np.array([400]))
+    zerlaut.dfun_engine = engine
+    zerlaut.table_error = error
+    zerlaut.configure()
+    return zerlaut
+
+
+def state(nb_node, seed=0):
+    '''
+    random states (E, I, W_e, W_i) and coupling of the nodes in the range of the co-simulation
+    :param nb_node: number of nodes
+    :param seed: seed of the random states
+    '''
+    rng = np.random.default_rng(seed)
+    states = np.array([rng.uniform(0.0, 0.05, nb_node), rng.uniform(0.0, 0.08, nb_node),
+                       rng.uniform(0.0, 200.0, nb_node), rng.uniform(0.0, 10.0, nb_node)])
+    return states[:, :, np.newaxis], rng.uniform(0.0, 0.01, (1, nb_node, 1))
+
+
+def benchmark_transfer_function(sizes, errors, repeat=20):
+    '''
+    micro-benchmark of the tabulated transfer function against the exact one (numpy and fused engines)
+    :param sizes: number of nodes
+    :param errors: error bounds of the tables
+    :param repeat: number of repetition of each measure (take the minimum)
+    '''
+    reference = model('numpy')
+    states, coupling = state(100000, seed=1)
+    print("%10s %10s %15s %15s %15s" % ('bound', 'build (s)', 'points', 'error valid.', 'error states'))
+    tabulated = {}
+    for error in errors:
+        start = time.perf_counter()
+        tabulated[error] = model('tabulated', error)
+        table_e, table_i = tabulated[error].transfer_function_tables()
+        time_build = time.perf_counter() - start
+        # error on other points than the points of validation of the tables
+        error_states = np.max(np.abs(tabulated[error].dfun(states, coupling) - reference.dfun(states, coupling))
+                              * reference.T)
+        print("%10.1e %10.2f %15d %15.2e %15.2e" % (error, time_build, table_e.table.size + table_i.table.size,
+                                                    max(table_e.error, table_i.error), error_states))
+    print("%10s %10s %15s %15s %10s %10s" % ('nodes', 'bound', 'tabulated (s)', 'numpy (s)', 'speedup', 'fused (s)'))
+    fused = model('fused')
+    for size in sizes:
+        states, coupling = state(size)
+        times = {}
+        for name, zerlaut in [('numpy', reference), ('fused', fused)] + list(tabulated.items()):
+            zerlaut.dfun(states, coupling)
+            times[name] = np.inf
+            for i in range(repeat):
+                start = time.perf_counter()
+                zerlaut.dfun(states, coupling)
+                times[name] = min(times[name], time.perf_counter() - start)
+        for error in errors:
+            print("%10d %10.1e %15.6f %15.6f %10.2f %10.6f" % (size, error, times[error], times['numpy'],
+                                                               times['numpy']/times[error], times['fused']))
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) == 1:
+        benchmark_transfer_function([68, 1000, 20000, 100000], [2e-3, 5e-4])
+    elif len(sys.argv) > 1:
+        benchmark_transfer_function([68, 1000, 20000, 100000], [float(error) for error in sys.argv[1:]])
@@ -0,0 +1,94 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+import numpy as np
+import time
+from mpi4py import MPI
+from nest_elephant_tvb.Tvb.simulation_Zerlaut import send_mpi, receive_mpi, persistent_send, persistent_receive
+
+
+def translators(comm, nb_step, nb_value):
+    '''
+    stand-in of the translators with the protocol of TVB : the one of tvb_to_nest (receive from TVB) on rank 0
+    and the one of nest_to_tvb (send to TVB) on rank 1
+    '''
+    status_ = MPI.Status()
+    time_step = np.empty(2, dtype='d')
+    size = np.empty(1, dtype='i')
+    rates = np.empty(nb_value, dtype='d')
+    rates_send = np.random.rand(nb_value)
+    for step in range(nb_step):
+        if comm.Get_rank() == 1:
+            # nest_to_tvb
+            comm.recv(source=0, tag=MPI.ANY_TAG, status=status_)
+            comm.Send([np.array([step, step+1.0], dtype='d'), MPI.DOUBLE], dest=0, tag=0)
+            comm.Send([np.array(nb_value, dtype='i'), MPI.INT], dest=0, tag=0)
+            comm.Send([rates_send, MPI.DOUBLE], dest=0, tag=0)
+        else:
+            # tvb_to_nest
+            comm.isend(True, dest=0, tag=0).wait()
+            comm.Recv([time_step, MPI.DOUBLE], source=0, tag=0)
+            comm.Recv([size, MPI.INT], source=0, tag=0)
+            comm.Recv([rates, MPI.DOUBLE], source=0, tag=0)
+
+
+def tvb(comm, nb_step, nb_value, persistent):
+    '''
+    the exchanges of TVB in run_mpi, without the simulation
+    :return: time by step (s)
+    '''
+    receiver = None
+    sender = None
+    start = time.perf_counter()
+    for step in range(nb_step):
+        if receiver is not None:
+            time_step, rates = receiver.receive()
+        else:
+            time_step, rates = receive_mpi(comm)
+            if persistent:
+                receiver = persistent_receive(comm, rates.shape[0])
+        if sender is not None:
+            sender.send(time_step, rates)
+        else:
+            send_mpi(comm, time_step, rates)
+            if persistent:
+                sender = persistent_send(comm, rates.shape[0])
+    elapsed = time.perf_counter() - start
+    for request in (receiver, sender):
+        if request is not None:
+            request.free()
+    return elapsed / nb_step
+
+
+def benchmark_tvb_mpi(nb_values, nb_step=2000):
+    '''
+    micro-benchmark of the exchanges of one step between TVB and the translators of one proxy
+    run with 3 MPI processes : mpirun -n 3 python benchmark_tvb_mpi.py (TVB and the two ranks of the translators)
+    :param nb_values: number of rates by step (synchronization/resolution)
+    :param nb_step: number of steps of each measure
+    '''
+    world = MPI.COMM_WORLD
+    local = world.Split(min(world.Get_rank(), 1), 0)
+    comm = local.Create_intercomm(0, world, 1 if world.Get_rank() == 0 else 0, 0)
+    if world.Get_rank() == 0:
+        print("%10s %18s %18s %10s" % ('rates', 'persistent (us)', 'fallback (us)', 'speedup'))
+    for nb_value in nb_values:
+        result = []
+        for persistent in (True, False):
+            if world.Get_rank() == 0:
+                result.append(tvb(comm, nb_step, nb_value, persistent))
+            else:
+                translators(comm, nb_step, nb_value)
+        if world.Get_rank() == 0:
+            print("%10d %18.2f %18.2f %10.2f" % (nb_value, result[0]*1e6, result[1]*1e6, result[1]/result[0]))
+    comm.Free()
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) == 1:
+        benchmark_tvb_mpi([1, 10, 100, 1000])
+    elif len(sys.argv) == 2:
+        benchmark_tvb_mpi([1, 10, 100, 1000], int(sys.argv[1]))
+    else:
+        print('incorrect number of arguments')
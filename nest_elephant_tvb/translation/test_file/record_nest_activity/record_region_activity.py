@@ -4,11 +4,13 @@
 import numpy as np
 import os
 from mpi4py import MPI
+from nest_elephant_tvb.translation.science_nest_to_tvb import event_dtypes,event_unit
 
-def analyse(path):
+def analyse(path,event_format='double'):
     """
     simulate the recorder module
     :param path: the file for the configurations of the connection
+    :param event_format: encoding of the spike events (see science_nest_to_tvb.event_dtypes)
     :return:
     """
     #Start communication channels
@@ -38,9 +40,9 @@ def analyse(path):
             shape = np.empty(1, dtype='i')
             comm.Recv([shape, 1, MPI.INT], source=status_.Get_source(), tag=0, status=status_)
             print("shape is", shape); sys.stdout.flush()
-            data = np.empty(shape[0], dtype='d')
-            comm.Recv([data, shape[0], MPI.DOUBLE], source=status_.Get_source(), tag=0, status=status_)
-            print("data is ", data); sys.stdout.flush()
+            data = np.empty(shape[0]*event_unit(event_format), dtype=np.uint8)
+            comm.Recv([data, MPI.BYTE], source=status_.Get_source(), tag=0, status=status_)
+            print("data is ", data.view(event_dtypes[event_format])); sys.stdout.flush()
             comm.Recv([check, 1, MPI.CXX_BOOL], source=status_.Get_source(), tag=MPI.ANY_TAG, status=status_)
             print("end run");sys.stdout.flush()
         elif status_.Get_tag() ==2:
@@ -59,6 +61,8 @@ if __name__ == "__main__":
     import sys
     if len(sys.argv)==2:
         analyse(sys.argv[1])
+    elif len(sys.argv)==3:
+        analyse(sys.argv[1],sys.argv[2])
     else:
         print('missing argument')
 
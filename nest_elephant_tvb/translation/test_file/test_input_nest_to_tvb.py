@@ -3,15 +3,20 @@
 
 import numpy as np
 from mpi4py import MPI
+from nest_elephant_tvb.translation.science_nest_to_tvb import encode_spikes
 
 import os
+import sys
 import time
 
-def simulate_spike_detector(path,min_delay):
+def simulate_spike_detector(path,min_delay,event_format='double',end=10000.0,max_spikes=1000):
     '''
     simulate spike detector output for testing the nest to tvb translator input
     :param path: the path to the file for the connections
     :param min_delay: the time of one simulation
+    :param event_format: encoding of the spike events (see science_nest_to_tvb.event_dtypes), resolution 0.1
+    :param end: the time of the end of the simulation
+    :param max_spikes: maximum number of spikes by simulation (more than the buffer of the translator for testing its growth)
     :return:
     '''
     # Init connection from file connection
@@ -31,28 +36,10 @@ def simulate_spike_detector(path,min_delay):
     print('Nest Output : connect to '+ port) ;sys.stdout.flush()
 
     starting = 0.0 # the begging of each time of synchronization
-    check = np.empty(1,dtype='b')
-    status_ = MPI.Status() # status of the different message
     while True:
-        # wait until the translator accept the connections
-        comm.Send([np.array([True],dtype='b'), 1, MPI.CXX_BOOL], dest=0, tag=0)
-        comm.Recv([check, 1, MPI.CXX_BOOL], source=MPI.ANY_SOURCE, tag=0,status=status_)
-        # create random data
-        size= np.random.randint(0,1000)
-        times = starting+np.random.rand(size)*(min_delay-0.2)
-        times = np.around(np.sort(np.array(times)),decimals=1)
-        id_neurons = np.random.randint(0,10,size)
-        id_detector = np.random.randint(0,10,size)
-        data = np.ascontiguousarray(np.swapaxes([id_detector,id_neurons,times],0,1),dtype='d')
-        # send data one by one like spike generator
-        comm.Send([np.array([size*3],dtype='i'),1, MPI.INT], dest=status_.Get_source(), tag=0)
-        comm.Send([data,size*3, MPI.DOUBLE], dest=status_.Get_source(), tag=0)
-        # ending the actual run
-        comm.Send([np.array([True],dtype='b'), 1, MPI.CXX_BOOL], dest=0, tag=1)
-        #print result and go to the next run
-        print("Nest Output : ",comm.Get_rank(),size);sys.stdout.flush()
+        send_spikes(comm,starting,min_delay,event_format,max_spikes)
         starting+=min_delay
-        if starting > 10000:
+        if starting > end:
             break
     # closing the connection at this end
     print("Nest Output : ending" );sys.stdout.flush()
@@ -64,10 +51,49 @@ def simulate_spike_detector(path,min_delay):
     MPI.Finalize()
     print('Nest Output : exit');sys.stdout.flush()
 
+def send_spikes(comm,starting,min_delay,event_format='double',max_spikes=1000):
+    '''
+    send the random spikes of one simulation step to the translator, like the spike detector of NEST
+    :param comm: the MPI inter communicator with the translator
+    :param starting: the time of the beginning of the step
+    :param min_delay: the time of one simulation
+    :param event_format: encoding of the spike events (see science_nest_to_tvb.event_dtypes), resolution 0.1
+    :param max_spikes: maximum number of spikes by simulation
+    :return:
+    '''
+    check = np.empty(1,dtype='b')
+    status_ = MPI.Status() # status of the different message
+    # wait until the translator accept the connections
+    comm.Send([np.array([True],dtype='b'), 1, MPI.CXX_BOOL], dest=0, tag=0)
+    comm.Recv([check, 1, MPI.CXX_BOOL], source=MPI.ANY_SOURCE, tag=0,status=status_)
+    # create random data
+    size= np.random.randint(0,max_spikes)
+    times = starting+np.random.rand(size)*(min_delay-0.2)
+    times = np.around(np.sort(np.array(times)),decimals=1)
+    id_neurons = np.random.randint(0,10,size)
+    id_detector = np.random.randint(0,10,size)
+    data = encode_spikes(event_format,id_detector,id_neurons,times,starting,0.1)
+    # send data one by one like spike generator
+    # (the size is the number of doubles for the encoding 'double', else the number of events)
+    comm.Send([np.array([size*3 if event_format == 'double' else size],dtype='i'),1, MPI.INT], dest=status_.Get_source(), tag=0)
+    # (the datatype matches the reception of the translator, see transformer_nest_tvb._receive)
+    comm.Send([data, MPI.DOUBLE if event_format == 'double' else MPI.BYTE], dest=status_.Get_source(), tag=0)
+    # ending the actual run
+    # (synchronous send: the translator has received the end of the run of this rank before the next run of any
+    # rank, the ranks of NEST are in lockstep like in a simulation)
+    comm.Ssend([np.array([True],dtype='b'), 1, MPI.CXX_BOOL], dest=0, tag=1)
+    MPI.COMM_WORLD.Barrier()
+    #print result and go to the next run
+    print("Nest Output : ",comm.Get_rank(),size);sys.stdout.flush()
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv)==3:
         simulate_spike_detector(sys.argv[1],float(sys.argv[2]))
+    elif len(sys.argv)==4:
+        simulate_spike_detector(sys.argv[1],float(sys.argv[2]),sys.argv[3])
+    elif len(sys.argv)==6:
+        simulate_spike_detector(sys.argv[1],float(sys.argv[2]),sys.argv[3],float(sys.argv[4]),int(sys.argv[5]))
     else:
         print('missing argument')
 
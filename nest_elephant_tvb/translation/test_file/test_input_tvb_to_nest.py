@@ -7,11 +7,13 @@ import os
 import time
 import sys
 
-def simulate_TVB_output(path,min_delay):
+def simulate_TVB_output(path,min_delay,end=10000.0,step_resize=-1):
     '''
     simulate the input of the translator tvb_to_nest
     :param path: the path to the file for the connections
     :param min_delay: the time of one simulation
+    :param end: the time of the end of the simulation
+    :param step_resize: from this step, 10 times more rates by step (for testing the growth of the buffer of the translator)
     :return:
     '''
     
@@ -45,6 +47,7 @@ def simulate_TVB_output(path,min_delay):
        
     status_ = MPI.Status()
     starting = 0.0 # the begging of each time of synchronization
+    step = 0
     while True:
         # wait until the translator accept the connections
         accept = False
@@ -59,6 +62,8 @@ def simulate_TVB_output(path,min_delay):
         source = status_.Get_source() # the id of the excepted source
         # create random data
         size= int(min_delay/0.1 )
+        if 0 <= step_resize <= step:
+            size *= 10
         rate = np.random.rand(size)*400
         data = np.ascontiguousarray(rate,dtype='d') # format the rate for sending
         shape = np.array(data.shape[0],dtype='i') # size of data
@@ -72,7 +77,8 @@ def simulate_TVB_output(path,min_delay):
         comm.Send([data, MPI.DOUBLE], dest=source, tag=0)
         # print result and go to the next run
         starting+=min_delay
-        if starting > 10000:
+        step+=1
+        if starting > end:
             break
     print("TVB_OUTPUT :ending" );sys.stdout.flush()
     accept = False
@@ -91,6 +97,8 @@ if __name__ == "__main__":
     import sys
     if len(sys.argv)==3:
         simulate_TVB_output(sys.argv[1],float(sys.argv[2]))
+    elif len(sys.argv)==5:
+        simulate_TVB_output(sys.argv[1],float(sys.argv[2]),float(sys.argv[3]),int(sys.argv[4]))
     else:
         print('missing argument')
 
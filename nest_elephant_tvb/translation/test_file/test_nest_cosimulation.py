@@ -0,0 +1,68 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+import numpy as np
+from mpi4py import MPI
+from nest_elephant_tvb.translation.test_file.test_input_nest_to_tvb import send_spikes
+from nest_elephant_tvb.translation.test_file.test_receive_tvb_to_nest import receive_spikes
+
+import os
+import sys
+import time
+
+def connect(path):
+    '''
+    connect to a translator
+    :param path: the path to the file of the port of the translator
+    :return: the MPI inter communicator with the translator
+    '''
+    while not os.path.exists(path):
+        print ("Port file not found yet, retry in 1 second")
+        time.sleep(1)
+    fport = open(path, "r")
+    port = fport.readline()
+    fport.close()
+    print('Nest_cosimulation : wait connection '+ port);sys.stdout.flush()
+    comm = MPI.COMM_WORLD.Connect(port)
+    print('Nest_cosimulation : connect to '+ port);sys.stdout.flush()
+    return comm
+
+def simulate_nest_cosimulation(paths_detector,path_generator,min_delay,end):
+    '''
+    simulate NEST in co-simulation: the spike detectors of several regions and the spike generators
+    The steps are paced by TVB like NEST: the spikes of the step k+1 are sent after the reception of the input of
+    the step k (the translators and TVB are tested with the order of the messages of a co-simulation)
+    :param paths_detector: the paths to the files for the connections with nest_to_tvb, one by region
+    :param path_generator: the path to the file for the connection with tvb_to_nest
+    :param min_delay: the time of one simulation
+    :param end: the time of the last step (NEST ends before the last input of TVB)
+    :return:
+    '''
+    # the connections in the order of the translators, see nest_to_tvb.py
+    comm_detectors = [connect(path) for path in paths_detector]
+    comm_generator = connect(path_generator)
+    ids=np.arange(0,10,1) # id of the spike generators, see test_receive_tvb_to_nest.py
+    starting = 0.0 # the beginning of each time of synchronization
+    while True:
+        for comm in comm_detectors:
+            send_spikes(comm,starting,min_delay,'double',1000)
+        starting+=min_delay
+        if starting > end:
+            break
+        receive_spikes(comm_generator,ids)
+    # send the signal for end the translation
+    print("Nest_cosimulation : ending");sys.stdout.flush()
+    for comm in comm_detectors:
+        comm.Send([np.array([True], dtype='b'), 1, MPI.CXX_BOOL], dest=0, tag=2)
+    comm_generator.Send([np.array([True], dtype='b'), MPI.CXX_BOOL], dest=1, tag=2)
+    for comm in comm_detectors+[comm_generator]:
+        comm.Disconnect()
+    MPI.Finalize()
+    print('Nest_cosimulation : exit');sys.stdout.flush()
+
+if __name__ == "__main__":
+    # arguments : min_delay end path_generator paths_detector...
+    if len(sys.argv) > 4:
+        simulate_nest_cosimulation(sys.argv[4:],sys.argv[3],float(sys.argv[1]),float(sys.argv[2]))
+    else:
+        print('missing argument')
@@ -0,0 +1,81 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+import numpy as np
+from mpi4py import MPI
+import logging
+import sys
+from nest_elephant_tvb.Tvb.simulation_Zerlaut import init_mpi, send_mpi, receive_mpi, end_mpi, \
+    persistent_send, persistent_receive, receive_all
+
+
+def simulate_TVB_proxies(paths_receive, paths_send, min_delay, end, persistent=True):
+    '''
+    simulate the exchanges of TVB with the translators, without the simulation
+    the functions of the co-simulation of TVB are used like in simulation_Zerlaut.run_mpi : the first step with
+    receive_mpi and send_mpi, the next ones with the persistent requests (concurrent reception of the proxies)
+    :param paths_receive: the paths to the files for the connections with nest_to_tvb, one by proxy
+    :param paths_send: the paths to the files for the connections with tvb_to_nest, one by proxy
+    :param min_delay: the time of one simulation
+    :param end: the time of the end of the simulation
+    :param persistent: persistent requests after the first step or always receive_mpi and send_mpi
+    :return:
+    '''
+    logger = logging.getLogger('TVB_proxies')
+    comm_receive = [init_mpi(path, logger) for path in paths_receive]
+    comm_send = [init_mpi(path, logger) for path in paths_send]
+    print("TVB_PROXIES : connected");sys.stdout.flush()
+    receivers = [None for comm in comm_receive]
+    senders = [None for comm in comm_send]
+    count = 0
+    while count*min_delay < end:
+        # receive the rates of all the proxies
+        if receivers[0] is not None:
+            time_data, data_value = receive_all(receivers)
+        else:
+            data_value = []
+            for index, comm in enumerate(comm_receive):
+                time_data, rates = receive_mpi(comm)
+                if persistent:
+                    receivers[index] = persistent_receive(comm, rates.shape[0])
+                data_value.append(rates)
+            data_value = np.swapaxes(np.array(data_value), 0, 1)
+        if time_data[0] != count*min_delay or data_value.shape[1] != len(comm_receive):
+            raise Exception('bad data of the proxies : ' + str(time_data) + ' ' + str(data_value.shape))
+        print("TVB_PROXIES : receive", time_data, np.sum(data_value, axis=0));sys.stdout.flush()
+        # send the rates of all the proxies
+        times = [count*min_delay, (count+1)*min_delay]
+        rate = np.random.rand(int(min_delay/0.1), len(comm_send))*400
+        for index, comm in enumerate(comm_send):
+            if senders[index] is not None:
+                if senders[index].active:
+                    senders[index].wait()
+                senders[index].start(times, rate[:, index])
+            else:
+                send_mpi(comm, times, rate[:, index])
+                if persistent:
+                    senders[index] = persistent_send(comm, rate.shape[0])
+        count += 1
+    # closing the connections at this end
+    print("TVB_PROXIES : ending");sys.stdout.flush()
+    for persistent_request in receivers+senders:
+        if persistent_request is not None:
+            if persistent_request.active:
+                persistent_request.wait()
+            persistent_request.free()
+    for path, comm in zip(paths_send, comm_send):
+        end_mpi(comm, path, True, logger)
+    for path, comm in zip(paths_receive, comm_receive):
+        end_mpi(comm, path, False, logger)
+    print('TVB_PROXIES : exit');sys.stdout.flush()
+    MPI.Finalize()
+
+if __name__ == "__main__":
+    # arguments : min_delay end persistent(0/1) number_of_proxies_receive paths_receive... paths_send...
+    # (without paths_send, only the exchanges with nest_to_tvb)
+    if len(sys.argv) > 5 and len(sys.argv) >= 5+int(sys.argv[4]):
+        nb_receive = int(sys.argv[4])
+        simulate_TVB_proxies(sys.argv[5:5+nb_receive], sys.argv[5+nb_receive:],
+                             float(sys.argv[1]), float(sys.argv[2]), bool(int(sys.argv[3])))
+    else:
+        print('missing argument')
@@ -7,10 +7,11 @@ import os
 import time
 
 
-def simulate_TVB_reception(path):
+def simulate_TVB_reception(path,end=9900.0):
     '''
     simulate the receptor of the translator for nest to TVB
     :param path: the path to the file for the connections
+    :param end: the time of the end of the simulation (before the end of Nest, the translator releases the last data)
     :return:
     '''
     # Init connection from file connection
@@ -47,7 +48,7 @@ def simulate_TVB_reception(path):
             print("TVB INPUT :",comm.Get_rank(),times,np.sum(rates));sys.stdout.flush()
         else:
             break
-        if times[1] >9900:
+        if times[1] > end:
             break
     # closing the connection at this end
     req = comm.isend(True, dest=1, tag=1)
@@ -62,6 +63,8 @@ if __name__ == "__main__":
     import sys
     if len(sys.argv)==2:
         simulate_TVB_reception(sys.argv[1])
+    elif len(sys.argv)==3:
+        simulate_TVB_reception(sys.argv[1],float(sys.argv[2]))
     else:
         print('missing argument')
 
@@ -7,10 +7,11 @@ import os
 import time
 import sys
 
-def simulate_nest_generator(path):
+def simulate_nest_generator(path,end=10000.0):
     '''
     simulate the spike generator of the translator for tvb to nest
     :param path: the path to the file for the connections
+    :param end: the time of the end of the simulation (before the end of TVB, the translator releases the last rates)
     :return:
     '''
     
@@ -43,38 +44,16 @@ def simulate_nest_generator(path):
     comm = MPI.COMM_WORLD.Connect(port)
     print('Nest_Input :connect to '+port);sys.stdout.flush()
 
-    status_ = MPI.Status()
     # NOTE: hardcoded...
-    ids=np.arange(0,10,1) # random id of spike detector
+    # the spike generators are divided between the ranks of NEST like its neurons, one rank has all of them
+    ids=np.arange(MPI.COMM_WORLD.Get_rank(),10,MPI.COMM_WORLD.Get_size()) # random id of spike detector
     print(ids);sys.stdout.flush()
     while(True):
-        # Send start simulation
-        comm.Send([np.array([True], dtype='b'), MPI.CXX_BOOL], dest=1, tag=0)
-        # NOTE: hardcoded...
-        comm.Send([np.array(10,dtype='i'), MPI.INT], dest=1, tag=0)
-        # send ID of spike generator
-        comm.Send([np.array(ids,dtype='i'), MPI.INT], dest=1, tag=0)
-        # receive the number of spikes for updating the spike detector
-        size=np.empty(11,dtype='i')
-        comm.Recv([size,11, MPI.INT], source=1, tag=ids[0],status=status_)
-        print ("Nest_Input (" + str(ids[0]) + ") :receive size : " + str(size));sys.stdout.flush()
-        # receive the spikes for updating the spike detector
-        data = np.empty(size[0], dtype='d')
-        comm.Recv([data,size[0], MPI.DOUBLE],source=1,tag=ids[0],status=status_)
-        print ("Nest_Input (" + str(id) + ") : " + str(np.sum(data)));sys.stdout.flush()
-        # printing value and exist
-        print ("Nest_Input: Before print ");sys.stdout.flush()
-        if ids[0] == 0:
-            print ("Nest_Input:" + str([ids[0], data,np.sum(data)]) );sys.stdout.flush()
-        print ("Nest_Input: debug end of loop");sys.stdout.flush()
-        #send ending the the run of the simulation
-        print("Nest_Input: Debug before send");sys.stdout.flush()
-        comm.Send([np.array([True], dtype='b'), MPI.CXX_BOOL], dest=1, tag=1)
-        print("Nest_Input: Debug after  send");sys.stdout.flush()
-
+        data = receive_spikes(comm,ids)
         print ("Nest_Input: before break");sys.stdout.flush()
         # print ("Nest_Input: before break" + str(data > 10000));sys.stdout.flush()
-        if np.any(data > 10000):
+        # all the ranks of NEST end at the same step
+        if MPI.COMM_WORLD.allreduce(np.any(data > end), op=MPI.LOR):
             break
         
 
@@ -86,10 +65,45 @@ def simulate_nest_generator(path):
     print('Nest_Input :exit')
     MPI.Finalize()
 
+def receive_spikes(comm,ids):
+    '''
+    receive the spikes of one simulation step from the translator, like the spike generators of NEST
+    :param comm: the MPI inter communicator with the translator
+    :param ids: the ids of the spike generators
+    :return: the spikes of the first spike generator
+    '''
+    status_ = MPI.Status()
+    # Send start simulation
+    comm.Send([np.array([True], dtype='b'), MPI.CXX_BOOL], dest=1, tag=0)
+    comm.Send([np.array(len(ids),dtype='i'), MPI.INT], dest=1, tag=0)
+    # send ID of spike generator
+    comm.Send([np.array(ids,dtype='i'), MPI.INT], dest=1, tag=0)
+    # receive the number of spikes for updating the spike detector
+    size=np.empty(len(ids)+1,dtype='i')
+    # NOTE: the spikes are sent by the rank 1 of the translator, whatever its number of ranks
+    comm.Recv([size,len(ids)+1, MPI.INT], source=1, tag=ids[0],status=status_)
+    print ("Nest_Input (" + str(ids[0]) + ") :receive size : " + str(size));sys.stdout.flush()
+    # receive the spikes for updating the spike detector
+    data = np.empty(size[0], dtype='d')
+    comm.Recv([data,size[0], MPI.DOUBLE],source=status_.Get_source(),tag=ids[0],status=status_)
+    print ("Nest_Input (" + str(id) + ") : " + str(np.sum(data)));sys.stdout.flush()
+    # printing value and exist
+    print ("Nest_Input: Before print ");sys.stdout.flush()
+    if ids[0] == 0:
+        print ("Nest_Input:" + str([ids[0], data,np.sum(data)]) );sys.stdout.flush()
+    print ("Nest_Input: debug end of loop");sys.stdout.flush()
+    #send ending the the run of the simulation
+    print("Nest_Input: Debug before send");sys.stdout.flush()
+    comm.Send([np.array([True], dtype='b'), MPI.CXX_BOOL], dest=1, tag=1)
+    print("Nest_Input: Debug after  send");sys.stdout.flush()
+    return data
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv)==2:
         simulate_nest_generator(sys.argv[1])
+    elif len(sys.argv)==3:
+        simulate_nest_generator(sys.argv[1],float(sys.argv[2]))
     else:
         print('missing argument')
 
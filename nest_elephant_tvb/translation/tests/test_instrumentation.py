@@ -0,0 +1,55 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+"""
+Unit tests for the timeline of the translators.
+
+This module checks that the records of the steps are written by block
+and read back identically in the binary and the csv format.
+"""
+
+import numpy as np
+import pytest
+
+
+def fill(timeline, nb_step):
+    """Records of nb_step steps, the counters are known"""
+    from nest_elephant_tvb.translation.instrumentation import WAIT, BYTES, EVENTS, HIGH_WATER
+
+    for step in range(nb_step):
+        timeline.toc(WAIT)
+        timeline.add(BYTES, 24*step)
+        timeline.add(EVENTS, step)
+        timeline.add(EVENTS, 1)
+        timeline.set(HIGH_WATER, 100*(step//4))
+        timeline.next(step, region=step % 3)
+
+
+@pytest.mark.parametrize('file_format', ['binary', 'csv'])
+def test_records_written_by_block(tmp_path, file_format):
+    """Test that all the records are in the file, whatever the size of the block"""
+    from nest_elephant_tvb.translation.instrumentation import create_timeline, read_timeline
+
+    timeline = create_timeline(str(tmp_path), 'test', {'timeline': True, 'timeline_format': file_format,
+                                                      'timeline_block': 7})
+    fill(timeline, 20)
+    timeline.close()
+    records = read_timeline(timeline.file)
+    assert records.shape == (20,)
+    np.testing.assert_array_equal(records['step'], np.arange(20))
+    np.testing.assert_array_equal(records['region'], np.arange(20) % 3)
+    np.testing.assert_array_equal(records['bytes'], 24*np.arange(20))
+    np.testing.assert_array_equal(records['events'], np.arange(20)+1)
+    np.testing.assert_array_equal(records['high_water'], 100*(np.arange(20)//4))
+    assert np.all(records['wait'] >= 0.0)
+    assert np.all(records['send'] == 0.0)
+
+
+def test_disabled_timeline(tmp_path):
+    """Test that nothing is written without param['timeline']"""
+    from nest_elephant_tvb.translation.instrumentation import create_timeline
+
+    timeline = create_timeline(str(tmp_path), 'test', {})
+    fill(timeline, 5)
+    timeline.close()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,70 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+"""
+Unit tests for the counter-based random streams of the TVB to NEST translator.
+
+This module checks Philox4x32-10 against the known answers of Random123 and
+that the spike trains do not depend on the division of the spike generators.
+"""
+
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize('counter, key, expected', [
+    ([0, 0, 0, 0], [0, 0], [0x6627e8d5, 0xe169c58d, 0xbc57ac4c, 0x9b00dbd8]),
+    ([0xffffffff]*4, [0xffffffff]*2, [0x408f276d, 0x41c83b0e, 0xa20bc7c6, 0x6d5451fd]),
+    ([0x243f6a88, 0x85a308d3, 0x13198a2e, 0x03707344], [0xa4093822, 0x299f31d0],
+     [0xd16cfe09, 0x94fdcceb, 0x5001e420, 0x24126ea1]),
+])
+def test_philox_known_answers(counter, key, expected):
+    """Test Philox4x32-10 with the known answer tests of Random123"""
+    from nest_elephant_tvb.translation.random_stream import philox4x32
+
+    words = philox4x32(np.array(counter, dtype=np.uint64)[:, np.newaxis], key)
+    np.testing.assert_array_equal(words[:, 0], expected)
+
+
+def test_uniform_block_identical_to_uniform():
+    """Test that the numbers drawn by block are the numbers drawn one by one"""
+    from nest_elephant_tvb.translation.random_stream import counter_random
+
+    random = counter_random(3, 7)
+    block = random.uniform_block(2, 5, np.arange(10), 9, first=4)
+    generator, index = np.meshgrid(np.arange(10), np.arange(4, 13), indexing='ij')
+    np.testing.assert_array_equal(block, random.uniform(2, 5, generator, index))
+    assert np.all(block > 0.0) and np.all(block < 1.0)
+
+
+def test_poisson_statistics():
+    """Test the mean and the variance of the Poisson numbers, small and large means"""
+    from nest_elephant_tvb.translation.random_stream import counter_random
+
+    mean = np.array([0.0, 0.3, 4.0, 500.0])
+    counts = counter_random(1).poisson(0, 0, np.arange(100000), mean)
+    np.testing.assert_array_equal(counts[:, 0], 0)
+    np.testing.assert_allclose(counts.mean(axis=0)[1:], mean[1:], rtol=0.02)
+    np.testing.assert_allclose(counts.var(axis=0)[1:], mean[1:], rtol=0.05)
+
+
+@pytest.mark.parametrize('function_select', [1, 2])
+def test_trains_independent_of_the_parts(tmp_path, function_select):
+    """Test that the trains are the same with one or several parts, in any order of the steps"""
+    from nest_elephant_tvb.translation.science_tvb_to_nest import generate_data
+
+    param = {'percentage_shared': 0.3, 'nb_synapses': 10, 'function_select': function_select, 'seed': 4,
+             'level_log': 4}
+    time_step = np.array([4.0, 6.0])
+    rate = np.linspace(10.0, 200.0, 20)
+    spikes, offsets = generate_data(str(tmp_path), 50, param).generate_spike_flat(2, time_step, rate)
+    trains = np.split(spikes, offsets[1:-1])
+    parts = []
+    for part in reversed(range(3)):
+        generator = generate_data(str(tmp_path), 50, param, part, 3)
+        generator.generate_spike_flat(0, time_step-4.0, rate)  # other steps before
+        spikes_part, offsets_part = generator.generate_spike_flat(2, time_step, rate)
+        parts = np.split(spikes_part, offsets_part[1:-1]) + parts
+    assert len(parts) == 50
+    for train, train_part in zip(trains, parts):
+        np.testing.assert_array_equal(train, train_part)
@@ -0,0 +1,83 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+"""
+Unit tests for the generation of the spike trains from the rates.
+
+This module checks the layout of the trains of the numpy Poisson generator
+and its statistics against the theory and the elephant reference.
+"""
+
+import warnings
+import numpy as np
+import pytest
+
+t_start, t_stop = 10.0, 14.0           # ms
+rates = np.array([0.0, 5000.0, 20000.0, 1000.0, 10000.0, 2500.0, 15000.0, 500.0])  # Hz, one by bin
+bin_width = (t_stop - t_start) / rates.shape[0]
+
+
+def counts_by_bin(trains):
+    """Number of spikes of each train in each bin of the rates"""
+    return np.array([np.histogram(train, bins=rates.shape[0], range=(t_start, t_stop))[0] for train in trains])
+
+
+def test_layout_of_the_trains():
+    """Test that the trains are sorted, in the step and described by the offsets"""
+    from nest_elephant_tvb.translation.rate_spike import inhomogeneous_poisson
+
+    np.random.seed(0)
+    spikes, offsets = inhomogeneous_poisson(np.random.rand(50, rates.shape[0])*20000.0, t_start, t_stop)
+    assert offsets.shape == (51,) and offsets[0] == 0 and offsets[-1] == spikes.shape[0]
+    for i in range(50):
+        train = spikes[offsets[i]:offsets[i+1]]
+        assert np.all(np.diff(train) >= 0.0)
+    assert np.all(spikes >= t_start) and np.all(spikes < t_stop)
+
+
+def test_same_rates_for_all_the_trains():
+    """Test that 1D rates with nb_train is the same process as the repeated rates"""
+    from nest_elephant_tvb.translation.rate_spike import inhomogeneous_poisson
+
+    np.random.seed(1)
+    spikes, offsets = inhomogeneous_poisson(rates, t_start, t_stop, nb_train=20)
+    np.random.seed(1)
+    spikes_repeat, offsets_repeat = inhomogeneous_poisson(np.repeat([rates], 20, axis=0), t_start, t_stop)
+    np.testing.assert_array_equal(offsets, offsets_repeat)
+    np.testing.assert_array_equal(spikes, spikes_repeat)
+
+
+def test_statistics_of_the_counts():
+    """Test that the counts of each bin are Poisson with the mean rate*width"""
+    from nest_elephant_tvb.translation.rate_spike import inhomogeneous_poisson
+
+    np.random.seed(2)
+    nb_train = 20000
+    spikes, offsets = inhomogeneous_poisson(rates, t_start, t_stop, nb_train=nb_train)
+    counts = counts_by_bin(np.split(spikes, offsets[1:-1]))
+    expected = rates*bin_width*1e-3
+    # mean at 5 standard errors and Poisson variance
+    np.testing.assert_array_less(np.abs(counts.mean(axis=0)-expected), 5*np.sqrt(expected/nb_train)+1e-12)
+    np.testing.assert_allclose(counts.var(axis=0)[1:], expected[1:], rtol=0.1)
+    # uniform position of the spikes in their bin
+    position = ((spikes-t_start)/bin_width) % 1.0
+    assert abs(position.mean()-0.5) < 5*np.sqrt(1/12/position.shape[0])
+
+
+def test_statistics_identical_to_elephant():
+    """Test the mean counts of the numpy generator against elephant"""
+    from nest_elephant_tvb.translation.rate_spike import inhomogeneous_poisson, rates_to_spikes
+    from quantities import ms, Hz
+
+    np.random.seed(3)
+    nb_train = 200
+    spikes, offsets = inhomogeneous_poisson(rates, t_start, t_stop, nb_train=nb_train)
+    counts = counts_by_bin(np.split(spikes, offsets[1:-1]))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        trains = rates_to_spikes(np.repeat([rates], nb_train, axis=0)*Hz, t_start*ms, t_stop*ms, variation=True)
+    counts_elephant = counts_by_bin(trains)
+    # difference of two means of Poisson counts, at 5 standard errors
+    expected = rates*bin_width*1e-3
+    np.testing.assert_array_less(np.abs(counts.mean(axis=0)-counts_elephant.mean(axis=0)),
+                                 5*np.sqrt(2*expected/nb_train)+1e-12)
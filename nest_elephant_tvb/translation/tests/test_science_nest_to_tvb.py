@@ -0,0 +1,178 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+"""
+Unit tests for the science part of the NEST to TVB translator.
+
+This module checks the histogram of the spikes and the estimation of the
+rates against the spike-by-spike reference implementation.
+"""
+
+import numpy as np
+import pytest
+
+
+def reference_add_spikes(hist, count, datas, synch, dt):
+    """Former spike-by-spike implementation of store_data.add_spikes"""
+    for data in np.reshape(np.copy(datas), (int(datas.shape[0]/3), 3)):
+        data[2] -= dt
+        hist[int((data[2]-count*synch)/dt)] += 1
+    return hist
+
+
+def nest_events(nb_spikes, count, synch, dt, seed=0):
+    """Events as sent by NEST : (id recorder, id neuron, time) in one flat array of doubles"""
+    rng = np.random.RandomState(seed)
+    times = count*synch + dt + np.around(rng.rand(nb_spikes)*(synch-dt), decimals=1)
+    ids = rng.randint(0, 1000, nb_spikes)
+    return np.ascontiguousarray(np.swapaxes([np.ones(nb_spikes), ids, times], 0, 1), dtype='d').ravel()
+
+
+@pytest.fixture
+def param():
+    return {'synch': 3.5, 'resolution': 0.1, 'width': 2.0, 'nb_neurons': 800.0, 'level_log': 4}
+
+
+class TestStoreData:
+    """Test the histogram of the spikes"""
+
+    def test_add_spikes_identical_to_reference(self, tmp_path, param):
+        """Test that the bulk histogram is bit-identical to the spike-by-spike loop"""
+        from nest_elephant_tvb.translation.science_nest_to_tvb import store_data
+
+        store = store_data(str(tmp_path), param)
+        for count in range(5):
+            datas = nest_events(1000 + 100*count, count, param['synch'], param['resolution'], seed=count)
+            reference = reference_add_spikes(np.zeros(store.shape), count, datas, param['synch'], param['resolution'])
+            store.add_spikes(count, datas)
+            np.testing.assert_array_equal(store.return_data(), reference)
+
+    def test_add_spikes_accumulates(self, tmp_path, param):
+        """Test that successive packages of the same step are accumulated"""
+        from nest_elephant_tvb.translation.science_nest_to_tvb import store_data
+
+        store = store_data(str(tmp_path), param)
+        datas = nest_events(500, 2, param['synch'], param['resolution'])
+        store.add_spikes(2, datas[:600])
+        store.add_spikes(2, datas[600:])
+        reference = reference_add_spikes(np.zeros(store.shape), 2, datas, param['synch'], param['resolution'])
+        np.testing.assert_array_equal(store.return_data(), reference)
+
+    def test_add_spikes_empty(self, tmp_path, param):
+        """Test that an empty package gives an empty histogram"""
+        from nest_elephant_tvb.translation.science_nest_to_tvb import store_data
+
+        store = store_data(str(tmp_path), param)
+        store.add_spikes(0, np.empty(0))
+        assert store.return_data().sum() == 0
+
+    def test_add_spikes_out_of_window(self, tmp_path, param):
+        """Test that spikes outside of the synchronization window are dropped"""
+        from nest_elephant_tvb.translation.science_nest_to_tvb import store_data
+
+        store = store_data(str(tmp_path), param)
+        datas = np.array([1., 1., 0.5,    # in the window
+                          1., 2., 10.0,   # after the window
+                          1., 3., -5.0])  # before the window
+        store.add_spikes(0, datas)
+        hist = store.return_data()
+        assert hist.sum() == 1
+        assert hist[4, 0] == 1
+
+
+class TestEventFormat:
+    """Test the compact encodings of the spike events"""
+
+    @pytest.mark.parametrize('event_format, itemsize', [('double', 24), ('id_time', 8),
+                                                        ('step_uint32', 4), ('step_uint16', 2)])
+    def test_identical_to_add_spikes(self, tmp_path, event_format, itemsize):
+        """Test that all the encodings give the histogram of add_spikes when the resolution is exact"""
+        from nest_elephant_tvb.translation.science_nest_to_tvb import store_data, encode_spikes
+
+        param = {'synch': 2.0, 'resolution': 0.125, 'level_log': 4, 'event_format': event_format}
+        store = store_data(str(tmp_path), param)
+        reference = store_data(str(tmp_path), param)
+        rng = np.random.RandomState(5)
+        for count in range(3):
+            begin = count*param['synch']
+            times = begin + (rng.randint(0, 16, 1000) + 1)*param['resolution']
+            ids = rng.randint(0, 1000, 1000)
+            events = encode_spikes(event_format, np.ones(1000), ids, times, begin, param['resolution'])
+            assert events.dtype == np.uint8 and events.shape[0] == 1000*itemsize
+            store.add_events(count, events)
+            reference.add_spikes(count, np.ascontiguousarray(np.swapaxes([np.ones(1000), ids, times], 0, 1)).ravel())
+            np.testing.assert_array_equal(store.return_data(), reference.return_data())
+
+    @pytest.mark.parametrize('event_format', ['id_time', 'step_uint32', 'step_uint16'])
+    def test_same_number_of_spikes(self, tmp_path, param, event_format):
+        """Test that the compact encodings keep all the spikes of the step with an inexact resolution"""
+        from nest_elephant_tvb.translation.science_nest_to_tvb import store_data, encode_spikes
+
+        param['event_format'] = event_format
+        store = store_data(str(tmp_path), param)
+        datas = nest_events(2000, 3, param['synch'], param['resolution'], seed=6).reshape(2000, 3)
+        store.add_events(3, encode_spikes(event_format, datas[:, 0], datas[:, 1], datas[:, 2],
+                                          3*param['synch'], param['resolution']))
+        hist = store.return_data()
+        assert hist.sum() == 2000
+        # the bin of a spike is the step of its time, without the rounding error of the doubles
+        steps = np.rint((datas[:, 2]-3*param['synch'])/param['resolution']).astype(int)-1
+        np.testing.assert_array_equal(hist[:, 0], np.bincount(steps, minlength=store.shape[0]))
+
+    def test_step_uint16_too_many_steps(self, tmp_path):
+        """Test that the encoding on 2 bytes is refused if the steps do not fit"""
+        from nest_elephant_tvb.translation.science_nest_to_tvb import store_data
+
+        with pytest.raises(Exception):
+            store_data(str(tmp_path), {'synch': 10000.0, 'resolution': 0.1, 'level_log': 4,
+                                       'event_format': 'step_uint16'})
+
+
+def reference_slidding_window(data, width):
+    """Former implementation of slidding_window with the matrix of index"""
+    res = np.zeros((data.shape[0]-width, width))
+    res[:, :] = np.squeeze(data[np.array([[i+j for i in range(width)] for j in range(data.shape[0]-width)])])
+    return res.mean(axis=1)
+
+
+class TestSlidingWindow:
+    """Test the moving average of the histogram"""
+
+    def test_identical_to_reference_for_histogram(self):
+        """Test that the result is exact for a histogram of spike counts"""
+        from nest_elephant_tvb.translation.science_nest_to_tvb import slidding_window
+
+        hist = np.random.RandomState(1).poisson(3.0, 5000).astype('d')
+        np.testing.assert_array_equal(slidding_window(hist, 200), reference_slidding_window(hist, 200))
+
+    def test_close_to_reference_for_real_values(self):
+        """Test the moving average of real values and of a column histogram"""
+        from nest_elephant_tvb.translation.science_nest_to_tvb import slidding_window
+
+        data = np.random.RandomState(2).rand(3000, 1)
+        result = slidding_window(data, 50)
+        assert result.shape == (2950,)
+        np.testing.assert_allclose(result, reference_slidding_window(data, 50), rtol=1e-12)
+
+    def test_chunks_identical_to_full(self):
+        """Test that the computation by block gives the same result as in one block"""
+        from nest_elephant_tvb.translation.science_nest_to_tvb import slidding_window, slidding_window_chunks
+
+        hist = np.random.RandomState(3).poisson(2.0, 10007).astype('d')
+        chunks = list(slidding_window_chunks(hist, 200, chunk_size=1000))
+        assert len(chunks) == 10
+        np.testing.assert_array_equal(np.concatenate(chunks), slidding_window(hist, 200))
+
+    def test_analyse_carry_over(self, tmp_path, param):
+        """Test that the buffer of the previous step is used by the next step"""
+        from nest_elephant_tvb.translation.science_nest_to_tvb import analyse_data
+
+        analyse = analyse_data(str(tmp_path), param)
+        width = analyse.width
+        hists = np.random.RandomState(4).poisson(5.0, (4, 35, 1)).astype('d')
+        full = np.concatenate((np.zeros(width), hists.ravel()))
+        reference = reference_slidding_window(full, width)
+        for count, hist in enumerate(hists):
+            times, rates = analyse.analyse(count, hist)
+            np.testing.assert_array_equal(times, [count*param['synch'], (count+1)*param['synch']])
+            np.testing.assert_array_equal(rates, reference[count*35:(count+1)*35]*analyse.coeff)
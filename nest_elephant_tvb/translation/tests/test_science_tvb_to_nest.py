@@ -0,0 +1,143 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+"""
+Unit tests for the science part of the TVB to NEST translator.
+
+This module checks the sparse selection of the Multiple Interaction Process
+against the statistics of the former dense binomial selection.
+"""
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def param():
+    return {'percentage_shared': 0.2, 'nb_synapses': 10, 'function_select': 2, 'seed': 4, 'level_log': 4}
+
+
+def test_mip_keeps_all_the_spikes():
+    """Test that all the spikes are selected with a probability 1, the spike at the time 0 too"""
+    from nest_elephant_tvb.translation.science_tvb_to_nest import mip_thinning
+
+    mother = np.array([0.0, 0.3, 0.3, 1.2, 1.9])
+    spikes, offsets = mip_thinning(mother, 4, 1.0)
+    np.testing.assert_array_equal(offsets, [0, 5, 10, 15, 20])
+    np.testing.assert_array_equal(spikes, np.tile(mother, 4))
+
+
+def test_mip_empty_mother_train():
+    """Test that an empty mother train gives empty trains"""
+    from nest_elephant_tvb.translation.science_tvb_to_nest import mip_thinning
+
+    spikes, offsets = mip_thinning(np.empty(0), 3, 0.5)
+    assert spikes.shape == (0,)
+    np.testing.assert_array_equal(offsets, [0, 0, 0, 0])
+
+
+def test_mip_statistics_of_the_selection():
+    """Test that each entry is selected independently with the probability percentage_shared"""
+    from nest_elephant_tvb.translation.science_tvb_to_nest import mip_thinning
+
+    np.random.seed(5)
+    nb_train, nb_spike, p = 2000, 300, 0.2
+    mother = np.arange(nb_spike, dtype='d')
+    spikes, offsets = mip_thinning(mother, nb_train, p)
+    select = np.zeros((nb_train, nb_spike), dtype=bool)
+    train = np.repeat(np.arange(nb_train), np.diff(offsets))
+    select[train, spikes.astype(int)] = True
+    # no spike selected twice in a train, the trains are sorted
+    assert np.count_nonzero(select) == spikes.shape[0]
+    assert np.all(np.diff(spikes)[np.diff(train) == 0] > 0)
+    # binomial counts by train and by mother spike
+    total = nb_train*nb_spike
+    assert abs(select.mean()-p) < 5*np.sqrt(p*(1-p)/total)
+    np.testing.assert_allclose(select.sum(axis=1).var(), nb_spike*p*(1-p), rtol=0.15)
+    np.testing.assert_allclose(select.sum(axis=0).var(), nb_train*p*(1-p), rtol=0.25)
+
+
+def test_generate_spike_mip(tmp_path, param):
+    """Test that the trains of the generators are sorted subsets of the same mother train"""
+    from nest_elephant_tvb.translation.science_tvb_to_nest import generate_data
+
+    generator = generate_data(str(tmp_path), 50, param)
+    trains = generator.generate_spike(0, np.array([0.0, 2.0]), np.full(20, 200.0))
+    assert len(trains) == 50
+    mother = np.unique(np.concatenate(trains))
+    for train in trains:
+        assert np.all(np.diff(train) >= 0.0)
+        assert np.all(np.isin(train, mother))
+        assert np.all(train >= 0.0) and np.all(train <= 2.0)
+
+
+@pytest.mark.parametrize('index', [np.arange(10, 30), np.arange(3, 50, 4), np.array([7]), np.array([40, 2, 2, 15])])
+def test_pack_spikes_identical_to_lists(tmp_path, param, index):
+    """Test that the message of the spikes of the generators requested by NEST is the one of the former lists"""
+    from nest_elephant_tvb.translation.science_tvb_to_nest import generate_data
+    from nest_elephant_tvb.translation.transformer_tvb_nest import _pack_spikes
+
+    generator = generate_data(str(tmp_path), 50, param)
+    spikes, offsets = generator.generate_spike_flat(0, np.array([0.0, 2.0]), np.full(20, 500.0))
+    trains = np.split(spikes, offsets[1:-1])
+    send_shape, data = _pack_spikes(spikes, offsets, index)
+    shape = [trains[i].shape[0] for i in index]
+    np.testing.assert_array_equal(send_shape, np.concatenate(([np.sum(shape)], shape)))
+    np.testing.assert_array_equal(data, np.concatenate([trains[i] for i in index]))
+
+
+def test_parts_of_the_generators(tmp_path, param):
+    """Test that the parts of the science ranks cover the generators and that a part is one independent stream"""
+    from nest_elephant_tvb.translation.science_tvb_to_nest import generate_data
+
+    generators = [generate_data(str(tmp_path), 50, param, part, 3) for part in range(3)]
+    parts = np.array([[generator.begin, generator.end] for generator in generators])
+    np.testing.assert_array_equal(parts, [[0, 16], [16, 33], [33, 50]])
+    # the trains of a part are the same whatever the other parts generate
+    for generator in generators:
+        generator.generate_spike_flat(0, np.array([0.0, 2.0]), np.full(20, 500.0))
+    spikes, offsets = generators[1].generate_spike_flat(0, np.array([2.0, 4.0]), np.full(20, 500.0))
+    generator = generate_data(str(tmp_path), 50, param, 1, 3)
+    generator.generate_spike_flat(0, np.array([0.0, 2.0]), np.full(20, 500.0))
+    spikes_alone, offsets_alone = generator.generate_spike_flat(0, np.array([2.0, 4.0]), np.full(20, 500.0))
+    np.testing.assert_array_equal(offsets, offsets_alone)
+    np.testing.assert_array_equal(spikes, spikes_alone)
+    assert offsets.shape == (18,)
+
+
+def test_rate_data_for_the_rate_generators(tmp_path, param):
+    """Test the (time, rate) pairs of the rate generators, on the grid and in the future"""
+    from nest_elephant_tvb.translation.science_tvb_to_nest import generate_rate_data
+
+    param.update({'resolution': 0.1, 'transport': 'rates', 'experimental_transport': True})
+    del param['percentage_shared'], param['function_select']
+    generator = generate_rate_data(str(tmp_path), 2, param)
+    rate = np.linspace(1.0, 20.0, 20)
+    data, offsets = generator.generate_spike_flat(3, np.array([6.0, 8.0]), rate)
+    np.testing.assert_array_equal(offsets, [0, 40, 80])
+    pairs = data[:40].reshape(20, 2)
+    np.testing.assert_allclose(pairs[:, 0], 6.1 + np.arange(20)*0.1)
+    np.testing.assert_allclose(pairs[:, 1], rate*param['nb_synapses'])
+    np.testing.assert_array_equal(data[40:], data[:40])
+
+
+def test_rate_data_refuses_the_shared_spikes(tmp_path, param):
+    """Test that the rate generators refuse the parameters of the shared spikes, they can not model them"""
+    from nest_elephant_tvb.translation.science_tvb_to_nest import generate_rate_data
+
+    param.update({'resolution': 0.1, 'transport': 'rates', 'experimental_transport': True})
+    with pytest.raises(Exception, match='percentage_shared'):
+        generate_rate_data(str(tmp_path), 2, param)
+    del param['percentage_shared']
+    with pytest.raises(Exception, match='function_select'):
+        generate_rate_data(str(tmp_path), 2, param)
+
+
+def test_rate_data_is_experimental(tmp_path, param):
+    """Test that the rate generators are refused without the explicit experimental flag"""
+    from nest_elephant_tvb.translation.science_tvb_to_nest import generate_rate_data
+
+    param.update({'resolution': 0.1, 'transport': 'rates'})
+    del param['percentage_shared'], param['function_select']
+    with pytest.raises(Exception, match='experimental'):
+        generate_rate_data(str(tmp_path), 2, param)
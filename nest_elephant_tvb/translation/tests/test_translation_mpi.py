@@ -0,0 +1,248 @@
+#  Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
+# "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
+
+"""
+Integration tests of the MPI protocols of the translators.
+
+This module runs the translators with mpirun -n 3 (one receiving rank and two
+science ranks) against the stand-ins of NEST and TVB of test_file, through
+several steps, the growth of the shared buffer and the end of the simulation.
+"""
+
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+pytestmark = [pytest.mark.integration, pytest.mark.slow]
+
+TRANSLATION = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(os.path.dirname(TRANSLATION))
+
+
+@pytest.fixture
+def mpi(tmp_path_factory):
+    """The mpirun command and the environment of the processes"""
+    MPI = pytest.importorskip('mpi4py.MPI')
+    mpirun = shutil.which('mpirun')
+    if mpirun is None:
+        pytest.skip('mpirun is not available')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    # NOTE: MPICH with the network module ucx mixes the messages of the clients connected to the same server
+    if 'MPICH' in MPI.Get_library_version() and 'ch4:ucx' in MPI.Get_library_version():
+        env.setdefault('MPIR_CVAR_CH4_NETMOD', 'ofi')
+    if 'Open MPI' not in MPI.Get_library_version():
+        yield [mpirun], env
+        return
+    # NOTE: Open MPI connects the processes of different mpirun only through an ompi-server
+    ompi_server = shutil.which('ompi-server')
+    if ompi_server is None:
+        pytest.skip('ompi-server is not available')
+    env.setdefault('OMPI_MCA_rmaps_base_oversubscribe', '1')
+    uri = str(tmp_path_factory.mktemp('ompi_server') / 'uri.txt')
+    server = subprocess.Popen([ompi_server, '--no-daemonize', '-r', uri], env=env)
+    deadline = time.time() + 30
+    while not os.path.exists(uri) or os.path.getsize(uri) == 0:
+        if time.time() > deadline:
+            server.kill()
+            pytest.skip('ompi-server does not start')
+        time.sleep(0.1)
+    yield [mpirun, '--ompi-server', 'file:' + uri], env
+    server.terminate()
+    server.wait()
+
+
+def run(mpi, path, commands, timeout=180):
+    """
+    Run the processes together and check that all of them end
+    :param mpi: the mpirun command and the environment
+    :param path: the folder of the outputs of the processes
+    :param commands: list of (name, number of MPI processes, script of the translation and its arguments)
+    :return: the output of each process
+    """
+    mpirun, env = mpi
+    processes = {}
+    for name, nb_mpi, arguments in commands:
+        with open(os.path.join(path, name + '.out'), 'w') as output:
+            processes[name] = subprocess.Popen(mpirun + ['-n', str(nb_mpi), sys.executable,
+                                                         os.path.join(TRANSLATION, arguments[0])] + arguments[1:],
+                                               stdout=output, stderr=subprocess.STDOUT, env=env, cwd=path)
+    deadline = time.time() + timeout
+    try:
+        for process in processes.values():
+            process.wait(timeout=max(deadline - time.time(), 1))
+    except subprocess.TimeoutExpired:
+        for process in processes.values():
+            process.kill()
+    outputs = {}
+    for name, process in processes.items():
+        process.wait()
+        with open(os.path.join(path, name + '.out')) as output:
+            outputs[name] = output.read()
+        assert process.returncode == 0, name + ' does not end :\n' + outputs[name][-2000:]
+    return outputs
+
+
+def logs(path):
+    """All the logs of the translators"""
+    text = ''
+    for file_log in glob.glob(os.path.join(path, 'log', '*.log')):
+        with open(file_log) as f:
+            text += f.read()
+    return text
+
+
+def write_parameter(path, param_nest_to_tvb, param_tvb_to_nest):
+    """The folders of the co-simulation and the parameters of the translators, with the small sizes of the tests"""
+    os.makedirs(os.path.join(path, 'log'))
+    for folder in ['spike_detector', 'send_to_tvb', 'spike_generator', 'receive_from_tvb']:
+        os.makedirs(os.path.join(path, 'translation', folder))
+    param_nest_to_tvb.update({'synch': 2.0, 'resolution': 0.1, 'width': 20.0, 'nb_neurons': 100, 'level_log': 1})
+    param_tvb_to_nest.update({'synch': 2.0, 'resolution': 0.1, 'percentage_shared': 0.5, 'nb_synapses': 10,
+                              'function_select': 2, 'seed': 42, 'level_log': 1})
+    with open(os.path.join(path, 'parameter.json'), 'w') as f:
+        json.dump({'param_TR_nest_to_tvb': param_nest_to_tvb, 'param_TR_tvb_to_nest': param_tvb_to_nest}, f)
+
+
+@pytest.mark.parametrize('event_format, max_spikes, nonblocking, nb_slot',
+                         [('double', 3000, True, 2), ('id_time', 10000, False, 3)])
+def test_nest_to_tvb(tmp_path, mpi, event_format, max_spikes, nonblocking, nb_slot):
+    """Test the translation of NEST to TVB : packages bigger than the buffer and TVB ends before NEST"""
+    path = str(tmp_path) + '/'
+    write_parameter(path, {'event_format': event_format, 'nonblocking_fan_in': nonblocking, 'nb_slot': nb_slot,
+                           'timeline': True}, {})
+    outputs = run(mpi, path, [
+        ('translator', 3, ['nest_to_tvb.py', path, 'translation/spike_detector/0.txt',
+                           'translation/send_to_tvb/0.txt']),
+        ('nest', 1, ['test_file/test_input_nest_to_tvb.py', path + 'translation/spike_detector/0.txt', '2.0',
+                     event_format, '200', str(max_spikes)]),
+        ('tvb', 1, ['test_file/test_receive_nest_to_tvb.py', path + 'translation/send_to_tvb/0.txt', '180']),
+    ])
+    assert 'Nest Output : exit' in outputs['nest']
+    assert 'TVB INPUT :exit' in outputs['tvb']
+    # all the steps until the end of TVB, the next packages of NEST are released without analysis
+    assert outputs['tvb'].count('TVB INPUT : 0 [') == 91
+    assert 'resize the buffer' in logs(path)
+    # the high-water mark of the buffer by step, in the timeline of the receiving rank
+    from nest_elephant_tvb.translation.instrumentation import read_timeline
+    records = read_timeline(glob.glob(os.path.join(path, 'log', 'timeline_nest_to_tvb_receive*.bin'))[0])
+    assert records.shape[0] > 91
+    assert np.all(records['high_water'] >= records['bytes'])
+    assert np.all(np.diff(records['high_water']) >= 0)
+
+
+@pytest.mark.parametrize('nonblocking', [True, False])
+def test_nest_to_tvb_nest_ranks(tmp_path, mpi, nonblocking):
+    """Test the fan-in of the translation of NEST to TVB with two NEST ranks"""
+    path = str(tmp_path) + '/'
+    write_parameter(path, {'nonblocking_fan_in': nonblocking, 'timeline': True}, {})
+    outputs = run(mpi, path, [
+        ('translator', 3, ['nest_to_tvb.py', path, 'translation/spike_detector/0.txt',
+                           'translation/send_to_tvb/0.txt']),
+        ('nest', 2, ['test_file/test_input_nest_to_tvb.py', path + 'translation/spike_detector/0.txt', '2.0',
+                     'double', '200', '3000']),
+        ('tvb', 1, ['test_file/test_receive_nest_to_tvb.py', path + 'translation/send_to_tvb/0.txt', '180']),
+    ])
+    assert outputs['nest'].count('Nest Output : exit') == 2
+    assert 'TVB INPUT :exit' in outputs['tvb']
+    assert outputs['tvb'].count('TVB INPUT : 0 [') == 91
+    # the packages of both NEST ranks are in the slot of each step
+    from nest_elephant_tvb.translation.instrumentation import read_timeline
+    records = read_timeline(glob.glob(os.path.join(path, 'log', 'timeline_nest_to_tvb_receive*.bin'))[0])
+    sizes = [int(line.split()[-1]) for line in outputs['nest'].splitlines() if line.startswith('Nest Output :  ')]
+    assert records.shape[0] > 91
+    assert np.sum(records['events']) == np.sum(sizes)
+
+
+def test_nest_to_tvb_regions(tmp_path, mpi):
+    """Test the translation of NEST to TVB of two regions, NEST of one region runs ahead of the other one"""
+    pytest.importorskip('tvb')
+    path = str(tmp_path) + '/'
+    write_parameter(path, {}, {})
+    # NOTE: the stand-ins of NEST are not paced by TVB, the first region fills its slots before the second connects
+    outputs = run(mpi, path, [
+        ('translator', 3, ['nest_to_tvb.py', path,
+                           'translation/spike_detector/0.txt', 'translation/send_to_tvb/0.txt',
+                           'translation/spike_detector/1.txt', 'translation/send_to_tvb/1.txt']),
+        ('nest_0', 1, ['test_file/test_input_nest_to_tvb.py', path + 'translation/spike_detector/0.txt', '2.0',
+                       'double', '60', '1000']),
+        ('nest_1', 1, ['test_file/test_input_nest_to_tvb.py', path + 'translation/spike_detector/1.txt', '2.0',
+                       'double', '60', '1000']),
+        ('tvb', 1, ['test_file/test_proxies_tvb.py', '2.0', '40', '1', '2',
+                    path + 'translation/send_to_tvb/0.txt', path + 'translation/send_to_tvb/1.txt']),
+    ])
+    assert 'Nest Output : exit' in outputs['nest_0']
+    assert 'Nest Output : exit' in outputs['nest_1']
+    assert 'TVB_PROXIES : exit' in outputs['tvb']
+    assert outputs['tvb'].count('TVB_PROXIES : receive') == 20
+
+
+@pytest.mark.parametrize('speculative', [True, False])
+def test_tvb_to_nest(tmp_path, mpi, speculative):
+    """Test the translation of TVB to NEST : rates bigger than the buffer and NEST ends before TVB"""
+    path = str(tmp_path) + '/'
+    write_parameter(path, {}, {'speculative_generation': speculative})
+    path_config = path + 'translation/spike_generator/'
+    outputs = run(mpi, path, [
+        ('translator', 3, ['tvb_to_nest.py', path_config, '0', '10', '../receive_from_tvb/0.txt']),
+        ('tvb', 1, ['test_file/test_input_tvb_to_nest.py', path + 'translation/receive_from_tvb/0.txt', '20.0',
+                    '400', '5']),
+        ('nest', 1, ['test_file/test_receive_tvb_to_nest.py', path_config + '0.txt', '360']),
+    ])
+    assert 'TVB_OUTPUT :exit' in outputs['tvb']
+    assert 'Nest_Input :exit' in outputs['nest']
+    # the spikes of all the steps until the end of NEST, from the first science rank
+    assert outputs['nest'].count('receive size') == 19
+    assert 'resize the buffer' in logs(path)
+
+
+def test_tvb_to_nest_nest_ranks(tmp_path, mpi):
+    """Test the translation of TVB to NEST with three science ranks and two NEST ranks, each one with a part of the
+    spike generators across the parts of the science ranks"""
+    path = str(tmp_path) + '/'
+    write_parameter(path, {}, {})
+    path_config = path + 'translation/spike_generator/'
+    outputs = run(mpi, path, [
+        ('translator', 4, ['tvb_to_nest.py', path_config, '0', '10', '../receive_from_tvb/0.txt']),
+        ('tvb', 1, ['test_file/test_input_tvb_to_nest.py', path + 'translation/receive_from_tvb/0.txt', '20.0',
+                    '400', '5']),
+        ('nest', 2, ['test_file/test_receive_tvb_to_nest.py', path_config + '0.txt', '360']),
+    ])
+    assert 'TVB_OUTPUT :exit' in outputs['tvb']
+    assert outputs['nest'].count('Nest_Input :exit') == 2
+    # the spikes of all the steps for each NEST rank, from the first science rank (see run_mpi_tvb_to_nest.sh)
+    assert outputs['nest'].count('receive size') == 2*19
+    assert outputs['nest'].count('Nest_Input (0) :receive size') == 19
+    assert outputs['nest'].count('Nest_Input (1) :receive size') == 19
+
+
+def test_proxies_tvb(tmp_path, mpi):
+    """Test the exchanges of TVB (persistent requests, concurrent reception) with both translators and two regions"""
+    pytest.importorskip('tvb')
+    path = str(tmp_path) + '/'
+    write_parameter(path, {}, {})
+    path_config = path + 'translation/spike_generator/'
+    # NOTE: NEST is paced by TVB like in a co-simulation, the next spikes after the input of the previous step
+    outputs = run(mpi, path, [
+        ('nest_to_tvb', 3, ['nest_to_tvb.py', path,
+                            'translation/spike_detector/0.txt', 'translation/send_to_tvb/0.txt',
+                            'translation/spike_detector/1.txt', 'translation/send_to_tvb/1.txt']),
+        ('tvb_to_nest', 3, ['tvb_to_nest.py', path_config, '0', '10', '../receive_from_tvb/0.txt']),
+        ('nest', 1, ['test_file/test_nest_cosimulation.py', '2.0', '38.0', path_config + '0.txt',
+                     path + 'translation/spike_detector/0.txt', path + 'translation/spike_detector/1.txt']),
+        ('tvb', 1, ['test_file/test_proxies_tvb.py', '2.0', '40', '1', '2',
+                    path + 'translation/send_to_tvb/0.txt', path + 'translation/send_to_tvb/1.txt',
+                    path + 'translation/receive_from_tvb/0.txt']),
+    ])
+    assert 'TVB_PROXIES : exit' in outputs['tvb']
+    assert outputs['tvb'].count('TVB_PROXIES : receive') == 20
+    # the input of all the steps until the end of NEST, the last rates of TVB are released
+    assert 'Nest_cosimulation : exit' in outputs['nest']
+    assert outputs['nest'].count('receive size') == 19
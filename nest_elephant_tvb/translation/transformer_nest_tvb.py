@@ -1,9 +1,9 @@
 # Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
 # "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
-import time
 import numpy as np
 from mpi4py import MPI
-from nest_elephant_tvb.translation.science_nest_to_tvb import store_data,analyse_data
+from nest_elephant_tvb.translation.science_nest_to_tvb import store_data,analyse_data,event_unit,event_dtypes
+from nest_elephant_tvb.translation.instrumentation import create_timeline,WAIT,RECEIVE,ANALYSE,SEND,BYTES,EVENTS,HIGH_WATER
 
 def init(path, param, comm, comm_receiver, comm_sender, loggers):
     '''
@@ -19,11 +19,37 @@ def init(path, param, comm, comm_receiver, comm_sender, loggers):
             --> line 32 ff (as of Feb 17th, 2021)
             --> Here: Rank 1-x are doing analysis/science and sending to TVB
             --> For now, hardcoded solution. All places with 'rank 0' are replaced with 'rank 1'
-            --> But as soon as we use more than two MPI ranks, this fails again!!!
+            --> With more than two MPI ranks, only rank 1 communicates with TVB and shares the requests with rank 2-x
     
     TODO: Use RichEndPoints for communication encapsulation
     TODO: Seperate 1)Receive 2)Analysis/Science and 3)Send. See also the many Todos in the code
-    TODO: Make use of / enable MPI parallelism! Solve hardcoded communication protocol first
+    NOTE: the science ranks 1-x bin the spikes in parallel, rank 1 sends to TVB.
+    NOTE: the shared buffer is a ring of param['nb_slot'] slots (default 2), rank 0 receives the next
+    package from NEST while the science ranks analyse the previous one.
+    NOTE: the size of the slots is computed from the parameters, see _buffer_size, the buffer grows
+    if a package from NEST does not fit.
+    NOTE: with param['nonblocking_fan_in'] (default True), rank 0 receives the packages of the NEST ranks
+    in the order of their arrival, see _receive.
+    NOTE: with param['timeline'], each rank records the times and the sizes of its steps,
+    see instrumentation.create_timeline.
+    '''
+    init_regions(path, param, comm, [comm_receiver], [comm_sender], loggers)
+
+
+def init_regions(path, param, comm, comm_receivers, comm_senders, loggers):
+    '''
+    Initialize the transformation of several regions with the same MPI ranks. This is the NEST to TVB direction.
+    One pair of intercommunicators by region: spike detector of NEST and proxy of TVB.
+    Each region has its own histogram and analysis, the regions share the receiving rank, the science ranks
+    and the shared buffer, each region has its own ring of param['nb_slot'] slots in it.
+    The events of NEST and the requests of TVB are handled in the order of their arrival, whatever the region.
+    See init for the transformation of one region.
+    :param path: path of the simulation
+    :param param: parameters of the translation
+    :param comm: MPI intra communicator of the transformer
+    :param comm_receivers: list of the MPI inter communicators with NEST, one by region
+    :param comm_senders: list of the MPI inter communicators with TVB, in the same order
+    :param loggers: list of the loggers: master, receive and send
     '''
     
     # destructure logger list to indivual variables
@@ -31,15 +57,15 @@ def init(path, param, comm, comm_receiver, comm_sender, loggers):
     # science part, see import
     # TODO: use os.path (or similar) for proper file handling.
     # TODO: move this object creation to a proper place. They are passed through many functions.
-    store = store_data(path+'/log/',param)
-    analyse = analyse_data(path+'/log/',param)
+    stores = [store_data(path+'/log/',param) for comm_receiver in comm_receivers]
+    analyses = [analyse_data(path+'/log/',param) for comm_receiver in comm_receivers]
     
     ############ NEW Code: 
-    # TODO: future work: mpi parallel, use rank 1-x for science and sending
-    # TODO: use this MPI intracommunicator, without receiving rank 0
-    # intracomm = comm.Create(comm.Get_group().Excl([0]))
+    # MPI intracommunicator of the science ranks 1-x, without receiving rank 0
+    # NOTE: collective over comm, rank 0 gets MPI.COMM_NULL
+    intracomm = comm.Create(comm.Get_group().Excl([0]))
     # create the shared memory block / databuffer
-    databuffer = _shared_mem_buffer(comm)
+    databuffer, win = _shared_mem_buffer(comm, param.get('nb_slot', 2)*len(comm_receivers), _buffer_size(param))
     ############# NEW Code end
     
     ############ NEW Code: Receive/analyse/send
@@ -47,27 +73,54 @@ def init(path, param, comm, comm_receiver, comm_sender, loggers):
         # TODO: The choice of rank 0 here stems from the current communication with NEST. 
         # All MPI communication is done with rank 0 from NESt side.
         # Make this (and the TVB side as well) scalable. 
-        _receive(comm_receiver, databuffer, logger_receive)
-    else: #  Science/analyse and sender to TVB, rank 1-x
-        _send(comm_sender, databuffer, logger_send, store, analyse)
+        timeline = create_timeline(path+'/log/', logger_receive.name, param)
+        win = _receive(comm, comm_receivers, databuffer, win, logger_receive, timeline,
+                       param.get('nonblocking_fan_in', True), param.get('event_format', 'double'))
+    else: #  Science/analyse on rank 1-x, sender to TVB on rank 1
+        timeline = create_timeline(path+'/log/', logger_send.name+'_'+str(comm.Get_rank()), param)
+        win = _send(comm, comm_senders, intracomm, databuffer, win, logger_send, timeline, stores, analyses)
+        intracomm.Free()
+    timeline.close()
+    # release the shared memory block
+    win.Unlock_all()
+    win.Free()
     ############ NEW Code end
     
     ############ NEW Code: disconnect
     # TODO: should this be done here?
     logger_master.info('Disconnect communicators...')
-    comm_receiver.Disconnect()
-    comm_sender.Disconnect()
+    for comm_receiver, comm_sender in zip(comm_receivers, comm_senders):
+        comm_receiver.Disconnect()
+        comm_sender.Disconnect()
     ############ NEW Code end
 
 
-def _shared_mem_buffer(comm):
+def _buffer_size(param):
+    '''
+    Size of one slot of the shared buffer, from the parameters of the translation.
+    -> maximum number of events by synchronization step: nb_neurons * max_rate * synch
+    -> param['max_rate'] in Hz (default 100 Hz), param['buffer_headroom'] is a factor of safety (default 2)
+    -> each event is three doubles: Id_recording_device, neuronID, spiketimes
+    NOTE: an underestimation is not an error, the buffer grows when a package does not fit.
+    :param param: parameters of the translation
+    :return: number of doubles of one slot
+    '''
+    nb_events = param['nb_neurons'] * param.get('max_rate', 100.0) * 1e-3 * param['synch'] # synch in ms
+    nb_events = int(np.ceil(nb_events * param.get('buffer_headroom', 2.0)))
+    return 3 * max(nb_events, 1000)
+
+
+def _shared_mem_buffer(comm, nb_slot, bufsize):
     '''
     Create shared memory buffer. MPI One-sided-Communication.
+    The hand-off of the buffer between the ranks is done with notification messages on comm,
+    each rank calls win.Sync() after writing and before reading inside a passive target epoch.
     :param comm: MPI intra communicator to create the buffer.
-    :return buffer: 1D shared memory buffer array 
+    :param nb_slot: number of slots of the rings, i.e. number of packages in flight
+    :param bufsize: number of doubles of one slot, see _buffer_size
+    :return buffer: shared memory buffer array, one row by slot
+    :return win: the MPI window of the buffer, locked on all ranks
     
-    TODO: Buffersize/max. expected number of events hardcoded
-    -> free param, handle properly!
     Explanation:
     -> each package from NEST contains a continuous list of the events of the current simulation step
     -> the number of events in each package is unknown and not constant
@@ -79,9 +132,8 @@ def _shared_mem_buffer(comm):
     -> can/should this be more generic?
     '''
     datasize = MPI.DOUBLE.Get_size()
-    bufsize = 1000000 * 3 # NOTE: hardcoded (max.expected events per package from nest)
     if comm.Get_rank() == 0:
-        bufbytes = datasize * bufsize
+        bufbytes = datasize * bufsize * nb_slot
     else: 
         bufbytes= 0
     # rank 0: create the shared block
@@ -89,152 +141,404 @@ def _shared_mem_buffer(comm):
     win = MPI.Win.Allocate_shared(bufbytes, datasize, comm=comm)
     buf, datasize = win.Shared_query(0)
     assert datasize == MPI.DOUBLE.Get_size()
+    # passive target epoch for the whole transformation, needed by win.Sync()
+    win.Lock_all(MPI.MODE_NOCHECK)
     # create a numpy array (buffer) whose data points to the shared mem
-    return np.ndarray(buffer=buf, dtype='d', shape=(bufsize,))
+    return np.ndarray(buffer=buf, dtype='d', shape=(nb_slot,bufsize)), win
+
+
+def _resize_shared_mem_buffer(comm, databuffer, win, bufsize):
+    '''
+    Replace the shared memory buffer by a bigger one, collective over comm.
+    The content of the slots is copied by rank 0 in the new buffer.
+    :param comm: MPI intra communicator of the buffer.
+    :param databuffer: the current buffer
+    :param win: the MPI window of the current buffer
+    :param bufsize: the new number of doubles of one slot
+    :return buffer: the new buffer
+    :return win: the MPI window of the new buffer, locked on all ranks
+    '''
+    win.Sync()
+    if comm.Get_rank() == 0:
+        content = np.copy(databuffer)
+    win.Unlock_all()
+    win.Free()
+    databuffer, win = _shared_mem_buffer(comm, databuffer.shape[0], bufsize)
+    if comm.Get_rank() == 0:
+        databuffer[:,:content.shape[1]] = content
+        win.Sync()
+    return databuffer, win
+
+
+def _grow_buffer(comm, databuffer, win, bufsize, logger):
+    '''
+    Grow the shared memory buffer from the receiving rank.
+    Ask the science ranks to resize the buffer with it. The slots still used by the science ranks
+    are copied in the new buffer, their notifications stay valid.
+    NOTE: no wait for the free slots, a science rank can wait for the request of TVB of another region.
+    :param comm: MPI intra communicator of the buffer.
+    :param databuffer: the current buffer
+    :param win: the MPI window of the current buffer
+    :param bufsize: the new number of doubles of one slot
+    :param logger: logger of the receiving rank
+    :return buffer: the new buffer
+    :return win: the MPI window of the new buffer
+    '''
+    logger.warning("Nest to TVB : resize the buffer from "+str(databuffer.shape[1])+" to "+str(bufsize))
+    for rank in range(1, comm.Get_size()):
+        comm.Send([np.array([bufsize, 0, 0], dtype='i'), MPI.INT], dest=rank, tag=2)
+    return _resize_shared_mem_buffer(comm, databuffer, win, bufsize)
 
 
 # See todo in the beginning, encapsulate I/O, transformer, science parts
-def _receive(comm_receiver, databuffer, logger):
+def _receive(comm, comm_receivers, databuffer, win, logger, timeline, nonblocking=True, event_format='double'):
     '''
     Receive data on rank 0. Put it into the shared mem buffer.
     Replaces the former 'receive' function.
     NOTE: First refactored version -> not pretty, not final. 
+    Hand-off with the science ranks on comm, the slots of each region are filled in the order of its ring
+    (a region without free slot waits, NEST waits for 'ready', the other regions go on):
+    -> tag 0 to rank 1-x: 'ready to do analysis', the message contains the slot, its head and the region
+    -> tag 3+slot from rank 1-x: 'ready to receive from nest', the rank is done with the slot
+       (the regions are analysed in the order of the requests of TVB)
+    -> tag 2 to rank 1-x: 'resize the buffer', the message contains the new size of the slots
+    -> tag 1 to rank 1-x: 'end of NEST', after the end of all the regions
+    Fan-in of the NEST ranks:
+    -> nonblocking: the receptions of the sizes of all the NEST ranks are posted together, the reception of
+       each package is posted as soon as its size arrives, at the head of the slot (time of the slowest NEST rank)
+    -> blocking: the NEST ranks are received one after the other (sum of the times of the NEST ranks)
+    NOTE: the status messages of an exchange are counted over the NEST ranks, the NEST ranks are in lockstep
+          (a NEST rank ends the step before the beginning of the next step of any rank, see test_input_nest_to_tvb.py)
+    :param comm_receivers: list of the MPI inter communicators with NEST, one by region
+    :param timeline: record of the steps: wait for NEST and the science ranks, receive, bytes, events and
+           high-water mark of the buffer
+    :param nonblocking: choice of the fan-in
+    :param event_format: encoding of the spike events sent by NEST, see science_nest_to_tvb.event_dtypes
+           (the packages are copied as bytes in the slot, the science ranks decode them)
+    :return win: the MPI window of the buffer (a new one if the buffer grew)
     '''
     status_ = MPI.Status()
-    num_sending = comm_receiver.Get_remote_size() # how many NEST ranks are sending?
+    num_region = len(comm_receivers)
     # TODO: It seems the 'check' variable is used to receive tags from NEST, i.e. ready for send...
     # change this in the future, also mentioned in the FatEndPoint solution from Wouter.
-    check = np.empty(1,dtype='b')
+    checks = np.empty((num_region, 1), dtype='b')
     shape = np.empty(1, dtype='i')    
-    count = 0
-    # TODO: the last two buffer entries are used for shared information
-    # --> they replace the status_data variable from previous version
-    # --> find more elegant solution?
-    databuffer[-1] = 1 # set buffer to 'ready to receive from nest'
-    databuffer[-2] = 0 # marks the 'head' of the buffer
+    true_ = np.array(True,dtype='b') # message 'ready' to the NEST ranks
+    count = np.zeros(num_region, dtype=int)
+    nb_slot = databuffer.shape[0]//num_region # slots of each region
+    slots = np.arange(num_region)*nb_slot # next slot of the ring of each region
+    head = np.empty(3, dtype='i') # slot, head of the buffer and region, sent to the science ranks
+    ready = np.empty((databuffer.shape[0], comm.Get_size()), dtype='b') # placeholder of the notifications of the science ranks
+    requests_ready = [[] for i in range(databuffer.shape[0])] # all the slots are empty at the beginning
+    high_water = 0 # maximum of bytes used in one slot
+    unit = event_unit(event_format) # bytes by unit of the size of the packages
+    datatype = MPI.DOUBLE if event_format == 'double' else MPI.BYTE
+    # the status messages of NEST of all the regions are received in the order of their arrival
+    # NOTE: a new reception is only posted after the end of the exchange with the region
+    nb_check = np.zeros(num_region, dtype=int) # messages of the current exchange of each region
+    requests_check = [comm_receiver.Irecv([checks[region], 1, MPI.CXX_BOOL], source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG)
+                      for region, comm_receiver in enumerate(comm_receivers)]
+    nb_running = num_region
+    waiting = [] # regions with a package of NEST and without free slot
     
-    while(True):
-        logger.info(" Nest to TVB : wait all")
+    itemsize = event_dtypes[event_format].itemsize
+    while nb_running > 0:
+        logger.debug(" Nest to TVB : wait all")
         head_ = 0 # head of the buffer, reset after each iteration
-         
-        # TODO: This is still not correct. We only check for the Tag of the last rank.
-        # TODO: IF all ranks send always the same tag in one iteration (simulation step)
-        # TODO: then this works. But it should be handled differently!!!!
-        for i in range(num_sending):
+        
+        # NEW: a region without free slot waits, the other regions go on
+        # (the science ranks can wait for the package of another region, see _receive_notification)
+        released = [region for region in waiting if MPI.Request.Testall(requests_ready[slots[region]])]
+        if len(released) > 0:
+            region = released[0]
+            waiting.remove(region)
+            tag = 0
+        else:
+            # TODO: This is still not correct. We only check for the Tag of the last rank.
+            # TODO: IF all ranks send always the same tag in one iteration (simulation step)
+            # TODO: then this works. But it should be handled differently!!!!
             # new: We do not care which source sends first, give MPI the freedom to send in whichever order.
-            comm_receiver.Recv([check, 1, MPI.CXX_BOOL], source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG, status=status_)
+            # the status messages of NEST or the release of a slot of a waiting region
+            requests_released = [request for region in waiting for request in requests_ready[slots[region]]]
+            region = MPI.Request.Waitany(requests_check + requests_released, status_)
+            if region >= num_region:
+                continue
+            num_sending = comm_receivers[region].Get_remote_size() # how many NEST ranks are sending?
+            nb_check[region] += 1
+            if nb_check[region] < num_sending:
+                requests_check[region] = comm_receivers[region].Irecv([checks[region], 1, MPI.CXX_BOOL],
+                                                                      source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG)
+                continue
+            nb_check[region] = 0
+            tag = status_.Get_tag()
+            if tag == 0 and not MPI.Request.Testall(requests_ready[slots[region]]):
+                # all the slots of the region are used by the science ranks, NEST waits for 'ready'
+                waiting.append(region)
+                continue
+        comm_receiver = comm_receivers[region]
+        num_sending = comm_receiver.Get_remote_size() # how many NEST ranks are sending?
+        slot = slots[region]
         # TODO: handle properly, all ranks send tag 0?
-        if status_.Get_tag() == 0:
-            # wait until ready to receive new data (i.e. the sender has cleared the buffer)
-            while databuffer[-1] != 1: # TODO: use MPI, remove the sleep
-                time.sleep(0.001)
-                pass
-            for source in range(num_sending):
-                # send 'ready' to the nest rank
-                comm_receiver.Send([np.array(True,dtype='b'),MPI.BOOL],dest=source,tag=0)
-                # receive package size info
-                comm_receiver.Recv([shape, 1, MPI.INT], source=source, tag=0, status=status_)
-                # NEW: receive directly into the buffer
-                comm_receiver.Recv([databuffer[head_:], MPI.DOUBLE], source=source, tag=0, status=status_)
-                head_ += shape[0] # move head 
-                # TODO: revisit and check for proper encapsulation
-                # Here, storing and adding the spikes to the histogram was done
-                # Old code: store.add_spikes(count,data)
-                # This increased the workload of this MPI rank.
-                # All science and analysis stuff is moved to the 'sender' part. Because future parallel.
+        if tag == 0:
+            # the science ranks are done with the slot
+            win.Sync()
+            timeline.toc(WAIT)
+            if nonblocking:
+                # send 'ready' to all the nest ranks and receive the package sizes together
+                shapes = np.empty(num_sending, dtype='i')
+                requests_send = [comm_receiver.Isend([true_, MPI.BOOL], dest=source, tag=0)
+                                 for source in range(num_sending)]
+                requests_shape = [comm_receiver.Irecv([shapes[source:source+1], MPI.INT], source=source, tag=0)
+                                  for source in range(num_sending)]
+                requests_data = []
+                nb_shape = 0
+                while nb_shape < num_sending:
+                    # NEW: the reception of a package starts as soon as its size arrives,
+                    # the packages are placed in the slot in the order of arrival of their sizes
+                    for source in MPI.Request.Waitsome(requests_shape):
+                        size_bytes = int(shapes[source])*unit
+                        if head_ + size_bytes > databuffer.shape[1]*8:
+                            # the package does not fit: end the receptions in the buffer and grow it
+                            MPI.Request.Waitall(requests_data)
+                            databuffer, win = _grow_buffer(comm, databuffer, win,
+                                                           max(2*databuffer.shape[1], int(np.ceil((head_ + size_bytes)/8))), logger)
+                        # NEW: receive directly into the buffer
+                        package = databuffer[slot].view(np.uint8)[head_:head_+size_bytes]
+                        requests_data.append(comm_receiver.Irecv([package, datatype], source=source, tag=0))
+                        head_ += size_bytes # move head
+                        nb_shape += 1
+                MPI.Request.Waitall(requests_data + requests_send)
+            else:
+                for source in range(num_sending):
+                    # send 'ready' to the nest rank
+                    comm_receiver.Send([np.array(True,dtype='b'),MPI.BOOL],dest=source,tag=0)
+                    # receive package size info
+                    comm_receiver.Recv([shape, 1, MPI.INT], source=source, tag=0, status=status_)
+                    size_bytes = int(shape[0])*unit
+                    if head_ + size_bytes > databuffer.shape[1]*8:
+                        # the package does not fit: grow the buffer
+                        databuffer, win = _grow_buffer(comm, databuffer, win,
+                                                       max(2*databuffer.shape[1], int(np.ceil((head_ + size_bytes)/8))), logger)
+                    # NEW: receive directly into the buffer
+                    comm_receiver.Recv([databuffer[slot].view(np.uint8)[head_:head_+size_bytes], datatype],
+                                       source=source, tag=0, status=status_)
+                    head_ += size_bytes # move head 
+                    # TODO: revisit and check for proper encapsulation
+                    # Here, storing and adding the spikes to the histogram was done
+                    # Old code: store.add_spikes(count,data)
+                    # This increased the workload of this MPI rank.
+                    # All science and analysis stuff is moved to the 'sender' part. Because future parallel.
             # Mark as 'ready to do analysis'
-            databuffer[-1] = 0
-            # important: head_ is first buffer index WITHOUT data.
-            databuffer[-2] = head_
+            # important: head_ is first byte of the slot WITHOUT data.
+            head[0] = slot
+            head[1] = head_
+            head[2] = region
+            high_water = max(high_water, head_)
+            win.Sync()
+            for rank in range(1, comm.Get_size()):
+                comm.Send([head, MPI.INT], dest=rank, tag=0)
+            requests_ready[slot] = [comm.Irecv([ready[slot,rank:rank+1], MPI.BOOL], source=rank, tag=3+slot)
+                                    for rank in range(1, comm.Get_size())]
+            timeline.toc(RECEIVE)
+            timeline.add(BYTES, head_)
+            timeline.add(EVENTS, head_//itemsize)
+            timeline.set(HIGH_WATER, high_water)
+            timeline.next(count[region], region)
+            slots[region] = region*nb_slot + (slot+1-region*nb_slot) % nb_slot
         # TODO: handle properly, all ranks send tag 1?
-        elif status_.Get_tag() == 1:
-            count += 1
-            logger.info("Nest to TVB : receive end " + str(count))
+        elif tag == 1:
+            count[region] += 1
+            logger.debug("Nest to TVB : receive end %d region %d", count[region], region)
         # TODO: handle properly, all ranks send tag 2?
-        elif status_.Get_tag() == 2:
-            logger.info("NEST: end simulation")
-            break
+        elif tag == 2:
+            logger.info("NEST: end simulation region " + str(region))
+            nb_running -= 1
+            continue
         else:
-            raise Exception("bad mpi tag"+str(status_.Get_tag()))
+            raise Exception("bad mpi tag"+str(tag))
+        # next exchange with the region
+        requests_check[region] = comm_receiver.Irecv([checks[region], 1, MPI.CXX_BOOL],
+                                                     source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG)
     
+    # end notification to the science ranks, then wait until they release all the slots
+    # NOTE: the last data can be not analysed, if TVB ends before, see _drain
+    for rank in range(1, comm.Get_size()):
+        comm.Send([head, MPI.INT], dest=rank, tag=1)
+    MPI.Request.Waitall([request for requests in requests_ready for request in requests])
+    logger.info('NEST_to_TVB: high-water mark of the buffer : '+str(high_water)+' / '+str(databuffer.shape[1]*8)+' bytes')
     logger.info('NEST_to_TVB: End of receive function')
+    return win
 
 
 # See todo in the beginning, encapsulate I/O, transformer, science parts
-def _send(comm_sender, databuffer, logger, store, analyse):
+def _send(comm, comm_senders, intracomm, databuffer, win, logger, timeline, stores, analyses):
     '''
     Analysis/Science on INTRAcommunicator (multiple MPI ranks possible).
-    TODO: not yet used, see also analysis function below
-    Send data to TVB on INTERcommunicator comm_sender (multiple MPI ranks possible).
+    Send data to TVB on INTERcommunicator comm_sender, from the first science rank.
     Replaces the former 'send' function.
     NOTE: First refactored version -> not pretty, not final. 
     
     TODO: Ugly: 'store' and 'analyse' objects passed through all the way from the beginning.
     TODO: Discuss communication protocol of NEST<->transformer and transformer<->TVB
+    :param comm_senders: list of the MPI inter communicators with TVB, one by region
+    :param timeline: record of the steps: wait for TVB and the receiving rank, analyse, send and events
+    :param stores: list of the histograms of the regions
+    :param analyses: list of the analyses of the regions
+    :return win: the MPI window of the buffer (a new one if the buffer grew)
     '''
 
-    count=0
+    num_region = len(comm_senders)
+    count = np.zeros(num_region, dtype=int)
     status_ = MPI.Status()
-    while True:
+    sources = np.zeros(num_region, dtype=int) # rank of TVB which requests the data of each region
+    tag = np.empty(2, dtype='i') # request of TVB and its region, shared with all the science ranks
+    pending = [[] for i in range(num_region)] # notifications of the receiving rank not yet requested by TVB
+    if intracomm.Get_rank() == 0:
         # TODO: this communication has the 'rank 0' problem described in the beginning
-        accept = False
-        logger.info("Nest to TVB : wait to send " )
-        while not accept:
-            req = comm_sender.irecv(source=MPI.ANY_SOURCE,tag=MPI.ANY_TAG)
-            accept = req.wait(status_)
-        logger.info(" Nest to TVB : send data status : " +str(status_.Get_tag()))
-        if status_.Get_tag() == 0:
-            # wait until the receiver has cleared the buffer, i.e. filled with new data
-            while databuffer[-1] != 0: # TODO: use MPI, remove the sleep
-                time.sleep(0.001)
-                pass
+        # the requests of TVB of all the regions are received in the order of their arrival
+        requests_tvb = [comm_sender.irecv(source=MPI.ANY_SOURCE,tag=MPI.ANY_TAG) for comm_sender in comm_senders]
+    nb_running = num_region
+    while nb_running > 0:
+        if intracomm.Get_rank() == 0:
+            accept = False
+            logger.debug("Nest to TVB : wait to send ")
+            while not accept:
+                if num_region == 1:
+                    region = 0
+                    accept = requests_tvb[0].wait(status_)
+                else:
+                    region, accept = MPI.Request.waitany(requests_tvb, status_)
+                if not accept or status_.Get_tag() == 0:
+                    requests_tvb[region] = comm_senders[region].irecv(source=MPI.ANY_SOURCE,tag=MPI.ANY_TAG)
+            logger.debug(" Nest to TVB : send data status : %d region %d", status_.Get_tag(), region)
+            tag[0] = status_.Get_tag()
+            tag[1] = region
+            sources[region] = status_.Get_source()
+        intracomm.Bcast([tag, MPI.INT], root=0)
+        region = tag[1]
+        if tag[0] == 0:
+            # wait until the receiver has filled a slot with new data of the region
+            slot, head, databuffer, win = _receive_notification(comm, region, pending, databuffer, win)
+            win.Sync()
+            timeline.toc(WAIT)
             # TODO: All science/analysis here. Move to a proper place.
-            times,data = _analyse(count, databuffer, store, analyse)
-            
+            times,data = _analyse(count[region], databuffer[slot].view(np.uint8)[:head], stores[region], analyses[region], intracomm)
             # Mark as 'ready to receive next simulation step'
-            databuffer[-1] = 1
+            comm.Send([np.array(True,dtype='b'), MPI.BOOL], dest=0, tag=3+slot)
+            timeline.toc(ANALYSE)
+            timeline.add(EVENTS, head//stores[region].event_dtype.itemsize)
             
-            ############ OLD Code
-            # TODO: this communication has the 'rank 0' problem described in the beginning
-            logger.info("Nest to TVB : send data :"+str(np.sum(data)) )
-            # time of stating and ending step
-            comm_sender.Send([times, MPI.DOUBLE], dest=status_.Get_source(), tag=0)
-            # send the size of the rate
-            size = np.array(int(data.shape[0]),dtype='i')
-            comm_sender.Send([size,MPI.INT], dest=status_.Get_source(), tag=0)
-            # send the rates
-            comm_sender.Send([data,MPI.DOUBLE], dest=status_.Get_source(), tag=0)
-            ############ OLD Code end
-        elif status_.Get_tag() == 1:
+            if intracomm.Get_rank() == 0:
+                ############ OLD Code
+                # TODO: this communication has the 'rank 0' problem described in the beginning
+                # time of stating and ending step
+                comm_senders[region].Send([times, MPI.DOUBLE], dest=sources[region], tag=0)
+                # send the size of the rate
+                size = np.array(int(data.shape[0]),dtype='i')
+                comm_senders[region].Send([size,MPI.INT], dest=sources[region], tag=0)
+                # send the rates
+                comm_senders[region].Send([data,MPI.DOUBLE], dest=sources[region], tag=0)
+                ############ OLD Code end
+                timeline.toc(SEND)
+                timeline.add(BYTES, times.nbytes + size.nbytes + data.nbytes)
+            timeline.next(count[region], region)
+            count[region]+=1
+        elif tag[0] == 1:
             # disconnect when everything is ending
-            break
+            nb_running -= 1
         else:
-            raise Exception("bad mpi tag"+str(status_.Get_tag()))
-        count+=1
+            raise Exception("bad mpi tag"+str(tag[0]))
+    # the receiving rank can still wait for the release of the slots
+    databuffer, win = _drain(comm, pending, databuffer, win)
     logger.info('NEST_to_TVB: End of send function')
+    return win
+
+
+def _receive_notification(comm, region, pending, databuffer, win):
+    '''
+    Wait for the next slot of a region filled by the receiving rank.
+    The notifications of the other regions are kept until TVB requests them.
+    :param comm: MPI intra communicator of the buffer.
+    :param region: the region requested by TVB
+    :param pending: the notifications not yet requested by TVB, by region
+    :param databuffer: the current buffer
+    :param win: the MPI window of the current buffer
+    :return slot, head: the slot of the data and the first byte of the slot without data
+    :return databuffer, win: the buffer and its window (new ones if the buffer grew)
+    '''
+    status_ = MPI.Status()
+    notification = np.empty(3, dtype='i') # slot, head and region
+    while len(pending[region]) == 0:
+        comm.Recv([notification, MPI.INT], source=0, tag=MPI.ANY_TAG, status=status_)
+        if status_.Get_tag() == 2:
+            # the receiving rank grows the buffer
+            databuffer, win = _resize_shared_mem_buffer(comm, databuffer, win, notification[0])
+        elif status_.Get_tag() == 1:
+            raise Exception("Nest to TVB : end of NEST before the request of TVB for the region "+str(region))
+        else:
+            pending[notification[2]].append((notification[0], notification[1]))
+    slot, head = pending[region].pop(0)
+    return slot, head, databuffer, win
+
+
+def _drain(comm, pending, databuffer, win):
+    '''
+    Release the slots which will not be analysed, until the end notification of the receiving rank.
+    TVB can end before NEST: the notifications not requested by TVB and the next ones are released
+    without analysis.
+    :param comm: MPI intra communicator of the buffer.
+    :param pending: the notifications not yet requested by TVB, by region
+    :param databuffer: the current buffer
+    :param win: the MPI window of the current buffer
+    :return databuffer, win: the buffer and its window (new ones if the buffer grew)
+    '''
+    for notifications in pending:
+        for slot, head in notifications:
+            comm.Send([np.array(True,dtype='b'), MPI.BOOL], dest=0, tag=3+slot)
+    status_ = MPI.Status()
+    notification = np.empty(3, dtype='i') # slot, head and region
+    comm.Recv([notification, MPI.INT], source=0, tag=MPI.ANY_TAG, status=status_)
+    while status_.Get_tag() != 1:
+        if status_.Get_tag() == 2:
+            # the receiving rank grows the buffer
+            databuffer, win = _resize_shared_mem_buffer(comm, databuffer, win, notification[0])
+        else:
+            comm.Send([np.array(True,dtype='b'), MPI.BOOL], dest=0, tag=3+notification[0])
+        comm.Recv([notification, MPI.INT], source=0, tag=MPI.ANY_TAG, status=status_)
+    return databuffer, win
 
 
 # See todo in the beginning, encapsulate I/O, transformer, science parts
-def _analyse(count, databuffer, store, analyse):
+def _analyse(count, databuffer, store, analyse, intracomm):
     '''
     All analysis and science stuff in one place.
     Done in three steps, that were previously disconnected.
     Step 1 and 2 were done in the receiving thread, step 3 in the sending thread.
     NOTE: All science and analysis is the same as before.
     :param count: Simulation iteration/step
-    :param databuffer: The buffer contains the spikes of the current step
+    :param databuffer: The bytes of the slot which contains the spikes of the current step
     :param store: Python object, create the histogram 
     :param analyse: Python object, calculate rates
-    :return times, data: simulation times and the calculated rates
-    
-    TODO: Step 1 and 2 can be merged into one step. Buffer is no longer filled rank by rank.
-    TODO: Make this parallel with the INTRA communicator (should be embarrassingly parallel).
-    '''
-    # Step 1) take all data from buffer and create histogram
-    # second to last index in databuffer denotes how much data there is
-    store.add_spikes(count,databuffer[:int(databuffer[-2])])
-    # Step 2) take the resulting histogram
-    data_to_analyse = store.return_data()
+    :param intracomm: MPI intracommunicator of the science ranks
+    :return times, data: simulation times and the calculated rates (None on the other science ranks than 0)
+    '''
+    # Step 1) each science rank takes its slice of the events in the buffer and creates a partial histogram
+    rank = intracomm.Get_rank()
+    size = intracomm.Get_size()
+    itemsize = store.event_dtype.itemsize
+    nb_events = databuffer.shape[0]//itemsize
+    begin = nb_events*rank//size
+    end = nb_events*(rank+1)//size
+    store.add_events(count,databuffer[itemsize*begin:itemsize*end])
+    partial_hist = store.return_data()
+    # Step 2) sum of the partial histograms on the rank which sends to TVB
+    # NOTE: histograms are counts of spikes, the sum is exact whatever the number of ranks
+    if rank == 0:
+        data_to_analyse = np.empty_like(partial_hist)
+        intracomm.Reduce([partial_hist, MPI.DOUBLE], [data_to_analyse, MPI.DOUBLE], op=MPI.SUM, root=0)
+    else:
+        intracomm.Reduce([partial_hist, MPI.DOUBLE], None, op=MPI.SUM, root=0)
+        return None, None
     # Step 3) Analyse this data, i.e. calculate rates?
     times,data = analyse.analyse(count,data_to_analyse)
     
@@ -1,9 +1,9 @@
 # Copyright 2020 Forschungszentrum Jülich GmbH and Aix-Marseille Université
 # "Licensed to the Apache Software Foundation (ASF) under one or more contributor license agreements; and to You under the Apache License, Version 2.0. "
-import time
 import numpy as np
 from mpi4py import MPI
-from nest_elephant_tvb.translation.science_tvb_to_nest import generate_data
+from nest_elephant_tvb.translation.science_tvb_to_nest import generate_data,generate_rate_data
+from nest_elephant_tvb.translation.instrumentation import create_timeline,WAIT,RECEIVE,ANALYSE,SEND,BYTES,EVENTS,HIGH_WATER
 
 def init(path_config, nb_spike_generator, id_first_spike_detector, param,
          comm, comm_receiver, comm_sender, loggers):
@@ -20,30 +20,55 @@ def init(path_config, nb_spike_generator, id_first_spike_detector, param,
     -> NEST communcates on rank 1
     This is vice versa in the nest to tvb direction.
     TODO: solve this together with the rest of the communication protocol.
+    NOTE: the shared buffer is a ring of param['nb_slot'] slots (default 2), rank 0 receives the next
+    rates from TVB while the science ranks generate the spikes of the previous ones.
+    NOTE: the size of the slots is computed from the parameters, see _buffer_size, the buffer grows
+    if the rates from TVB do not fit.
+    NOTE: with param['timeline'], each rank records the times and the sizes of its steps,
+    see instrumentation.create_timeline.
+    NOTE: with param['speculative_generation'] (default True), the spikes are generated as soon as the rates
+    arrive, before the request of NEST, see _send.
+    NOTE: the spike generators are divided between the science ranks 1-x, each one generates the spikes of its
+    part of the generators, rank 1 gathers them and sends them to NEST, see _send.
     '''
     
     # destructure logger list to indivual variables
     logger_master, logger_receive, logger_send = loggers
-    # science part, see import
-    # TODO: use os.path (or similar) for proper file handling.
-    # TODO: move this object creation to a proper place. They are passed through many functions.
-    generator = generate_data(path_config+'/../../log/',nb_spike_generator,param)
     
     ############ NEW Code: 
-    # TODO: future work: mpi parallel, use rank 1-x for science and sending
-    # TODO: use this MPI intracommunicator, without receiving rank 0
-    # intracomm = comm.Create(comm.Get_group().Excl([0]))
+    # MPI intracommunicator of the science ranks 1-x, without receiving rank 0
+    # NOTE: collective over comm, rank 0 gets MPI.COMM_NULL
+    intracomm = comm.Create(comm.Get_group().Excl([0]))
     # create the shared memory block / databuffer
-    databuffer = _shared_mem_buffer(comm)
+    databuffer, win = _shared_mem_buffer(comm, param.get('nb_slot', 2), _buffer_size(param))
     ############# NEW Code end
     
     ############ NEW Code: Receive/analyse/send
     if comm.Get_rank() == 0: # Receiver from TVB
         # All MPI communication is done with rank 0 from TVB side
         # Make this (and the NEST side as well) scalable. 
-        _receive(comm_receiver, databuffer, logger_receive)
+        timeline = create_timeline(path_config+'/../../log/', logger_receive.name, param)
+        win = _receive(comm, comm_receiver, databuffer, win, logger_receive, timeline)
     else: #  Science/generate and sender to NEST, rank 1-x
-        _send(comm_sender, databuffer, logger_send, generator, id_first_spike_detector)
+        # science part, see import
+        # TODO: use os.path (or similar) for proper file handling.
+        # TODO: move this object creation to a proper place. They are passed through many functions.
+        if param.get('transport', 'spikes') == 'rates':
+            # NEW: the rates for the rate generators of Nest in place of the spike trains
+            # NOTE: the rate generators have no shared spikes, see generate_rate_data
+            generator =generate_rate_data(path_config+'/../../log/',nb_spike_generator,param,
+                                           intracomm.Get_rank(),intracomm.Get_size(),id_first_spike_detector)
+        else:
+            generator = generate_data(path_config+'/../../log/',nb_spike_generator,param,
+                                      intracomm.Get_rank(),intracomm.Get_size(),id_first_spike_detector)
+        timeline = create_timeline(path_config+'/../../log/', logger_send.name+'_'+str(comm.Get_rank()), param)
+        win = _send(comm, comm_sender, intracomm, databuffer, win, logger_send, timeline, generator,
+                    id_first_spike_detector, param.get('speculative_generation', True))
+        intracomm.Free()
+    timeline.close()
+    # release the shared memory block
+    win.Unlock_all()
+    win.Free()
     ############ NEW Code end
     
     ############ NEW Code: disconnect
@@ -54,21 +79,37 @@ def init(path_config, nb_spike_generator, id_first_spike_detector, param,
     ############ NEW Code end
     
 
-def _shared_mem_buffer(comm):
+def _buffer_size(param):
+    '''
+    Size of one slot of the shared buffer, from the parameters of the translation.
+    -> 2 doubles: [start_time,end_time] of simulation step
+    -> one rate by integration step of TVB: synch / resolution
+    -> param['buffer_headroom'] is a factor of safety (default 2)
+    NOTE: an underestimation is not an error, the buffer grows when the rates do not fit.
+    :param param: parameters of the translation
+    :return: number of doubles of one slot
+    '''
+    if 'synch' in param and 'resolution' in param:
+        nb_rates = int(np.ceil(param['synch'] / param['resolution'] * param.get('buffer_headroom', 2.0)))
+    else:
+        nb_rates = 0
+    return 2 + max(nb_rates, 1000)
+
+
+def _shared_mem_buffer(comm, nb_slot, bufsize):
     '''
     Create shared memory buffer. MPI One-sided-Communication.
+    The hand-off of the buffer between the ranks is done with notification messages on comm,
+    see transformer_nest_tvb._shared_mem_buffer.
     :param comm: MPI intra communicator to create the buffer.
-    :return buffer: 1D shared memory buffer array 
-    
-    TODO: Buffersize/max. expected size of incoming data
-    -> free param, handle properly!
-    TODO: 2 doubles: [start_time,end_time] of simulation step
-    TODO: unknown number of doubles: array with rates
+    :param nb_slot: number of slots of the ring, i.e. number of rate arrays in flight
+    :param bufsize: number of doubles of one slot, see _buffer_size
+    :return buffer: shared memory buffer array, one row by slot
+    :return win: the MPI window of the buffer, locked on all ranks
     '''
     datasize = MPI.DOUBLE.Get_size()
-    bufsize = 2 + 1000000 # NOTE: hardcoded (max.expected size of rate array)
     if comm.Get_rank() == 0:
-        bufbytes = datasize * bufsize
+        bufbytes = datasize * bufsize * nb_slot
     else: 
         bufbytes= 0
     # rank 0: create the shared block
@@ -76,145 +117,385 @@ def _shared_mem_buffer(comm):
     win = MPI.Win.Allocate_shared(bufbytes, datasize, comm=comm)
     buf, datasize = win.Shared_query(0)
     assert datasize == MPI.DOUBLE.Get_size()
+    # passive target epoch for the whole transformation, needed by win.Sync()
+    win.Lock_all(MPI.MODE_NOCHECK)
     # create a numpy array (buffer) whose data points to the shared mem
-    return np.ndarray(buffer=buf, dtype='d', shape=(bufsize,))
+    return np.ndarray(buffer=buf, dtype='d', shape=(nb_slot,bufsize)), win
+
+
+def _resize_shared_mem_buffer(comm, databuffer, win, bufsize):
+    '''
+    Replace the shared memory buffer by a bigger one, collective over comm.
+    The content of the slots is copied by rank 0 in the new buffer.
+    :param comm: MPI intra communicator of the buffer.
+    :param databuffer: the current buffer
+    :param win: the MPI window of the current buffer
+    :param bufsize: the new number of doubles of one slot
+    :return buffer: the new buffer
+    :return win: the MPI window of the new buffer, locked on all ranks
+    '''
+    win.Sync()
+    if comm.Get_rank() == 0:
+        content = np.copy(databuffer)
+    win.Unlock_all()
+    win.Free()
+    databuffer, win = _shared_mem_buffer(comm, databuffer.shape[0], bufsize)
+    if comm.Get_rank() == 0:
+        databuffer[:,:content.shape[1]] = content
+        win.Sync()
+    return databuffer, win
 
 
 # See todo in the beginning, encapsulate I/O, transformer, science parts
-def _receive(comm_receiver, databuffer, logger):
+def _receive(comm, comm_receiver, databuffer, win, logger, timeline):
     '''
     Receive data on rank 0. Put it into the shared mem buffer.
     Replaces the former 'receive' function.
     NOTE: First refactored version -> not pretty, not final. 
+    Hand-off with the science ranks on comm, slot by slot in the order of the ring:
+    -> tag 0 to rank 1-x: 'ready to do analysis', the message contains the slot and the size of the rate array
+    -> tag 1 from rank 1-x: 'ready to receive from tvb', the rank is done with the slot
+    -> tag 2 to rank 1-x: 'resize the buffer', the message contains the new size of the slots
+    -> tag 1 to rank 1-x: 'end of TVB'
+    :param timeline: record of the steps: wait for TVB and the science ranks, receive, bytes, rates and
+           high-water mark of the buffer (bytes)
+    :return win: the MPI window of the buffer (a new one if the buffer grew)
     '''
     status_ = MPI.Status()
     num_sending = comm_receiver.Get_remote_size() # how many TVB ranks are sending?
     # init placeholder for incoming data
     time_step = np.empty(2, dtype='d') # two doubles with start and end time of the step
-    size = np.empty(1, dtype='i') # size of the rate-array
-    # TODO: the last two buffer entries are used for shared information
-    # --> they replace the status_data variable from previous version
-    # --> find more elegant solution?
-    databuffer[-1] = 1 # set buffer to 'ready to receive from tvb'
-    databuffer[-2] = 0 # marks the 'head' of the buffer
+    size = np.empty(2, dtype='i') # slot and size of the rate-array
+    nb_slot = databuffer.shape[0]
+    slot = 0 # next slot of the ring to fill
+    ready = np.empty((nb_slot, comm.Get_size()), dtype='b') # placeholder of the notifications of the science ranks
+    requests_ready = [[] for i in range(nb_slot)] # all the slots are empty at the beginning
+    high_water = 0 # maximum of doubles used in one slot
+    count = 0 # number of rate arrays received
     
     while True:
         # TODO: NEST to TVB transformer: irecv
         # TODO: TVB to NEST transformer (here): isend
         # TODO: --> rework communication protocol between simulators and transformers!
         requests=[]
-        logger.info(" TVB to Nest: wait receive ")
+        logger.debug(" TVB to Nest: wait receive ")
         for rank in range(num_sending):
             requests.append(comm_receiver.isend(True,dest=rank,tag=0))
         MPI.Request.Waitall(requests)
-        logger.info(" TVB to Nest: receive all")
+        logger.debug(" TVB to Nest: receive all")
         
         # TODO: works for now, needs rework if multiple ranks are used on TVB side
         # TODO: we receive from "ANY_SOURCE", but only check the status_ of the last receive...
         # get the starting and ending time of the simulation step
-        # NEW: receive directly into the buffer
-        comm_receiver.Recv([databuffer[0:], MPI.DOUBLE], source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG, status=status_)
-        logger.info(" TVB to Nest: get time_step "+str(time_step)+" status : " + str(status_.Get_tag()))
+        # NOTE: not directly into the buffer, the science ranks can still use the times of the previous step
+        comm_receiver.Recv([time_step, 2, MPI.DOUBLE], source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG, status=status_)
+        logger.debug(" TVB to Nest: get time_step %s status : %d", time_step, status_.Get_tag())
         if status_.Get_tag() == 0:
-            # wait until ready to receive new data (i.e. the sender has cleared the buffer)
-            while databuffer[-1] != 1: # TODO: use MPI, remove the sleep
-                time.sleep(0.001)
-                pass
             # Get the size of the data
-            comm_receiver.Recv([size, 1, MPI.INT], source=status_.Get_source(), tag=0, status=status_)
+            size[0] = slot
+            comm_receiver.Recv([size[1:], 1, MPI.INT], source=status_.Get_source(), tag=0, status=status_)
+            if 2 + size[1] > databuffer.shape[1]:
+                # the rates do not fit: wait until all the slots are free and grow the buffer
+                bufsize = max(2*databuffer.shape[1], 2 + size[1])
+                logger.warning("TVB to Nest : resize the buffer from "+str(databuffer.shape[1])+" to "+str(bufsize))
+                MPI.Request.Waitall([request for requests in requests_ready for request in requests])
+                requests_ready = [[] for i in range(nb_slot)]
+                for rank in range(1, comm.Get_size()):
+                    comm.Send([np.array([bufsize, 0], dtype='i'), MPI.INT], dest=rank, tag=2)
+                databuffer, win = _resize_shared_mem_buffer(comm, databuffer, win, bufsize)
+            # wait until ready to receive new data (i.e. all the science ranks are done with the slot)
+            MPI.Request.Waitall(requests_ready[slot])
+            win.Sync()
+            timeline.toc(WAIT)
+            databuffer[slot,0:2] = time_step
             # NEW: receive directly into the buffer
             # First two entries are the times, see above
-            comm_receiver.Recv([databuffer[2:], MPI.DOUBLE], source=status_.Get_source(), tag=0, status=status_)
-            # Mark as 'ready to do analysis'
-            databuffer[-1] = 0
-            databuffer[-2] = size # info about size of data array
-            logger.info(" TVB to Nest: update buffer")
+            comm_receiver.Recv([databuffer[slot,2:], MPI.DOUBLE], source=status_.Get_source(), tag=0, status=status_)
+            # Mark as 'ready to do analysis', with the info about size of data array
+            high_water = max(high_water, 2 + size[1])
+            win.Sync()
+            for rank in range(1, comm.Get_size()):
+                comm.Send([size, MPI.INT], dest=rank, tag=0)
+            # NOTE: the notifications of one rank arrive in the order of the ring
+            requests_ready[slot] = [comm.Irecv([ready[slot,rank:rank+1], MPI.BOOL], source=rank, tag=1)
+                                    for rank in range(1, comm.Get_size())]
+            timeline.toc(RECEIVE)
+            timeline.add(BYTES, time_step.nbytes + 8*size[1])
+            timeline.add(EVENTS, size[1])
+            timeline.set(HIGH_WATER, 8*high_water)
+            timeline.next(count)
+            count += 1
+            slot = (slot+1) % nb_slot
+            logger.debug(" TVB to Nest: update buffer")
         elif status_.Get_tag() == 1:
             logger.info('TVB: end simulation')
             break
         else:
             raise Exception("bad mpi tag"+str(status_.Get_tag()))
     
+    # end notification to the science ranks, then wait until they release all the slots
+    # NOTE: the last rates can be not used, if NEST ends before, see _drain
+    for rank in range(1, comm.Get_size()):
+        comm.Send([size, MPI.INT], dest=rank, tag=1)
+    MPI.Request.Waitall([request for requests in requests_ready for request in requests])
+    logger.info('TVB_to_NEST: high-water mark of the buffer : '+str(high_water)+' / '+str(databuffer.shape[1])+' doubles')
     logger.info('TVB_to_NEST: End of receive function')
+    return win
 
 
 # See todo in the beginning, encapsulate I/O, transformer, science parts
-def _send(comm_sender, databuffer, logger, generator, id_first_spike_detector):
+def _send(comm, comm_sender, intracomm, databuffer, win, logger, timeline, generator, id_first_spike_detector,
+          speculative=True):
     '''
     Generator/Science on INTRAcommunicator (multiple MPI ranks possible).
-    TODO: not yet used.
     Send data to NEST on INTERcommunicator comm_sender (multiple MPI ranks possible).
     Replaces the former 'send' function.
     NOTE: First refactored version -> not pretty, not final. 
     
     TODO: Discuss communication protocol of TVB<->transformer and transformer<->NEST
+    NOTE: speculative generation: while waiting for the request of NEST, the notification of new rates by the
+    receiving rank is also awaited. The spikes of the next step are generated as soon as the rates arrive and
+    kept (staged) until the request of NEST, which is then answered without generation.
+    Only one step is staged, the slot is released to the receiving rank after the generation.
+    NOTE: several science ranks: each rank generates the spikes of its part of the spike generators.
+    The first science rank receives the requests of NEST and shares them on intracomm, the spikes of all the
+    parts are gathered on it and it answers all the NEST ranks.
+    -> NEST receives the spikes from rank 1 of the transformer, like with one science rank
+       (the test file 'test_receive_tvb_to_nest.py' receives from rank 1, the backend of NEST is not checked)
+    -> LIMITATION: only the generation scales with the number of science ranks, the sending to all the NEST
+       ranks is done by the first science rank (see run_mpi_tvb_to_nest.sh)
+    :param intracomm: MPI intra communicator of the science ranks
+    :param timeline: record of the steps: wait for NEST and the receiving rank, generate (analyse), send,
+           bytes and spikes sent
+    :param speculative: generate before the request of NEST (True) or after it (False)
+    :return win: the MPI window of the buffer (a new one if the buffer grew)
     '''
     status_ = MPI.Status()
-    num_sending = comm_sender.Get_remote_size() # how many TVB ranks are sending?
+    status_receiver = MPI.Status() # status of the notifications of the receiving rank
+    num_sending = comm_sender.Get_remote_size() # how many NEST ranks are receiving?
+    part = intracomm.Get_rank()
+    nb_part = intracomm.Get_size()
+    parts = np.array(intracomm.allgather([generator.begin, generator.end])) # generators of each science rank
     # init placeholder for incoming data
     check = np.empty(1,dtype='b')
+    tag = np.empty(1, dtype='i') # request of NEST, shared with all the science ranks
     size_list = np.empty(1, dtype='i')
+    size = np.empty(2, dtype='i') # slot and size of the rate array, sent by the receiving rank
+    count = 0 # number of steps sent
+    generated = 0 # number of steps of generation
+    staged = None # spikes generated before the request of NEST
+    request_notification = None # reception of the next notification of the receiving rank
+    ended = False # end notification of the receiving rank, no more rates
     while(True):
         # TODO: This is still not correct. We only check for the Tag of the last rank.
         # TODO: IF all ranks send always the same tag in one iteration (simulation step)
         # TODO: then this works. But it should be handled differently!!!!
-        for rank in range(num_sending):
-            comm_sender.Recv([check, 1, MPI.CXX_BOOL], source=rank, tag=MPI.ANY_TAG, status=status_)
-        logger.info("TVB to NEST : send data status : " +str(status_.Get_tag()))
+        if part == 0:
+            request_nest = comm_sender.Irecv([check, 1, MPI.CXX_BOOL], source=0, tag=MPI.ANY_TAG)
+        else:
+            request_nest = intracomm.Ibcast([tag, MPI.INT], root=0)
+        if speculative and staged is None and not ended:
+            # NEW: wait for NEST or for new rates, generate the spikes if the rates arrive first
+            if request_notification is None:
+                request_notification = comm.Irecv([size, MPI.INT], source=0, tag=MPI.ANY_TAG)
+            if MPI.Request.Waitany([request_nest, request_notification], status_receiver) == 1:
+                request_notification = None
+                staged, databuffer, win = _generate(comm, databuffer, win, size, status_receiver, generator,
+                                                    generated, timeline)
+                if staged is None:
+                    ended = True
+                else:
+                    generated += 1
+                request_nest.Wait(status_)
+            else:
+                status_ = MPI.Status(status_receiver)
+        else:
+            request_nest.Wait(status_)
+        if part == 0:
+            for rank in range(1, num_sending):
+                comm_sender.Recv([check, 1, MPI.CXX_BOOL], source=rank, tag=MPI.ANY_TAG, status=status_)
+            tag[0] = status_.Get_tag()
+            intracomm.Ibcast([tag, MPI.INT], root=0).Wait()
+        logger.debug("TVB to NEST : send data status : %d", tag[0])
         # TODO: handle properly, all ranks send tag 0?
-        if status_.Get_tag() == 0:
-            # wait until the receiver has cleared the buffer, i.e. filled with new data
-            while databuffer[-1] != 0: # TODO: use MPI, remove the sleep
-                time.sleep(0.001)
-                pass
-
-            # TODO: All science/generate here. Move to a proper place.
-            # method: generate_spike(count,time_step,rate)
-            # NOTE: count is a hardcoded '0'. Why?
-            # NOTE: time_step are the first two doubles in the buffer
-            # NOTE: rate is a double array, which size is stored in the second to last index
-            spikes_times = generator.generate_spike(0,databuffer[:2],databuffer[2:int(databuffer[-2])])
-            logger.info(" TVB to Nest: spike time")
-            
-            # Mark as 'ready to receive next simulation step'
-            databuffer[-1] = 1
+        if tag[0] == 0:
+            if staged is None and not ended:
+                # wait until the receiver has filled the next slot with new data
+                if request_notification is not None:
+                    request_notification.Wait(status_receiver)
+                    request_notification = None
+                else:
+                    comm.Recv([size, MPI.INT], source=0, tag=MPI.ANY_TAG, status=status_receiver)
+                staged, databuffer, win = _generate(comm, databuffer, win, size, status_receiver, generator,
+                                                    generated, timeline)
+                ended = staged is None
+                generated += 1
+            if staged is None:
+                raise Exception("TVB to NEST : end of TVB before the request of NEST")
+            spikes, offsets = staged
+            staged = None
+            logger.debug(" TVB to Nest: spike time")
             
             ###### OLD code, kept the communication and science as it is for now
             ### TODO: Receive from status_.Get_source() and rank
             ### TODO: Send to status_.Get_source() and rank
             ### TODO: why???
             ### TODO: a second status_ object is used, should not be named the same
-            for rank in range(num_sending):
-                # NOTE: in 'test_receive_tvb_to_nest.py': hardcoded 10
-                comm_sender.Recv([size_list, 1, MPI.INT], source=rank, tag=0, status=status_)
-                if size_list[0] != 0:
+            if nb_part > 1:
+                # all the spike generators on the first science rank (the part of the first generators)
+                spikes, offsets = _gather_spikes(intracomm, parts, spikes, offsets)
+            list_ids = []
+            if part == 0:
+                for rank in range(num_sending):
+                    # NOTE: in 'test_receive_tvb_to_nest.py': hardcoded 10
+                    comm_sender.Recv([size_list, 1, MPI.INT], source=rank, tag=0, status=status_)
                     list_id = np.empty(size_list[0], dtype='i')
-                    # NOTE: in 'test_receive_tvb_to_nest.py': hardcoded np.arange(0,10,1)
-                    comm_sender.Recv([list_id, size_list[0], MPI.INT], source=status_.Get_source(), tag=0, status=status_)
-                    # Select the good spike train and send it
-                    # logger.info(" TVB to Nest:"+str(data))
-                    logger.info("rank "+str(rank)+" list_id "+str(list_id))
-                    # TODO: Creating empty lists and append to them in a loop, all inside a loop
-                    # TODO: this is slow and will be a bottleneck when we scale up.
-                    data = []
-                    shape = []
-                    for i in list_id:
-                        shape += [spikes_times[i-id_first_spike_detector].shape[0]]
-                        data += [spikes_times[i-id_first_spike_detector]]
-                    send_shape = np.array(np.concatenate(([np.sum(shape)],shape)), dtype='i')
-                    # firstly send the size of the spikes train
-                    comm_sender.Send([send_shape, MPI.INT], dest=status_.Get_source(), tag=list_id[0])
-                    # secondly send the spikes train
-                    data = np.concatenate(data).astype('d')
-                    comm_sender.Send([data, MPI.DOUBLE], dest=rank, tag=list_id[0])
-            logger.info(" end sending:")
+                    if size_list[0] != 0:
+                        # NOTE: in 'test_receive_tvb_to_nest.py': hardcoded np.arange(0,10,1)
+                        comm_sender.Recv([list_id, size_list[0], MPI.INT], source=status_.Get_source(), tag=0, status=status_)
+                    list_ids.append(list_id)
+            for rank, list_id in enumerate(list_ids):
+                if list_id.shape[0] == 0:
+                    continue
+                send_shape, data = _pack_spikes(spikes, offsets, list_id-id_first_spike_detector)
+                # Select the good spike train and send it
+                logger.debug("rank %d list_id %s", rank, list_id)
+                # firstly send the size of the spikes train
+                comm_sender.Send([send_shape, MPI.INT], dest=rank, tag=list_id[0])
+                # secondly send the spikes train
+                comm_sender.Send([data, MPI.DOUBLE], dest=rank, tag=list_id[0])
+                timeline.add(BYTES, send_shape.nbytes + data.nbytes)
+                timeline.add(EVENTS, data.shape[0])
+            timeline.toc(SEND)
+            timeline.next(count)
+            count += 1
+            logger.debug(" end sending:")
             ###### OLD code end
-        elif  status_.Get_tag() == 1:
-            logger.info(" TVB to Nest end sending") # NOTE: one sim step?
-        elif status_.Get_tag() == 2:
+        elif tag[0] == 1:
+            logger.debug(" TVB to Nest end sending") # NOTE: one sim step?
+        elif tag[0] == 2:
             logger.info(" TVB to Nest end simulation ") # NOTE: end whole sim.
             break
         else:
-            raise Exception("bad mpi tag : "+str(status_.Get_tag()))
+            raise Exception("bad mpi tag : "+str(tag[0]))
+    if not ended:
+        # the receiving rank can still wait for the release of the slots
+        databuffer, win = _drain(comm, databuffer, win, size, request_notification)
     
     logger.info('TVB_to_NEST: End of send function')
+    return win
+
+
+def _gather_spikes(intracomm, parts, spikes, offsets):
+    '''
+    The spikes of all the spike generators on the first science rank.
+    :param intracomm: MPI intra communicator of the science ranks
+    :param parts: first and end spike generator of each science rank
+    :param spikes: the spikes of the generators of this rank
+    :param offsets: the offsets of the spikes of the generators of this rank
+    :return spikes, offsets: the spikes of all the generators, see generate_data.generate_spike_flat
+            (None on the other science ranks)
+    '''
+    nb_spikes = intracomm.gather(spikes.shape[0], root=0)
+    counts = np.diff(offsets).astype(np.int64)
+    if intracomm.Get_rank() != 0:
+        intracomm.Gatherv([spikes, MPI.DOUBLE], None, root=0)
+        intracomm.Gatherv([counts, MPI.INT64_T], None, root=0)
+        return None, None
+    nb_spikes = np.array(nb_spikes)
+    spikes_all = np.empty(nb_spikes.sum())
+    intracomm.Gatherv([spikes, MPI.DOUBLE],
+                      [spikes_all, (nb_spikes, np.concatenate(([0], np.cumsum(nb_spikes)[:-1]))), MPI.DOUBLE], root=0)
+    counts_all = np.empty(parts[-1,1], dtype=np.int64)
+    intracomm.Gatherv([counts, MPI.INT64_T],
+                      [counts_all, (parts[:,1]-parts[:,0], parts[:,0]), MPI.INT64_T], root=0)
+    offsets_all = np.zeros(parts[-1,1]+1, dtype=np.int64)
+    np.cumsum(counts_all, out=offsets_all[1:])
+    return spikes_all, offsets_all
+
+
+def _generate(comm, databuffer, win, size, status_receiver, generator, count, timeline):
+    '''
+    Generate the spikes of the slot notified by the receiving rank and release the slot.
+    :param comm: MPI intra communicator of the buffer
+    :param databuffer: the current buffer
+    :param win: the MPI window of the current buffer
+    :param size: the notification, already received: slot and size of the rate array (or new size of the slots)
+    :param status_receiver: the status of the notification
+    :param generator: Python object, generate the spikes
+    :param count: the number of the step of the rates (the step of the random streams of the generator)
+    :param timeline: record of the steps
+    :return staged: the spikes and their offsets, see generate_data.generate_spike_flat
+           (None for the end notification of the receiving rank)
+    :return databuffer, win: the buffer and its window (new ones if the buffer grew)
+    '''
+    while status_receiver.Get_tag() == 2:
+        # the receiving rank grows the buffer
+        databuffer, win = _resize_shared_mem_buffer(comm, databuffer, win, size[0])
+        comm.Recv([size, MPI.INT], source=0, tag=MPI.ANY_TAG, status=status_receiver)
+    if status_receiver.Get_tag() == 1:
+        # no more rates from TVB
+        return None, databuffer, win
+    win.Sync()
+    timeline.toc(WAIT)
+    # TODO: All science/generate here. Move to a proper place.
+    # method: generate_spike(count,time_step,rate)
+    # NOTE: count is the number of the step (formerly a hardcoded '0')
+    # NOTE: time_step are the first two doubles in the slot
+    # NOTE: rate is a double array, which size is sent by the receiving rank
+    staged = generator.generate_spike_flat(count,databuffer[size[0],:2],databuffer[size[0],2:2+size[1]])
+    # Mark as 'ready to receive next simulation step'
+    comm.Send([np.array(True,dtype='b'), MPI.BOOL], dest=0, tag=1)
+    timeline.toc(ANALYSE)
+    return staged, databuffer, win
+
+
+def _drain(comm, databuffer, win, size, request_notification):
+    '''
+    Release the slots which will not be used, until the end notification of the receiving rank.
+    NEST can end before TVB: the next rates are released without generation.
+    :param comm: MPI intra communicator of the buffer
+    :param databuffer: the current buffer
+    :param win: the MPI window of the current buffer
+    :param size: placeholder of the notifications
+    :param request_notification: the reception of the next notification, already posted (or None)
+    :return databuffer, win: the buffer and its window (new ones if the buffer grew)
+    '''
+    status_receiver = MPI.Status()
+    if request_notification is not None:
+        request_notification.Wait(status_receiver)
+    else:
+        comm.Recv([size, MPI.INT], source=0, tag=MPI.ANY_TAG, status=status_receiver)
+    while status_receiver.Get_tag() != 1:
+        if status_receiver.Get_tag() == 2:
+            # the receiving rank grows the buffer
+            databuffer, win = _resize_shared_mem_buffer(comm, databuffer, win, size[0])
+        else:
+            comm.Send([np.array(True,dtype='b'), MPI.BOOL], dest=0, tag=1)
+        comm.Recv([size, MPI.INT], source=0, tag=MPI.ANY_TAG, status=status_receiver)
+    return databuffer, win
+
+
+def _pack_spikes(spikes, offsets, index):
+    '''
+    Message of the spike trains of the spike generators requested by a NEST rank, without Python loop.
+    -> consecutive generators (the usual case): a view of the spikes, no copy
+    -> other generators: one vectorized gather of their spikes
+    NOTE: the gather is faster than an MPI indexed datatype over the spikes, which costs more to create
+    than the copy (see test_file/benchmark_send_spikes.py).
+    :param spikes: the spike times of all the spike generators, see generate_data.generate_spike_flat
+    :param offsets: the spikes of the generator i are spikes[offsets[i]:offsets[i+1]]
+    :param index: the index of the requested spike generators (from the first one of the region)
+    :return send_shape: the total number of spikes and the number of spikes of each requested generator
+    :return data: the spikes of the requested generators, in the order of index
+    '''
+    begin = offsets[index]
+    counts = offsets[index+1] - begin
+    send_shape = np.empty(index.shape[0]+1, dtype='i')
+    send_shape[1:] = counts
+    send_shape[0] = send_shape[1:].sum()
+    if index.shape[0] == 1 or np.all(np.diff(index) == 1):
+        return send_shape, spikes[begin[0]:begin[0]+send_shape[0]]
+    # position of each spike: beginning of its train in spikes + its rank in the train
+    gather = np.repeat(begin - (np.cumsum(counts) - counts), counts) + np.arange(send_shape[0])
+    return send_shape, spikes[gather]